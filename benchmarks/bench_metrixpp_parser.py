@@ -0,0 +1,110 @@
+"""
+Benchmark of the metrix++ view xml parser on large generated documents.
+
+Usage: python benchmarks/bench_metrixpp_parser.py [--files N] [--functions N] [--depth N] [--repeat N]
+
+Generates xml like `metrix++ view` prints it for a batch of files (with unescaped
+operator names such as "operator<<"), and reports parsing time, throughput and
+the number of regions built. With --depth a chain of nested regions is added to
+every file, to check documents too deep for recursive parsing.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from language_handlers.metrixpp_parser import parse_metrixpp_view_xml
+
+function_names = ("run", "operator<<", "operator&&", "operator->", "operator <=", "get_value")
+
+
+def region_info_xml(indent: str, name: str, region_type: str, line_begin: int, line_end: int) -> str:
+    return '{0}<info cursor="0" line_begin="{1}" line_end="{2}" name="{3}" offset_begin="0" offset_end="0" ' \
+           'type="{4}" />\n'.format(indent, line_begin, line_end, name, region_type)
+
+
+def region_data_xml(indent: str, is_function: bool) -> str:
+    complexity = '{0}    <std.code.complexity cyclomatic="3" />\n'.format(indent) if is_function else ""
+    return '{0}<data>\n{1}{0}    <std.code.lines code="10" comments="2" preprocessor="1" total="15" />\n' \
+           '{0}</data>\n'.format(indent, complexity)
+
+
+def generate_file_xml(file_id: int, functions: int, depth: int) -> str:
+    parts = ['    <data>\n        <info path="./project/file_{0}.cpp" id="{0}" />\n'
+             '        <file-data>\n            <regions>\n                <region>\n'.format(file_id)]
+    indent = " " * 20
+    parts.append(region_info_xml(indent, "__global__", "global", 1, 100000))
+    parts.append(region_data_xml(indent, False))
+    parts.append(indent + "<subregions>\n")
+
+    # a class with functions
+    parts.append(indent + "    <subregion>\n")
+    parts.append(region_info_xml(indent + "        ", "Widget", "class", 1, 20 * functions + 2))
+    parts.append(region_data_xml(indent + "        ", False))
+    parts.append(indent + "        <subregions>\n")
+    for i in range(functions):
+        function_indent = indent + "            "
+        parts.append(function_indent + "<subregion>\n")
+        parts.append(region_info_xml(function_indent + "    ", function_names[i % len(function_names)], "function",
+                                     20 * i + 2, 20 * i + 21))
+        parts.append(region_data_xml(function_indent + "    ", True))
+        parts.append(function_indent + "    <subregions />\n")
+        parts.append(function_indent + "</subregion>\n")
+    parts.append(indent + "        </subregions>\n")
+    parts.append(indent + "    </subregion>\n")
+
+    # a chain of nested namespaces
+    for level in range(depth):
+        parts.append("<subregion>\n")
+        parts.append(region_info_xml("", "ns{0}".format(level), "namespace", level + 1, 100000 - level))
+        parts.append(region_data_xml("", False))
+        parts.append("<subregions>\n")
+    for level in range(depth):
+        parts.append("</subregions>\n</subregion>\n")
+
+    parts.append(indent + "</subregions>\n")
+    parts.append("                </region>\n            </regions>\n        </file-data>\n"
+                 "        <aggregated-data>\n            <std.code.lines>\n"
+                 "                <code max=\"10\" min=\"10\" total=\"{0}\" />\n            </std.code.lines>\n"
+                 "        </aggregated-data>\n    </data>\n".format(10 * (functions + depth + 2)))
+    return "".join(parts)
+
+
+def generate_view_xml(files: int, functions: int, depth: int) -> str:
+    return "<view>\n" + "".join(generate_file_xml(file_id, functions, depth)
+                                for file_id in range(1, files + 1)) + "</view>\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="metrix++ view xml parser benchmark")
+    parser.add_argument("--files", type=int, default=200, help="files in one view document")
+    parser.add_argument("--functions", type=int, default=200, help="functions in every file")
+    parser.add_argument("--depth", type=int, default=0, help="nested namespaces in every file")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    metrixpp_xml = generate_view_xml(args.files, args.functions, args.depth)
+    size_mb = len(metrixpp_xml) / (1024 * 1024)
+    print("document: {0:.1f} MB, {1} files, {2} functions per file, depth {3}"
+          .format(size_mb, args.files, args.functions, args.depth))
+
+    best = None
+    regions = 0
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        result = parse_metrixpp_view_xml(metrixpp_xml)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        regions = sum(len(file_regions) for file_regions in result.values())
+        if len(result) != args.files:
+            print("ERROR: {0} of {1} files parsed".format(len(result), args.files))
+            exit(1)
+
+    print("parse: best of {0}: {1:.3f} s, {2:.1f} MB/s, {3} regions"
+          .format(args.repeat, best, size_mb / best, regions))
+
+
+if __name__ == "__main__":
+    main()
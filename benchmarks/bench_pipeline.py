@@ -0,0 +1,210 @@
+"""
+End-to-end benchmark: a generated git repository goes through clone, preprocessing, line counting,
+metrix++ and storing to the database, like a project from todo.txt.
+
+Usage: python benchmarks/bench_pipeline.py [--files N] [--classes N] [--functions N] [--depth N]
+                                           [--languages java,cpp,cs] [--seed N] [--workers N] [--repeat N]
+                                           [--stub] [--builtin-extractor] [--cache] [--sink null|postgres|sqlite]
+
+Settings not given here are taken from config.ini. With --stub metrix++ is replaced by
+benchmarks/stub_metrixpp.py and cloc by the builtin counter, so only the overhead of this tool
+is measured and no external tools are needed. --builtin-extractor measures the in-process extractor
+instead of metrix++ ([metrix++] engine=builtin), --cache keeps the result cache between --repeat runs. With --sink null rows are counted instead of being
+sent to PostgreSQL (--sink postgres uses [postgresql] from config.ini), --sink sqlite stores them
+to an SQLite database in the temporary directory.
+Reports files/sec, functions/sec, peak RSS and the stage timings of the last run.
+"""
+import argparse
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from checkpoint import Checkpoint
+from config import Config
+from database.storage import PostgresStorage, close_connection_pool, open_storage
+from result_cache import close_result_cache
+from tool_runner import close_tool_runner
+from instrumentation import get_peak_rss_kb
+from synthetic_repo import generate_repository
+
+stub_metrixpp_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_metrixpp.py")
+copy_table_pattern = re.compile(r"COPY (\w+)")
+insert_table_pattern = re.compile(r"INSERT INTO (\w+)")
+
+
+class NullSinkCursor:
+    """ answers the queries of db_helpers and BulkWriter without a server, counts rows per table"""
+
+    def __init__(self, sink: "NullSink"):
+        self.sink = sink
+        self.result = []
+
+    def execute(self, sql: str, params=None):
+        self.result = []
+        insert = insert_table_pattern.search(sql)
+        if insert is not None:
+            self.sink.add_rows(insert.group(1), 1)
+            if "RETURNING" in sql:
+                self.result = [(self.sink.next_id(),)]
+        elif "generate_series" in sql:
+            self.result = [(self.sink.next_id(),) for _ in range(params[1])]
+
+    def executemany(self, sql: str, params_list):
+        for params in params_list:
+            self.execute(sql, params)
+
+    def fetchone(self):
+        return self.result[0] if len(self.result) > 0 else None
+
+    def fetchall(self):
+        return self.result
+
+    def copy_expert(self, sql: str, buffer):
+        self.sink.add_rows(copy_table_pattern.search(sql).group(1), sum(1 for _ in buffer))
+
+    def close(self):
+        pass
+
+
+class NullSink:
+    """ stand-in for the psycopg2 connection, shared by all connections of a run"""
+
+    def __init__(self):
+        self.last_id = 0
+        self.rows = Counter()
+
+    def next_id(self) -> int:
+        self.last_id += 1
+        return self.last_id
+
+    def add_rows(self, table: str, count: int):
+        self.rows[table] += count
+
+    def cursor(self):
+        return NullSinkCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def set_option(section: str, option: str, value: str):
+    if not Config.parser.has_section(section):
+        Config.parser.add_section(section)
+    Config.parser.set(section, option, value)
+
+
+def configure(temp_dir: str, args):
+    set_option("workspace", "path", os.path.join(temp_dir, "workspace"))
+    set_option("report", "path", "")
+    set_option("report", "store_in_database", "no")
+    set_option("incremental", "enabled", "no")
+    set_option("history", "enabled", "no")
+    set_option("git", "clone_mode", "full")
+    set_option("git", "mirror_cache", "")
+    set_option("scheduler", "file_workers", str(args.workers))
+    set_option("database", "backend", "sqlite" if args.sink == "sqlite" else "postgresql")
+    set_option("sqlite", "path", os.path.join(temp_dir, "metrics.sqlite"))
+    if args.stub:
+        set_option("cloc", "engine", "builtin")
+        set_option("python27", "path", sys.executable)
+        set_option("metrix++", "path", stub_metrixpp_path)
+        set_option("metrix++", "reader", "xml")
+    set_option("metrix++", "engine", "builtin" if args.builtin_extractor else "external")
+    set_option("cache", "path", os.path.join(temp_dir, "cache.sqlite") if args.cache else "")
+
+
+def count_stored_functions(project_id: int) -> int:
+    storage = open_storage()
+    cur = storage.conn.cursor()
+    cur.execute("SELECT count(*) FROM functions JOIN files ON files.id = functions.file_id "
+                "WHERE files.project_id = {0};".format(int(project_id)))
+    result = cur.fetchone()[0]
+    cur.close()
+    storage.close()
+    return result
+
+
+def run_once(repository: str, args) -> dict:
+    sink = NullSink()
+    if args.sink == "null":
+        PostgresStorage.connect = classmethod(lambda cls: sink)
+
+    started_at = time.perf_counter()
+    project_info = main.fetch_stage((0, repository))
+    try:
+        main.analysis_stage(Checkpoint(""), project_info)
+    finally:
+        main.remove_local_project_directory(project_info)
+    seconds = time.perf_counter() - started_at
+
+    if args.sink == "null":
+        functions = sink.rows["functions"]
+    else:
+        functions = count_stored_functions(project_info.id)
+    close_connection_pool()  # the next run connects to its own sink
+    close_result_cache()
+    close_tool_runner()
+    return {"seconds": seconds, "files": project_info.files_analyzed, "functions": functions,
+            "report": main.get_project_report(project_info)}
+
+
+def print_stages(report: dict):
+    print("{0:>14} {1:>10} {2:>10} {3:>8}".format("stage", "seconds", "cpu", "calls"))
+    for name, stats in report["stages"].items():
+        print("{0:>14} {1:>10.3f} {2:>10.3f} {3:>8}".format(name, stats["seconds"], stats["cpu_seconds"],
+                                                            stats["calls"]))
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="end-to-end benchmark on a synthetic repository")
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--classes", type=int, default=2)
+    parser.add_argument("--functions", type=int, default=10)
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--languages", default="java,cpp,cs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1, help="file_workers of the analysis")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--stub", action="store_true", help="stand-ins for metrix++ and cloc")
+    parser.add_argument("--builtin-extractor", action="store_true",
+                        help="extract regions in-process instead of metrix++ ([metrix++] engine=builtin)")
+    parser.add_argument("--cache", action="store_true",
+                        help="result cache in the temporary directory, repeated runs take results from it")
+    parser.add_argument("--sink", choices=("null", "postgres", "sqlite"), default="null")
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    try:
+        repository = generate_repository(os.path.join(temp_dir, "synthetic"), args.files, args.classes,
+                                         args.functions, args.depth, args.languages.split(","), args.seed)
+        configure(temp_dir, args)
+
+        runs = [run_once(repository, args) for _ in range(args.repeat)]
+        seconds = statistics.median(run["seconds"] for run in runs)
+        last_run = runs[-1]
+        print("files: {0}, functions: {1}, median of {2} runs: {3:.3f} s"
+              .format(last_run["files"], last_run["functions"], len(runs), seconds))
+        print("files/sec: {0:.1f}, functions/sec: {1:.1f}"
+              .format(last_run["files"] / seconds, last_run["functions"] / seconds))
+        print("peak RSS: {0:.1f} MB".format(get_peak_rss_kb() / 1024))
+        print_stages(last_run["report"])
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main_benchmark()
@@ -0,0 +1,76 @@
+"""
+Memory used by regions of a large project kept alive at once.
+
+Usage: python benchmarks/bench_region_memory.py [--functions N] [--files N] [--trace]
+
+Parses generated metrix++ view xml with the given number of functions in total,
+attaches regions to file records the way handlers do and reports peak RSS of the
+process per 100k functions. With --trace Python allocations are traced as well
+(tracing itself inflates RSS, so the two are not measured in one run).
+Run it in a fresh process for every measurement, peak RSS never goes down.
+"""
+import argparse
+import gc
+import os
+import resource
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_metrixpp_parser import generate_view_xml
+from cloc_file_metrics import ClocFileMetrics
+from info.file_info import FileInfo
+from language_handlers.metrixpp_parser import parse_metrixpp_view_xml
+
+
+def get_peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="memory used by parsed regions")
+    parser.add_argument("--functions", type=int, default=100000, help="functions in total")
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--trace", action="store_true", help="trace python allocations")
+    args = parser.parse_args()
+
+    functions_per_file = max(1, args.functions // args.files)
+    # documents are generated and parsed per file, so the xml itself doesn't take the memory
+    file_xml = generate_view_xml(1, functions_per_file, 0)
+    baseline_rss = get_peak_rss_mb()
+
+    gc.collect()
+    if args.trace:
+        tracemalloc.start()
+    kept_regions = []
+    files = []
+    for file_number in range(args.files):
+        file_info = FileInfo("project/file_{0}.cpp".format(file_number), "C++")
+        file_info.cloc_metrics = ClocFileMetrics(10, 2, 100)
+        regions = parse_metrixpp_view_xml(file_xml)[0]
+        for region_info in regions:
+            region_info.file_info = file_info
+        files.append(file_info)
+        kept_regions.append(regions)
+
+    regions = sum(len(file_regions) for file_regions in kept_regions)
+    functions = functions_per_file * args.files
+    per_100k = 100000 / functions
+    print("{0} files, {1} functions, {2} regions".format(args.files, functions, regions))
+    if args.trace:
+        traced_bytes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print("traced python memory: {0:.1f} MB per 100k functions ({1:.0f} bytes per region)"
+              .format(traced_bytes / 1024 / 1024 * per_100k, traced_bytes / regions))
+    else:
+        peak_rss = get_peak_rss_mb()
+        print("peak RSS: {0:.1f} MB, {1:.1f} MB per 100k functions above {2:.1f} MB before parsing"
+              .format(peak_rss, (peak_rss - baseline_rss) * per_100k, baseline_rss))
+
+
+if __name__ == "__main__":
+    main()
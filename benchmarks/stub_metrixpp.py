@@ -0,0 +1,102 @@
+"""
+Stand-in for metrix++ in benchmarks, to measure the overhead of this tool without metrix++ itself.
+
+`collect` only creates the database file, `view --format=xml` finds classes and functions
+with a simple brace scanner and prints them in the xml format of metrix++ (names unescaped,
+as metrix++ does). Regions are good enough for benchmarking, not for analysis.
+"""
+import re
+import sys
+from typing import List
+
+header_pattern = re.compile(r"^\s*(?:(?:public|private|protected|static|internal|abstract|final|sealed)\s+)*"
+                            r"(class|struct|interface|namespace)\s+([\w.]+)")
+function_pattern = re.compile(r"(operator\S+|[\w~]+)\s*\([^;{}]*\)\s*(?:const\s*)?\{")
+complexity_pattern = re.compile(r"\b(?:if|for|while|case|catch)\b|&&|\|\|")
+not_functions = ("if", "for", "while", "switch", "catch", "using", "lock", "foreach")
+
+
+def new_region(region_type: str, name: str, line_begin: int) -> dict:
+    return {"type": region_type, "name": name, "line_begin": line_begin, "line_end": line_begin,
+            "code": 0, "comments": 0, "ccn": 0, "subregions": []}
+
+
+def scan_regions(lines: List[str]) -> dict:
+    global_region = new_region("global", "__global__", 1)
+    global_region["line_end"] = max(1, len(lines))
+    open_regions = [(global_region, 0)]  # (region, brace depth inside it)
+    depth = 0
+
+    for line_number, line in enumerate(lines, 1):
+        region = None
+        header = header_pattern.match(line)
+        if header is not None and "{" in line:
+            region = new_region(header.group(1), header.group(2), line_number)
+        else:
+            function = function_pattern.search(line)
+            if function is not None and function.group(1) not in not_functions:
+                region = new_region("function", function.group(1), line_number)
+        if region is not None:
+            open_regions[-1][0]["subregions"].append(region)
+            open_regions.append((region, depth + 1))
+
+        current_region = open_regions[-1][0]
+        stripped_line = line.strip()
+        if stripped_line.startswith("//"):
+            current_region["comments"] += 1
+        elif stripped_line != "":
+            current_region["code"] += 1
+        current_region["ccn"] += len(complexity_pattern.findall(line))
+
+        depth += line.count("{") - line.count("}")
+        while len(open_regions) > 1 and depth < open_regions[-1][1]:
+            open_regions.pop()[0]["line_end"] = line_number
+    return global_region
+
+
+def write_region(region: dict, tag: str, output: List[str]):
+    output.append("<{0}>".format(tag))
+    output.append('<info cursor="0" line_begin="{0}" line_end="{1}" name="{2}" offset_begin="0" offset_end="0" '
+                  'type="{3}" />'.format(region["line_begin"], region["line_end"], region["name"], region["type"]))
+    output.append("<data>")
+    if region["type"] == "function":
+        output.append('<std.code.complexity cyclomatic="{0}" />'.format(region["ccn"]))
+    output.append('<std.code.lines code="{0}" comments="{1}" preprocessor="0" total="{2}" />'
+                  .format(region["code"], region["comments"], region["code"] + region["comments"]))
+    output.append("</data>")
+    output.append("<subregions>")
+    for subregion in region["subregions"]:
+        write_region(subregion, "subregion", output)
+    output.append("</subregions>")
+    output.append("</{0}>".format(tag))
+
+
+def view(paths: List[str]):
+    output = ["<view>"]
+    for file_id, path in enumerate(paths, 1):
+        with open(path, "rt", encoding="utf-8", errors="replace") as source_file:
+            lines = source_file.read().splitlines()
+        output.append('<data>\n<info path="./{0}" id="{1}" />\n<file-data>\n<regions>'.format(path, file_id))
+        write_region(scan_regions(lines), "region", output)
+        output.append("</regions>\n</file-data>\n</data>")
+    output.append("</view>")
+    sys.stdout.write("\n".join(output) + "\n")
+
+
+def main():
+    command = sys.argv[1]
+    options = sys.argv[2:sys.argv.index("--")]
+    paths = sys.argv[sys.argv.index("--") + 1:]
+    db_path = [option for option in options if option.startswith("--db-file=")][0][len("--db-file="):]
+
+    if command == "collect":
+        open(db_path, "wb").close()
+    elif command == "view":
+        view(paths)
+    else:
+        print("stub metrix++: unsupported command {0}".format(command), file=sys.stderr)
+        exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Generator of synthetic git repositories for benchmarks.
+
+Usage: python benchmarks/synthetic_repo.py <directory> [--files N] [--classes N] [--functions N] [--depth N]
+                                           [--languages java,cpp,cs] [--seed N]
+
+Files of every language get nested namespaces/packages, classes nested --depth levels,
+methods with branches, and the constructs which need preprocessing: #if/#else branches
+(C/C++, C#) and C++11 raw string literals. Sizes vary around the given numbers,
+the same seed always gives the same repository.
+"""
+import argparse
+import os
+import random
+import subprocess
+from typing import List
+
+extension_for_language = {"java": "java", "cpp": "cpp", "cs": "cs"}
+
+
+def generate_method(language: str, name: str, rng: random.Random, indent: str) -> List[str]:
+    lines = ["{0}int {1}(int x) {{".format(indent, name)]
+    for branch in range(rng.randint(1, 4)):
+        lines.append("{0}    // branch {1}".format(indent, branch))
+        lines.append("{0}    if (x > {1} && x < {2}) {{".format(indent, branch, branch * 10 + 5))
+        lines.append("{0}        x = x * {1} + 1;".format(indent, branch + 2))
+        lines.append("{0}    }}".format(indent))
+    if language in ("cpp", "cs") and rng.random() < 0.3:
+        lines.append("#if FEATURE_{0}".format(name.upper()))
+        lines.append("{0}    x += 1;".format(indent))
+        lines.append("#else")
+        lines.append("{0}    x -= 1;".format(indent))
+        lines.append("#endif")
+    lines.append("{0}    for (int i = 0; i < x; i++) {{ x -= i; }}".format(indent))
+    lines.append("{0}    return x;".format(indent))
+    lines.append("{0}}}".format(indent))
+    return lines
+
+
+def generate_raw_string_method(language: str, name: str, indent: str) -> List[str]:
+    if language == "cpp":
+        value = 'R"delimiter(raw text with ) and " and { braces })delimiter"'
+        return ["{0}const char* {1}() {{ return {2}; }}".format(indent, name, value),
+                "{0}const char* {1}_multiline() {{".format(indent, name),
+                '{0}    return R"(first line'.format(indent),
+                'second line with "quotes")";',
+                "{0}}}".format(indent)]
+    if language == "cs":
+        return ["{0}string {1}() {{ return @\"verbatim \"\"quoted\"\" text\"; }}".format(indent, name)]
+    return ["{0}String {1}() {{ return \"text with \\\"escaped\\\" quotes\"; }}".format(indent, name)]
+
+
+def generate_class(language: str, name: str, functions: int, depth: int, rng: random.Random,
+                   indent: str) -> List[str]:
+    modifier = "public " if language in ("java", "cs") else ""
+    if language == "java" and indent != "":
+        modifier = "public static "
+    lines = ["{0}{1}class {2} {{".format(indent, modifier, name)]
+    if language == "cpp":
+        lines.append("{0}public:".format(indent))
+    for function_number in range(max(1, int(rng.gauss(functions, functions / 4.0)))):
+        lines.extend(generate_method(language, "method{0}".format(function_number), rng, indent + "    "))
+    lines.extend(generate_raw_string_method(language, "text", indent + "    "))
+    if depth > 0:
+        lines.extend(generate_class(language, name + "Inner", functions, depth - 1, rng, indent + "    "))
+    lines.append("{0}}}{1}".format(indent, ";" if language == "cpp" else ""))
+    return lines
+
+
+def generate_file(language: str, file_number: int, classes: int, functions: int, depth: int,
+                  rng: random.Random) -> str:
+    lines = []
+    if language == "java":
+        lines.append("package synthetic.package{0};".format(file_number % 10))
+        lines.append("")
+        for class_number in range(classes):
+            lines.extend(generate_class(language, "Class{0}_{1}".format(file_number, class_number),
+                                        functions, depth, rng, ""))
+    else:
+        lines.append("#include <string>" if language == "cpp" else "using System;")
+        lines.append("")
+        lines.append("namespace synthetic {")
+        lines.append("namespace module{0} {{".format(file_number % 10))
+        for class_number in range(classes):
+            lines.extend(generate_class(language, "Class{0}_{1}".format(file_number, class_number),
+                                        functions, depth, rng, ""))
+        lines.append("}")
+        lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def run_git(repository: str, args: List[str]):
+    subprocess.run(['git', '-c', 'user.name=benchmark', '-c', 'user.email=benchmark@localhost'] + args,
+                   cwd=repository, stdout=subprocess.DEVNULL, check=True)
+
+
+def generate_repository(repository: str, files: int, classes: int, functions: int, depth: int,
+                        languages: List[str], seed: int = 0) -> str:
+    """
+    Creates git repository with one commit of generated sources
+    :param files: number of source files (languages take turns)
+    :param classes: top level classes in every file
+    :param functions: mean number of methods in every class
+    :param depth: nesting level of inner classes
+    :return: path of the repository
+    """
+    rng = random.Random(seed)
+    os.makedirs(repository, exist_ok=True)
+    for file_number in range(files):
+        language = languages[file_number % len(languages)]
+        directory = os.path.join(repository, "src", language, "module{0}".format(file_number % 10))
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, "File{0}.{1}".format(file_number, extension_for_language[language]))
+        with open(path, "wt", encoding="utf-8") as source_file:
+            source_file.write(generate_file(language, file_number, classes, functions, depth, rng))
+
+    run_git(repository, ['init', '--quiet'])
+    run_git(repository, ['add', '--all'])
+    run_git(repository, ['commit', '--quiet', '-m', 'synthetic sources'])
+    return repository
+
+
+def main():
+    parser = argparse.ArgumentParser(description="synthetic git repository generator")
+    parser.add_argument("directory")
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--classes", type=int, default=2, help="top level classes per file")
+    parser.add_argument("--functions", type=int, default=10, help="mean methods per class")
+    parser.add_argument("--depth", type=int, default=2, help="nesting level of inner classes")
+    parser.add_argument("--languages", default="java,cpp,cs")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generate_repository(args.directory, args.files, args.classes, args.functions, args.depth,
+                        args.languages.split(","), args.seed)
+    print("repository generated: {0}".format(os.path.abspath(args.directory)))
+
+
+if __name__ == "__main__":
+    main()
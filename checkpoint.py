@@ -0,0 +1,61 @@
+import json
+import logging
+import os
+import threading
+from typing import Dict, Optional
+
+
+class Checkpoint:
+    """
+    Progress of the todo run kept in a json file: for every url the id of its project in the database
+    and whether it is finished. The file is rewritten atomically after every change, so it survives crashes
+    """
+
+    def __init__(self, path: str):
+        """ :param path: checkpoint file, empty to keep the progress in memory only"""
+        self.path = path
+        self.projects: Dict[str, dict] = {}
+        self.lock = threading.Lock()
+        if path != "" and os.path.exists(path):
+            with open(path, "rt", encoding="utf-8") as checkpoint_file:
+                self.projects = json.load(checkpoint_file)["projects"]
+            logging.info("Checkpoint {0}: {1} projects started by the previous run".format(path, len(self.projects)))
+
+    def save(self):
+        if self.path == "":
+            return
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wt", encoding="utf-8") as checkpoint_file:
+            json.dump({"projects": self.projects}, checkpoint_file, indent=2)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temp_path, self.path)
+
+    def is_finished(self, url: str) -> bool:
+        with self.lock:
+            return self.projects.get(url, {}).get("finished", False)
+
+    def get_project_id(self, url: str) -> Optional[int]:
+        """ :return: id of the project started by the previous run and not finished, None if there is no one"""
+        with self.lock:
+            project = self.projects.get(url)
+            if project is None or project["finished"]:
+                return None
+            return project["project_id"]
+
+    def start_project(self, url: str, project_id: int):
+        with self.lock:
+            self.projects[url] = {"project_id": project_id, "finished": False}
+            self.save()
+
+    def finish_project(self, url: str):
+        with self.lock:
+            self.projects[url]["finished"] = True
+            self.save()
+
+    def clear(self):
+        """ forgets the progress when the whole todo run is done, so the next run starts from scratch"""
+        with self.lock:
+            self.projects = {}
+            if self.path != "" and os.path.exists(self.path):
+                os.remove(self.path)
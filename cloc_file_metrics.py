@@ -1,4 +1,6 @@
 class ClocFileMetrics:
+    __slots__ = ("blank", "comment", "code")
+
     def __init__(self, blank: int, comment: int, code: int):
         self.blank = blank
         self.comment = comment
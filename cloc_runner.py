@@ -0,0 +1,171 @@
+import csv
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Iterator, List
+
+from cloc_file_metrics import ClocFileMetrics
+from config import Config
+from info.file_info import FileInfo
+from info.project_info import ProjectInfo
+from instrumentation import Measurement
+from retry import ToolCrashed, call_with_retries
+from tool_runner import get_tool_runner
+
+end_of_stream = object()
+
+# seconds the producer waits for room in the queue before checking whether the consumer is still there
+put_timeout = 0.5
+
+
+class ConsumerLeft(Exception):
+    """ consumer of the cloc files stopped iterating, the producer gives up"""
+
+
+def put_until_stopped(files_queue: queue.Queue, item, stop: threading.Event):
+    """ :raises ConsumerLeft: if stop is set before there is room for the item"""
+    while True:
+        if stop.is_set():
+            raise ConsumerLeft()
+        try:
+            files_queue.put(item, timeout=put_timeout)
+            return
+        except queue.Full:
+            pass
+
+
+def iterate_project_paths(project_info: ProjectInfo) -> Iterator[str]:
+    """ paths of all files of the project relative to the source directory (like "<project_name>/src/main.c")"""
+    source_dir = project_info.get_source_dir()
+    for directory, subdirectories, filenames in os.walk(project_info.get_source_path(project_info.name)):
+        if ".git" in subdirectories:
+            subdirectories.remove(".git")
+        relative_directory = os.path.relpath(directory, source_dir)
+        for filename in filenames:
+            yield os.path.join(relative_directory, filename)
+
+
+def run_cloc_for_chunk(project_info: ProjectInfo, paths: List[str], chunk_number: int) -> Iterator[FileInfo]:
+    """ runs cloc for the listed files, parsing its csv output line by line as it is printed"""
+    list_file_path = os.path.join(project_info.work_dir, "cloc_files_{0}.txt".format(chunk_number))
+    with open(list_file_path, "wt", encoding="utf-8") as list_file:
+        for path in paths:
+            list_file.write(path + "\n")
+
+    output_lines = get_tool_runner().iterate_output_lines([Config.get_cloc_path(), '--csv', '--by-file', '--quiet',
+                                                           '--list-file={0}'.format(list_file_path)],
+                                                          "cloc", cwd=project_info.get_source_dir(),
+                                                          timeout=Config.get_cloc_timeout_seconds())
+    try:
+        columns = None
+        for row in csv.reader(output_lines):
+            if len(row) < 5:
+                continue
+            if columns is None:
+                # header: language,filename,blank,comment,code,"github.com/AlDanial/cloc ..."
+                columns = {name: index for index, name in enumerate(row)}
+                continue
+            if row[columns["language"]] == "SUM":
+                continue
+            file_info = FileInfo(row[columns["filename"]], row[columns["language"]])
+            file_info.project_info = project_info
+            file_info.cloc_metrics = ClocFileMetrics(int(row[columns["blank"]]),
+                                                     int(row[columns["comment"]]),
+                                                     int(row[columns["code"]]))
+            yield file_info
+    finally:
+        output_lines.close()
+        os.remove(list_file_path)
+
+
+def put_cloc_files(project_info: ProjectInfo, paths: List[str], chunk_number: int, files_queue: queue.Queue,
+                   stop: threading.Event):
+    measurement = Measurement()
+    waited = 0.0
+    files_put = 0
+
+    def count_chunk():
+        nonlocal waited, files_put
+        cloc_files = run_cloc_for_chunk(project_info, paths, chunk_number)
+        try:
+            for file_info in cloc_files:
+                put_started_at = time.perf_counter()
+                put_until_stopped(files_queue, file_info, stop)
+                waited += time.perf_counter() - put_started_at
+                files_put += 1
+        except ToolCrashed as e:
+            if files_put > 0:
+                # the files have been passed on already, running cloc again would duplicate them
+                raise RuntimeError("cloc crashed after {0} files of the chunk".format(files_put)) from e
+            raise
+        finally:
+            # kills cloc if the consumer left before it finished
+            cloc_files.close()
+
+    call_with_retries(count_chunk, "Project \"{0}\": cloc".format(project_info.name))
+    measurement.stop()
+    # time spent waiting for the consumer is not cloc's
+    measurement.seconds -= waited
+    project_info.run_stats.add("cloc", measurement)
+
+
+def produce_cloc_files(project_info: ProjectInfo, files_queue: queue.Queue, stop: threading.Event):
+    """ stops as soon as stop is set, leaving the cloc generator kills the running cloc"""
+    chunk_size = Config.get_cloc_chunk_size()
+    try:
+        chunk = []
+        chunk_number = 0
+        for path in iterate_project_paths(project_info):
+            if stop.is_set():
+                return
+            chunk.append(path)
+            if len(chunk) == chunk_size:
+                put_cloc_files(project_info, chunk, chunk_number, files_queue, stop)
+                chunk = []
+                chunk_number += 1
+        if len(chunk) > 0:
+            put_cloc_files(project_info, chunk, chunk_number, files_queue, stop)
+        put_until_stopped(files_queue, end_of_stream, stop)
+    except ConsumerLeft:
+        pass
+    except Exception as e:
+        try:
+            put_until_stopped(files_queue, e, stop)
+        except ConsumerLeft:
+            pass
+
+
+def iterate_cloc_files(project_info: ProjectInfo) -> Iterator[FileInfo]:
+    """
+    Counts lines of the project files with cloc, chunk by chunk in a background thread,
+    so files are available to the consumer long before cloc has seen the whole project
+    :return: files with cloc metrics, in the order cloc reports them
+    """
+    logging.info("Project \"{0}\": cloc started".format(project_info.name))
+    files_queue = queue.Queue(maxsize=Config.get_cloc_chunk_size())
+    stop = threading.Event()
+    producer = threading.Thread(target=produce_cloc_files, args=(project_info, files_queue, stop), daemon=True)
+    producer.start()
+
+    try:
+        while True:
+            item = files_queue.get()
+            if item is end_of_stream:
+                break
+            if isinstance(item, Exception):
+                logging.error("Project \"{0}\": {1}".format(project_info.name, item))
+                raise item
+            yield item
+    finally:
+        # the consumer may leave early (an error in analysis, shutdown): the producer must not stay blocked on
+        # the full queue, and its cloc is killed when the producer leaves the output of cloc
+        stop.set()
+        while producer.is_alive():
+            try:
+                files_queue.get(timeout=put_timeout)
+            except queue.Empty:
+                pass
+        producer.join()
+    logging.info("Project \"{0}\": cloc finished".format(project_info.name))
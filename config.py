@@ -11,11 +11,75 @@ class Config:
     def get_todo_file_path(cls, section='todo'):
         return cls.parser[section]['path']
 
+    @classmethod
+    def get_git_clone_mode(cls, section='git'):
+        """ 'full', 'shallow' (depth 1) or 'blobless' (--filter=blob:none)"""
+        return cls.parser.get(section, 'clone_mode', fallback='full')
+
+    @classmethod
+    def get_git_mirror_cache_path(cls, section='git'):
+        """ directory with persistent local mirrors of repositories, empty to clone every time"""
+        return cls.parser.get(section, 'mirror_cache', fallback='')
+
+    @classmethod
+    def is_incremental(cls, section='incremental'):
+        """ whether results of files unchanged since the previous run of the same url are reused"""
+        return cls.parser.getboolean(section, 'enabled', fallback=False)
+
+    @classmethod
+    def is_history_mode(cls, section='history'):
+        """ whether several revisions of every project are analyzed instead of its HEAD"""
+        return cls.parser.getboolean(section, 'enabled', fallback=False)
+
+    @classmethod
+    def get_history_range(cls, section='history'):
+        return cls.parser.get(section, 'range', fallback='')
+
+    @classmethod
+    def get_history_sample(cls, section='history'):
+        """ 'every:N', 'tags' or 'monthly'"""
+        return cls.parser.get(section, 'sample', fallback='every:1')
+
+    @classmethod
+    def get_workspace_path(cls, section='workspace'):
+        """ directory where every project gets its own working directory"""
+        return cls.parser.get(section, 'path', fallback='workspace')
+
+    @classmethod
+    def get_projects_in_parallel(cls, section='scheduler'):
+        """ number of projects analyzed at the same time"""
+        return cls.parser.getint(section, 'projects_in_parallel', fallback=1)
+
+    @classmethod
+    def get_clone_workers(cls, section='scheduler'):
+        """ number of projects cloned at the same time"""
+        return cls.parser.getint(section, 'clone_workers', fallback=1)
+
+    @classmethod
+    def get_max_pending_clones(cls, section='scheduler'):
+        """ number of cloned projects which may wait for analysis, limits disk usage"""
+        return cls.parser.getint(section, 'pending_clones', fallback=1)
+
+    @classmethod
+    def get_file_workers(cls, section='scheduler'):
+        """ number of worker processes for per-file work inside one project"""
+        return cls.parser.getint(section, 'file_workers', fallback=1)
+
     @classmethod
     def get_cloc_path(cls, section='cloc'):
         """ get path to the cloc program executable (like cloc-1.72.exe for Windows)"""
         return cls.parser[section]['path']
 
+    @classmethod
+    def get_line_counter_engine(cls, section='cloc'):
+        """ 'external' to run cloc executable, 'builtin' to count lines in-process (Java, C/C++, C# only)"""
+        return cls.parser.get(section, 'engine', fallback='external')
+
+    @classmethod
+    def get_cloc_chunk_size(cls, section='cloc'):
+        """ number of files passed to one cloc invocation, results of every chunk are used as soon as it is ready"""
+        return cls.parser.getint(section, 'chunk_size', fallback=2000)
+
     @classmethod
     def get_python27_path(cls, section='python27'):
         return cls.parser[section]['path']
@@ -26,8 +90,137 @@ class Config:
 
     @classmethod
     def get_path_for_temp_metrixpp_db(cls, section='metrix++'):
+        """ name of the temporary metrix++ db, every project keeps its own copy in its working directory"""
         return cls.parser[section]['db_file']
 
+    @classmethod
+    def get_metrixpp_engine(cls, section='metrix++'):
+        """ 'external' to run metrix++, 'builtin' to extract regions in-process (Java, C/C++, C# only)"""
+        return cls.parser.get(section, 'engine', fallback='external')
+
+    @classmethod
+    def get_metrixpp_view_batch_size(cls, section='metrix++'):
+        """ max number of files passed to one `metrix++ view` invocation"""
+        return cls.parser.getint(section, 'view_batch_size', fallback=200)
+
+    @classmethod
+    def get_metrixpp_reader(cls, section='metrix++'):
+        """ how metrix++ results are read: 'xml' (via metrix++ view) or 'sqlite' (directly from db_file)"""
+        return cls.parser.get(section, 'reader', fallback='xml')
+
+    @classmethod
+    def get_retry_attempts(cls, section='retry'):
+        """ how many times a crashed external tool (git, cloc, metrix++) is run before the project fails"""
+        return max(1, cls.parser.getint(section, 'attempts', fallback=3))
+
+    @classmethod
+    def get_retry_backoff_seconds(cls, section='retry'):
+        """ delay before the second attempt, doubled for every next one"""
+        return cls.parser.getfloat(section, 'backoff_seconds', fallback=5.0)
+
+    @classmethod
+    def get_file_timeout_seconds(cls, section='limits'):
+        """ wall-clock budget of one file in every analysis step, files going over it are quarantined. 0 for no limit"""
+        return cls.parser.getfloat(section, 'file_timeout_seconds', fallback=0)
+
+    @classmethod
+    def get_file_memory_mb(cls, section='limits'):
+        """ memory of a worker process analyzing files (and of the tools it runs), 0 for no limit"""
+        return cls.parser.getint(section, 'file_memory_mb', fallback=0)
+
+    @classmethod
+    def get_filter_exclude_globs(cls, section='filter'):
+        """ files matching any of the comma separated globs are not analyzed"""
+        return [glob.strip() for glob in cls.parser.get(section, 'exclude', fallback='').split(",") if glob.strip()]
+
+    @classmethod
+    def get_filter_max_size_kb(cls, section='filter'):
+        """ bigger files are not analyzed, 0 for no limit"""
+        return cls.parser.getint(section, 'max_size_kb', fallback=0)
+
+    @classmethod
+    def get_filter_max_lines(cls, section='filter'):
+        """ files with more lines are not analyzed, 0 for no limit"""
+        return cls.parser.getint(section, 'max_lines', fallback=0)
+
+    @classmethod
+    def get_filter_generated_markers(cls, section='filter'):
+        """ files with any of the comma separated markers in their header are considered generated and not analyzed"""
+        return [marker.strip() for marker in cls.parser.get(section, 'generated_markers', fallback='').split(",")
+                if marker.strip()]
+
+    @classmethod
+    def get_max_tool_processes(cls, section='tools'):
+        """ external tools (git, cloc, metrix++) running at once in the whole run, the others wait"""
+        return max(1, cls.parser.getint(section, 'max_processes', fallback=8))
+
+    @classmethod
+    def get_git_timeout_seconds(cls, section='tools'):
+        """ git clone or fetch running longer is killed and retried, 0 for no limit"""
+        return cls.parser.getfloat(section, 'git_timeout', fallback=0)
+
+    @classmethod
+    def get_cloc_timeout_seconds(cls, section='tools'):
+        """ cloc of one chunk running longer is killed and retried, 0 for no limit"""
+        return cls.parser.getfloat(section, 'cloc_timeout', fallback=0)
+
+    @classmethod
+    def get_metrixpp_timeout_seconds(cls, section='tools'):
+        """ metrix++ collect or view running longer is killed and retried, 0 for no limit"""
+        return cls.parser.getfloat(section, 'metrixpp_timeout', fallback=0)
+
+    @classmethod
+    def get_checkpoint_path(cls, section='checkpoint'):
+        """ file with progress of the todo run, empty to disable resuming"""
+        return cls.parser.get(section, 'path', fallback='checkpoint.json')
+
+    @classmethod
+    def get_result_cache_path(cls, section='cache'):
+        """ file with results of files shared by projects and runs, empty to disable the cache"""
+        return cls.parser.get(section, 'path', fallback='')
+
+    @classmethod
+    def get_result_cache_max_size_mb(cls, section='cache'):
+        """ least recently used results are evicted when the cache grows bigger"""
+        return cls.parser.getint(section, 'max_size_mb', fallback=1024)
+
+    @classmethod
+    def get_storage_backend(cls, section='database'):
+        """ where results are stored: 'postgresql' or 'sqlite' (embedded, see [sqlite])"""
+        return cls.parser.get(section, 'backend', fallback='postgresql')
+
+    @classmethod
+    def get_sqlite_path(cls, section='sqlite'):
+        return cls.parser.get(section, 'path', fallback='metrics.sqlite')
+
+    @classmethod
+    def use_bulk_load(cls, section='database'):
+        """ whether results are sent to the database with COPY in batches instead of row by row"""
+        return cls.parser.getboolean(section, 'bulk_load', fallback=True)
+
+    @classmethod
+    def get_bulk_batch_size(cls, section='database'):
+        return cls.parser.getint(section, 'bulk_batch_size', fallback=10000)
+
+    @classmethod
+    def use_background_load(cls, section='database'):
+        """ whether bulk batches are sent from a separate thread and connection while analysis goes on"""
+        return cls.parser.getboolean(section, 'background_load', fallback=True)
+
+    @classmethod
+    def get_report_path(cls, section='report'):
+        """ directory for json run reports, empty to disable them"""
+        return cls.parser.get(section, 'path', fallback='reports')
+
+    @classmethod
+    def store_runs_in_database(cls, section='report'):
+        """ whether project timings are stored to runs table as well"""
+        return cls.parser.getboolean(section, 'store_in_database', fallback=False)
+
+    @classmethod
+    def get_report_slowest_files(cls, section='report'):
+        return cls.parser.getint(section, 'slowest_files', fallback=20)
+
     @classmethod
     def get_postgresql_conn_parameters(cls, section='postgresql'):
         # get section, default to postgresql
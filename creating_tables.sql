@@ -1,3 +1,8 @@
+DROP TABLE IF EXISTS quarantined_files;
+DROP TABLE IF EXISTS language_stats;
+DROP TABLE IF EXISTS runs;
+DROP TABLE IF EXISTS revision_files;
+DROP TABLE IF EXISTS revisions;
 DROP TABLE IF EXISTS functions;
 DROP TABLE IF EXISTS regions;
 DROP TABLE IF EXISTS region_types;
@@ -12,6 +17,8 @@ CREATE TABLE projects (
   name TEXT NOT NULL
 );
 
+CREATE INDEX ON projects (url);
+
 
 CREATE TABLE languages (
   name TEXT PRIMARY KEY
@@ -25,11 +32,14 @@ CREATE TABLE files (
   language_name      TEXT    NOT NULL REFERENCES languages (name),
   cloc_blank_lines   INTEGER,
   cloc_comment_lines INTEGER,
-  cloc_code_lines    INTEGER
+  cloc_code_lines    INTEGER,
+  blob_sha           TEXT,
+  analyzer_version   TEXT
 );
 
 
 CREATE INDEX ON files (language_name, project_id);
+CREATE INDEX ON files (project_id);
 
 
 CREATE TABLE region_types (
@@ -49,7 +59,8 @@ CREATE TABLE regions (
   n_functions     INTEGER
 );
 
-CREATE INDEX ON regions (file_id);
+-- covers per-class queries (methods and code lines per class) without reading the table
+CREATE INDEX ON regions (file_id, region_type, n_functions, code_lines);
 
 CREATE TABLE functions (
   id                    SERIAL PRIMARY KEY,
@@ -62,7 +73,72 @@ CREATE TABLE functions (
   cyclomatic_complexity INTEGER
 );
 
-CREATE INDEX ON functions (file_id);
+-- covers CCN and code lines per function queries without reading the table
+CREATE INDEX ON functions (file_id, cyclomatic_complexity, code_lines);
+
+
+-- history mode: analyzed revisions of a project and the files (of any earlier revision) they consist of
+CREATE TABLE revisions (
+  id           SERIAL PRIMARY KEY,
+  project_id   INTEGER NOT NULL REFERENCES projects (id) ON DELETE CASCADE,
+  commit_sha   TEXT    NOT NULL,
+  committed_at TIMESTAMP WITH TIME ZONE,
+  UNIQUE (project_id, commit_sha)
+);
+
+CREATE TABLE revision_files (
+  revision_id INTEGER NOT NULL REFERENCES revisions (id) ON DELETE CASCADE,
+  file_id     INTEGER NOT NULL REFERENCES files (id) ON DELETE CASCADE,
+  PRIMARY KEY (revision_id, file_id)
+);
+
+CREATE INDEX ON revision_files (file_id);
+
+
+-- timings of project runs (optional, see [report] in config.ini)
+CREATE TABLE runs (
+  id               SERIAL PRIMARY KEY,
+  project_id       INTEGER          NOT NULL REFERENCES projects (id) ON DELETE CASCADE,
+  started_at       TIMESTAMP WITH TIME ZONE NOT NULL,
+  wall_seconds     DOUBLE PRECISION NOT NULL,
+  analyzer_version TEXT,
+  report           JSONB            NOT NULL
+);
+
+CREATE INDEX ON runs (project_id);
+
+
+-- totals of every language of a project, computed while the project is stored (any cloc language, no handler needed)
+CREATE TABLE language_stats (
+  project_id                    INTEGER NOT NULL REFERENCES projects (id) ON DELETE CASCADE,
+  language_name                 TEXT    NOT NULL,
+  code_lines                    INTEGER,
+  cloc_code_lines               INTEGER,
+  cloc_comment_lines            INTEGER,
+  cloc_blank_lines              INTEGER,
+  functions                     INTEGER,
+  average_cyclomatic_complexity DOUBLE PRECISION,
+  code_lines_per_function       DOUBLE PRECISION,
+  files                         INTEGER,
+  cloc_files                    INTEGER,
+  ccn_p50                       INTEGER,
+  ccn_p90                       INTEGER,
+  ccn_p99                       INTEGER,
+  ccn_max                       INTEGER,
+  PRIMARY KEY (project_id, language_name)
+);
+
+-- files of a project which went over the time or memory budget of an analysis step (see [limits] in config.ini),
+-- they are not in files table
+CREATE TABLE quarantined_files (
+  project_id INTEGER NOT NULL REFERENCES projects (id) ON DELETE CASCADE,
+  path       TEXT    NOT NULL,
+  blob_sha   TEXT,
+  stage      TEXT    NOT NULL,
+  reason     TEXT    NOT NULL
+);
+
+CREATE INDEX ON quarantined_files (project_id);
 
 INSERT INTO languages (name) VALUES
   ('Java'),
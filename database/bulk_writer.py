@@ -0,0 +1,179 @@
+import io
+import logging
+import queue
+import threading
+from collections import deque
+from typing import Deque, Dict, List
+
+from database import db_helpers
+from database.connection_pool import ConnectionPool
+from info.file_info import FileInfo
+from info.function_info import FunctionInfo
+from info.region_info import RegionInfo
+from instrumentation import Measurement, RunStats
+
+
+def to_copy_value(value) -> str:
+    """ formats one value for COPY ... FROM STDIN in text format"""
+    if value is None:
+        return "\\N"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+class BulkWriter:
+    """
+    Buffers files, regions and functions of a project and streams them to PostgreSQL with COPY.
+    Ids are reserved from the tables' sequences beforehand, so links between rows are known before sending them.
+    Batches may be sent from a background thread through a separate connection, then analysis doesn't wait for them
+    """
+
+    columns_for_table = {
+        "files": ("id", "project_id", "path", "language_name",
+                  "cloc_blank_lines", "cloc_comment_lines", "cloc_code_lines", "blob_sha", "analyzer_version"),
+        "regions": ("id", "file_id", "region_type", "short_name", "outer_region_id",
+                    "total_lines", "code_lines", "comment_lines", "n_functions"),
+        "functions": ("id", "file_id", "region_id", "short_name",
+                      "total_lines", "code_lines", "comment_lines", "cyclomatic_complexity"),
+    }
+
+    def __init__(self, conn, batch_size: int, loader_pool: ConnectionPool = None, run_stats: RunStats = None):
+        """
+        :param conn: open db connection
+        :param batch_size: number of buffered rows which causes flush
+        :param loader_pool: pool of the background loader connection, batches are sent in place if None
+        :param run_stats: timings of the project, sending batches counts as 'db insert' stage
+        """
+        self.conn = conn
+        self.batch_size = batch_size
+        self.run_stats = run_stats
+        self.reserved_ids: Dict[str, Deque[int]] = {table: deque() for table in self.columns_for_table}
+        self.rows: Dict[str, List[tuple]] = {table: [] for table in self.columns_for_table}
+        self.buffered_rows = 0
+
+        self.load_queue: queue.Queue = None
+        self.loader_thread: threading.Thread = None
+        self.load_error: Exception = None
+        if loader_pool is not None:
+            # one batch is being sent while the next one is buffered
+            self.load_queue = queue.Queue(maxsize=1)
+            self.loader_thread = threading.Thread(target=self.run_loader, args=(loader_pool,), daemon=True)
+            self.loader_thread.start()
+
+    def reserve_ids(self, table: str, count: int) -> List[int]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s);", (table, count))
+        result = [row[0] for row in cur.fetchall()]
+        cur.close()
+        self.conn.commit()  # don't keep the transaction open, rows may be sent through another connection
+        return result
+
+    def next_id(self, table: str) -> int:
+        reserved = self.reserved_ids[table]
+        if len(reserved) == 0:
+            reserved.extend(self.reserve_ids(table, self.batch_size))
+        return reserved.popleft()
+
+    def add_row(self, table: str, row: tuple):
+        self.rows[table].append(row)
+        self.buffered_rows += 1
+
+    def add_file(self, file_info: FileInfo, regions: List[RegionInfo]):
+        """
+        Buffers file with its regions, updating their ids
+        :param file_info: analyzed file
+        :param regions: regions of the file (outer regions must go before inner ones)
+        """
+        file_info.id = self.next_id("files")
+        self.add_row("files", (file_info.id,) + db_helpers.get_file_row(file_info))
+
+        for region_info in regions:
+            if region_info.is_inside_some_function:
+                continue
+            if isinstance(region_info, FunctionInfo):
+                region_info.id = self.next_id("functions")
+                self.add_row("functions", (region_info.id,) + db_helpers.get_function_row(region_info))
+            else:
+                region_info.id = self.next_id("regions")
+                self.add_row("regions", (region_info.id,) + db_helpers.get_region_row(region_info))
+
+        if self.buffered_rows >= self.batch_size:
+            self.flush()
+
+    def copy_rows(self, cur, table: str, rows: List[tuple]):
+        if len(rows) == 0:
+            return
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write("\t".join(to_copy_value(value) for value in row))
+            buffer.write("\n")
+        buffer.seek(0)
+        cur.copy_expert("COPY {0} ({1}) FROM STDIN;".format(table, ", ".join(self.columns_for_table[table])),
+                        buffer)
+
+    def load_rows(self, conn, rows: Dict[str, List[tuple]], row_count: int):
+        """ sends rows of one batch in one transaction"""
+        measurement = Measurement()
+        cur = conn.cursor()
+        # order matters because of foreign keys
+        for table in ("files", "regions", "functions"):
+            self.copy_rows(cur, table, rows[table])
+        conn.commit()
+        cur.close()
+        if self.run_stats is not None:
+            self.run_stats.add("db insert", measurement.stop())
+        logging.info("bulk writer: {0} rows sent".format(row_count))
+
+    def run_loader(self, loader_pool: ConnectionPool):
+        conn = None
+        try:
+            conn = loader_pool.acquire()
+        except Exception as e:
+            self.load_error = e
+        while True:
+            batch = self.load_queue.get()
+            if batch is None:
+                break
+            if self.load_error is not None:
+                continue  # the batches are lost anyway, just don't block the writer
+            try:
+                self.load_rows(conn, *batch)
+            except Exception as e:
+                logging.exception("bulk writer: background load failed")
+                self.load_error = e
+        if conn is not None:
+            loader_pool.release(conn, broken=self.load_error is not None)
+
+    def check_loader(self):
+        if self.load_error is not None:
+            raise RuntimeError("bulk writer: background load failed") from self.load_error
+
+    def flush(self):
+        """ sends all buffered rows in one transaction (in background if there is a loader)"""
+        if self.buffered_rows == 0:
+            return
+        rows = self.rows
+        row_count = self.buffered_rows
+        self.rows = {table: [] for table in self.columns_for_table}
+        self.buffered_rows = 0
+
+        if self.load_queue is None:
+            self.load_rows(self.conn, rows, row_count)
+        else:
+            self.check_loader()
+            self.load_queue.put((rows, row_count))
+
+    def close(self, raise_error: bool = True):
+        """
+        Waits until the background loader sends everything flushed before, buffered rows are not sent
+        :param raise_error: False when the analysis has failed already: then a failed background load is only logged,
+        so it does not hide the original error
+        """
+        if self.loader_thread is None:
+            return
+        self.load_queue.put(None)
+        self.loader_thread.join()
+        self.loader_thread = None
+        if raise_error:
+            self.check_loader()
+        elif self.load_error is not None:
+            logging.error("bulk writer: background load failed too: {0}".format(self.load_error))
@@ -0,0 +1,68 @@
+import logging
+import queue
+import threading
+from typing import Callable
+
+
+class ConnectionPool:
+    """
+    Open db connections shared by the projects and bulk loaders of a run, so they are not opened for each of them.
+    A connection is used by one thread at a time; acquire() waits while all max_connections are in use
+    """
+
+    def __init__(self, connect: Callable, max_connections: int):
+        """
+        :param connect: opens new DB-API connection
+        :param max_connections: connections open at the same time
+        """
+        self.connect = connect
+        self.max_connections = max(1, max_connections)
+        self.idle_connections = queue.LifoQueue()
+        self.semaphore = threading.BoundedSemaphore(self.max_connections)
+        self.closed = False
+
+    def acquire(self):
+        self.semaphore.acquire()
+        try:
+            return self.idle_connections.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self.connect()
+        except Exception:
+            self.semaphore.release()
+            raise
+
+    def release(self, conn, broken: bool = False):
+        """
+        Returns connection to the pool, its open transaction (if any) is rolled back
+        :param broken: close the connection instead, e.g. after a network error
+        """
+        if not broken:
+            try:
+                conn.rollback()
+            except Exception:
+                logging.exception("connection pool: rollback failed, closing the connection")
+                broken = True
+        if broken or self.closed:
+            self.close_connection(conn)
+        else:
+            self.idle_connections.put(conn)
+        self.semaphore.release()
+
+    @staticmethod
+    def close_connection(conn):
+        try:
+            conn.close()
+        except Exception:
+            logging.exception("connection pool: close failed")
+
+    def close(self):
+        """ closes idle connections, the ones in use are closed when released"""
+        self.closed = True
+        while True:
+            try:
+                conn = self.idle_connections.get_nowait()
+            except queue.Empty:
+                break
+            self.close_connection(conn)
@@ -1,5 +1,9 @@
+import json
+from typing import Dict, List, Tuple
+
 from info.file_info import FileInfo
 from info.function_info import FunctionInfo
+from info.language_stat import LanguageStat
 from info.project_info import ProjectInfo
 from info.region_info import RegionInfo
 
@@ -23,69 +27,93 @@ def add_new_project(conn, project_info: ProjectInfo) -> int:
     return project_id
 
 
-def add_new_file(conn, file_info: FileInfo) -> int:
+def get_file_row(file_info: FileInfo) -> tuple:
+    """
+    values for (project_id, path, language_name, cloc_blank_lines, cloc_comment_lines, cloc_code_lines,
+    blob_sha, analyzer_version)
+    """
+    return (file_info.project_info.id, file_info.path, file_info.language,
+            file_info.cloc_metrics.blank, file_info.cloc_metrics.comment,
+            file_info.cloc_metrics.code, file_info.blob_sha, file_info.project_info.tool_versions)
+
+
+def add_new_file(conn, file_info: FileInfo, commit: bool = True) -> int:
     """
     Inserts new file to the database, updating file_info.id
     :param conn: open psycopg2 db connection
     :param file_info: file to be added
+    :param commit: commit the transaction, otherwise the caller does it
     :return: new file_id
     """
     insert_file_sql = """INSERT INTO files(project_id, path, language_name,
-        cloc_blank_lines, cloc_comment_lines, cloc_code_lines)
-        VALUES (%s, %s, %s, %s, %s, %s) RETURNING id;"""
+        cloc_blank_lines, cloc_comment_lines, cloc_code_lines, blob_sha, analyzer_version)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING id;"""
 
     cur = conn.cursor()
-    cur.execute(insert_file_sql, (file_info.project_info.id, file_info.path, file_info.language,
-                                  file_info.cloc_metrics.blank, file_info.cloc_metrics.comment,
-                                  file_info.cloc_metrics.code))
+    cur.execute(insert_file_sql, get_file_row(file_info))
     file_id = cur.fetchone()[0]
     file_info.id = file_id
 
-    conn.commit()
+    if commit:
+        conn.commit()
     cur.close()
     return file_id
 
 
-def delete_file(conn, file_info: FileInfo):
-    delete_sql = """DELETE FROM files WHERE id = %s;"""
-    cur = conn.cursor()
-    cur.execute(delete_sql, (file_info.id,))
-    conn.commit()
-    cur.close()
-    return
+def get_function_row(function_info: FunctionInfo) -> tuple:
+    """ values for (file_id, region_id, short_name, total_lines, code_lines, comment_lines, cyclomatic_complexity)"""
+    return (function_info.file_info.id,
+            function_info.outer_region.id,
+            function_info.short_name,
+            function_info.total_lines,
+            function_info.total_code_lines,  # todo: or own_code_lines ?
+            function_info.total_comment_lines,  # todo: or own_comment_lines ?
+            function_info.cyclomatic_complexity)
 
 
-def add_new_function(conn, function_info: FunctionInfo) -> int:
+def add_new_function(conn, function_info: FunctionInfo, commit: bool = True) -> int:
     """
     Inserts new function to the database, updating function_info.id
     :param conn: open psycopg2 db connection
     :param function_info: function to be added
+    :param commit: commit the transaction, otherwise the caller does it
     :return: new function_id
     """
     insert_function_sql = """INSERT INTO functions(file_id, region_id, short_name, total_lines, code_lines, comment_lines,
         cyclomatic_complexity) VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id;"""
 
     cur = conn.cursor()
-    cur.execute(insert_function_sql, (function_info.file_info.id,
-                                      function_info.outer_region.id,
-                                      function_info.short_name,
-                                      function_info.total_lines,
-                                      function_info.total_code_lines,  # todo: or own_code_lines ?
-                                      function_info.total_comment_lines,  # todo: or own_comment_lines ?
-                                      function_info.cyclomatic_complexity))
+    cur.execute(insert_function_sql, get_function_row(function_info))
     function_id = cur.fetchone()[0]
     function_info.id = function_id
 
-    conn.commit()
+    if commit:
+        conn.commit()
     cur.close()
     return function_id
 
 
-def add_new_region(conn, region_info: RegionInfo) -> int:
+def get_region_row(region_info: RegionInfo) -> tuple:
+    """
+    values for (file_id, region_type, short_name, outer_region_id, total_lines, code_lines, comment_lines,
+    n_functions)
+    """
+    average_cyclomatic_complexity = region_info.ccn_sum / region_info.n_functions if region_info.n_functions != 0 else 0
+    average_code_lines_per_function = None  # todo
+    outer_region_id = region_info.outer_region.id if region_info.outer_region is not None else None
+
+    return (region_info.file_info.id, region_info.region_type.name, region_info.short_name,
+            outer_region_id, region_info.total_lines, region_info.total_code_lines,
+            region_info.total_comment_lines,
+            region_info.n_functions)
+
+
+def add_new_region(conn, region_info: RegionInfo, commit: bool = True) -> int:
     """
     Inserts new region to the database, updating region_info.id
     :param conn: open psycopg2 db connection
     :param region_info: region to be added
+    :param commit: commit the transaction, otherwise the caller does it
     :return: new region_id
     """
     insert_region_sql = """INSERT INTO regions(file_id, region_type, short_name,
@@ -93,18 +121,257 @@ def add_new_region(conn, region_info: RegionInfo) -> int:
         comment_lines, n_functions)
         VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING id;"""
 
-    average_cyclomatic_complexity = region_info.ccn_sum / region_info.n_functions if region_info.n_functions != 0 else 0
-    average_code_lines_per_function = None  # todo
-    outer_region_id = region_info.outer_region.id if region_info.outer_region is not None else None
-
     cur = conn.cursor()
-    cur.execute(insert_region_sql, (region_info.file_info.id, region_info.region_type.name, region_info.short_name,
-                                    outer_region_id, region_info.total_lines, region_info.total_code_lines,
-                                    region_info.total_comment_lines,
-                                    region_info.n_functions))
+    cur.execute(insert_region_sql, get_region_row(region_info))
     region_id = cur.fetchone()[0]
     region_info.id = region_id
 
-    conn.commit()
+    if commit:
+        conn.commit()
     cur.close()
     return region_id
+
+
+def add_file_with_regions(conn, file_info: FileInfo, regions: List[RegionInfo]):
+    """
+    Inserts file with its regions and functions in one transaction, nothing is left in the database
+    if some insert fails (the error is raised)
+    :param conn: open psycopg2 db connection
+    :param file_info: file to be added
+    :param regions: regions of the file (outer regions must go before inner ones)
+    """
+    try:
+        add_new_file(conn, file_info, commit=False)
+        for region_info in regions:
+            if region_info.is_inside_some_function:
+                continue
+            if isinstance(region_info, FunctionInfo):
+                add_new_function(conn, region_info, commit=False)
+            else:
+                add_new_region(conn, region_info, commit=False)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        file_info.id = None
+        raise
+
+
+def delete_project(conn, project_id: int):
+    """ deletes project with all its files, regions, functions and revisions"""
+    cur = conn.cursor()
+    cur.execute("""DELETE FROM projects WHERE id = %s;""", (project_id,))
+    conn.commit()
+    cur.close()
+
+
+def get_stored_files(conn, project_info: ProjectInfo) -> Dict[str, int]:
+    """
+    :param conn: open psycopg2 db connection
+    :param project_info: project with id
+    :return: file_id for every path stored for the project so far
+    """
+    cur = conn.cursor()
+    cur.execute("""SELECT id, path FROM files WHERE project_id = %s;""", (project_info.id,))
+    result = {path: file_id for file_id, path in cur.fetchall()}
+    cur.close()
+    return result
+
+
+def get_previous_files(conn, project_info: ProjectInfo) -> Dict[str, Tuple[int, str]]:
+    """
+    Finds files stored by the previous run for the same url with the same tool versions
+    :param conn: open psycopg2 db connection
+    :param project_info: project of the current run (already added)
+    :return: (file_id, blob_sha) for every path
+    """
+    select_sql = """SELECT id, path, blob_sha FROM files
+        WHERE project_id = (SELECT max(id) FROM projects WHERE url = %s AND id < %s)
+        AND analyzer_version = %s AND blob_sha IS NOT NULL;"""
+
+    cur = conn.cursor()
+    cur.execute(select_sql, (project_info.url, project_info.id, project_info.tool_versions))
+    result = {path: (file_id, blob_sha) for file_id, path, blob_sha in cur.fetchall()}
+    cur.close()
+    return result
+
+
+def copy_files_to_project(conn, file_ids: List[int], project_info: ProjectInfo) -> int:
+    """
+    Copies stored files with all their regions and functions to another project, on the server side
+    :param conn: open psycopg2 db connection
+    :param file_ids: ids of files to copy
+    :param project_info: project the copies belong to
+    :return: number of copied files
+    """
+    copy_sql = """
+        CREATE TEMP TABLE file_map ON COMMIT DROP AS
+            SELECT id AS old_id, nextval(pg_get_serial_sequence('files', 'id')) AS new_id
+            FROM files WHERE id = ANY(%(file_ids)s);
+        INSERT INTO files(id, project_id, path, language_name, cloc_blank_lines, cloc_comment_lines,
+                          cloc_code_lines, blob_sha, analyzer_version)
+            SELECT fm.new_id, %(project_id)s, f.path, f.language_name, f.cloc_blank_lines, f.cloc_comment_lines,
+                   f.cloc_code_lines, f.blob_sha, f.analyzer_version
+            FROM files f JOIN file_map fm ON fm.old_id = f.id;
+
+        CREATE TEMP TABLE region_map ON COMMIT DROP AS
+            SELECT r.id AS old_id, nextval(pg_get_serial_sequence('regions', 'id')) AS new_id
+            FROM regions r JOIN file_map fm ON fm.old_id = r.file_id;
+        INSERT INTO regions(id, file_id, region_type, short_name, outer_region_id, total_lines, code_lines,
+                            comment_lines, n_functions)
+            SELECT rm.new_id, fm.new_id, r.region_type, r.short_name, orm.new_id, r.total_lines, r.code_lines,
+                   r.comment_lines, r.n_functions
+            FROM regions r JOIN region_map rm ON rm.old_id = r.id
+                           JOIN file_map fm ON fm.old_id = r.file_id
+                           LEFT JOIN region_map orm ON orm.old_id = r.outer_region_id;
+
+        INSERT INTO functions(file_id, region_id, short_name, total_lines, code_lines, comment_lines,
+                              cyclomatic_complexity)
+            SELECT fm.new_id, rm.new_id, fn.short_name, fn.total_lines, fn.code_lines, fn.comment_lines,
+                   fn.cyclomatic_complexity
+            FROM functions fn JOIN file_map fm ON fm.old_id = fn.file_id
+                              JOIN region_map rm ON rm.old_id = fn.region_id;"""
+
+    if len(file_ids) == 0:
+        return 0
+    cur = conn.cursor()
+    cur.execute(copy_sql, {"file_ids": file_ids, "project_id": project_info.id})
+    conn.commit()
+    cur.close()
+    return len(file_ids)
+
+
+def add_revision(conn, project_info: ProjectInfo, commit_sha: str, committed_at: int, file_ids: List[int]) -> int:
+    """
+    Inserts analyzed revision of the project with links to the files it consists of
+    :param conn: open psycopg2 db connection
+    :param project_info: analyzed project
+    :param commit_sha: git commit of the revision
+    :param committed_at: commit unix timestamp
+    :param file_ids: stored files of the revision
+    :return: new revision_id
+    """
+    insert_revision_sql = """INSERT INTO revisions(project_id, commit_sha, committed_at)
+        VALUES (%s, %s, to_timestamp(%s)) RETURNING id;"""
+    insert_revision_files_sql = """INSERT INTO revision_files(revision_id, file_id)
+        SELECT %s, unnest(%s::INTEGER[]);"""
+
+    cur = conn.cursor()
+    cur.execute(insert_revision_sql, (project_info.id, commit_sha, committed_at))
+    revision_id = cur.fetchone()[0]
+    cur.execute(insert_revision_files_sql, (revision_id, file_ids))
+
+    conn.commit()
+    cur.close()
+    return revision_id
+
+
+def add_run(conn, project_info: ProjectInfo, project_report: dict) -> int:
+    """
+    Inserts timings of the project run
+    :param conn: open psycopg2 db connection
+    :param project_info: analyzed project
+    :param project_report: report of the project as it is written to the json run report
+    :return: new run id
+    """
+    insert_run_sql = """INSERT INTO runs(project_id, started_at, wall_seconds, analyzer_version, report)
+        VALUES (%s, to_timestamp(%s), %s, %s, %s::jsonb) RETURNING id;"""
+
+    cur = conn.cursor()
+    cur.execute(insert_run_sql, (project_info.id, project_report["started_at"], project_report["wall_seconds"],
+                                 project_info.tool_versions, json.dumps(project_report)))
+    run_id = cur.fetchone()[0]
+
+    conn.commit()
+    cur.close()
+    return run_id
+
+
+def get_language_stats_for_files(conn, file_ids: List[int]) -> Dict[str, LanguageStat]:
+    """
+    Sums up stored files, e.g. the ones reused from the previous run
+    :param conn: open psycopg2 db connection
+    :param file_ids: ids of stored files
+    :return: LanguageStat for every language of the files
+    """
+    files_sql = """SELECT language_name, count(*), sum(cloc_blank_lines), sum(cloc_comment_lines), sum(cloc_code_lines)
+        FROM files WHERE id = ANY(%s) GROUP BY language_name;"""
+    functions_sql = """SELECT f.language_name, fn.cyclomatic_complexity, count(*), sum(fn.code_lines)
+        FROM functions fn JOIN files f ON f.id = fn.file_id
+        WHERE fn.file_id = ANY(%s) GROUP BY f.language_name, fn.cyclomatic_complexity;"""
+
+    if len(file_ids) == 0:
+        return {}
+    cur = conn.cursor()
+    cur.execute(files_sql, (file_ids,))
+    files_rows = cur.fetchall()
+    cur.execute(functions_sql, (file_ids,))
+    functions_rows = cur.fetchall()
+    cur.close()
+    return get_language_stats_from_rows(files_rows, functions_rows)
+
+
+def get_language_stats_from_rows(files_rows: List[tuple], functions_rows: List[tuple]) -> Dict[str, LanguageStat]:
+    """
+    :param files_rows: (language_name, files, cloc_blank_lines, cloc_comment_lines, cloc_code_lines)
+    :param functions_rows: (language_name, cyclomatic_complexity, functions, code_lines)
+    """
+    result = {}
+    for language, files, blank_lines, comment_lines, code_lines in files_rows:
+        language_stat = result.setdefault(language, LanguageStat(language))
+        language_stat.files += files
+        language_stat.add_cloc_info(files, blank_lines or 0, comment_lines or 0, code_lines or 0)
+    for language, ccn, functions, code_lines in functions_rows:
+        result.setdefault(language, LanguageStat(language)).add_functions(ccn or 0, functions, code_lines or 0)
+    return result
+
+
+def get_language_stat_rows(project_info: ProjectInfo) -> List[tuple]:
+    """ values for (project_id, language_name, <LanguageStat.get_metrics_tuple_for_db()>)"""
+    return [(project_info.id, language) + language_stat.get_metrics_tuple_for_db()
+            for language, language_stat in project_info.language_stats.items()]
+
+
+language_stats_columns = ("project_id", "language_name", "code_lines", "cloc_code_lines", "cloc_comment_lines",
+                          "cloc_blank_lines", "functions", "average_cyclomatic_complexity", "code_lines_per_function",
+                          "files", "cloc_files", "ccn_p50", "ccn_p90", "ccn_p99", "ccn_max")
+
+
+def add_language_stats(conn, project_info: ProjectInfo):
+    """
+    Inserts totals of every language of the project
+    :param conn: open psycopg2 db connection
+    :param project_info: analyzed project
+    """
+    insert_sql = """INSERT INTO language_stats({0}) VALUES ({1});""".format(
+        ", ".join(language_stats_columns), ", ".join(["%s"] * len(language_stats_columns)))
+
+    cur = conn.cursor()
+    # the project may have been stored by an interrupted run
+    cur.execute("""DELETE FROM language_stats WHERE project_id = %s;""", (project_info.id,))
+    cur.executemany(insert_sql, get_language_stat_rows(project_info))
+
+    conn.commit()
+    cur.close()
+
+
+def get_quarantined_file_rows(project_info: ProjectInfo, blob_shas: Dict[str, str]) -> List[tuple]:
+    """ values for (project_id, path, blob_sha, stage, reason) of the files quarantined in the current analysis"""
+    return [(project_info.id, path, blob_shas.get(path.replace("\\", "/")), stage, reason)
+            for path, (stage, reason) in project_info.quarantined_files.items()]
+
+
+def add_quarantined_files(conn, project_info: ProjectInfo, blob_shas: Dict[str, str]):
+    """
+    Inserts files which went over their time or memory budget
+    :param conn: open psycopg2 db connection
+    :param project_info: analyzed project
+    :param blob_shas: git blob hashes of the project files
+    """
+    insert_sql = """INSERT INTO quarantined_files(project_id, path, blob_sha, stage, reason)
+        VALUES (%s, %s, %s, %s, %s);"""
+
+    cur = conn.cursor()
+    cur.executemany(insert_sql, get_quarantined_file_rows(project_info, blob_shas))
+
+    conn.commit()
+    cur.close()
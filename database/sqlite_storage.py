@@ -0,0 +1,239 @@
+import json
+import os
+import re
+import sqlite3
+from typing import Dict, List, Tuple
+
+from config import Config
+from database import db_helpers
+from database.bulk_writer import BulkWriter
+from database.storage import Storage
+from info.file_info import FileInfo
+from info.function_info import FunctionInfo
+from info.language_stat import LanguageStat
+from info.project_info import ProjectInfo
+from info.region_info import RegionInfo
+from instrumentation import RunStats
+
+schema_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "creating_tables.sql")
+
+# sequences of SERIAL columns, ids are reserved from here as from PostgreSQL sequences
+sequences_sql = "CREATE TABLE IF NOT EXISTS sequences (name TEXT PRIMARY KEY, last_id INTEGER NOT NULL);"
+
+index_pattern = re.compile(r"CREATE INDEX ON (\w+) \(([\w, ]+)\)")
+
+
+def get_sqlite_schema(postgresql_schema: str) -> str:
+    """
+    Translates creating_tables.sql to SQLite, so the tables are the same for both backends.
+    Existing tables are kept, nothing is dropped
+    """
+    def name_index(match) -> str:
+        columns = [column.strip() for column in match.group(2).split(",")]
+        return "CREATE INDEX IF NOT EXISTS {0}_{1}_idx ON {0} ({2})".format(match.group(1), "_".join(columns),
+                                                                           ", ".join(columns))
+
+    statements = []
+    for statement in postgresql_schema.split(";"):
+        statement = statement.strip()
+        if statement == "" or statement.startswith("DROP TABLE"):
+            continue
+        statement = statement.replace("SERIAL PRIMARY KEY", "INTEGER PRIMARY KEY")
+        statement = statement.replace("TIMESTAMP WITH TIME ZONE", "TEXT").replace("JSONB", "TEXT")
+        statement = statement.replace("CREATE TABLE ", "CREATE TABLE IF NOT EXISTS ")
+        statement = statement.replace("INSERT INTO ", "INSERT OR IGNORE INTO ")
+        statement = index_pattern.sub(name_index, statement)
+        statements.append(statement + ";")
+    statements.append(sequences_sql)
+    return "\n".join(statements)
+
+
+def reserve_ids(conn, table: str, count: int, commit: bool = True) -> List[int]:
+    """
+    Takes count ids for the table, safe for several connections to the same file
+    :param commit: end the transaction, otherwise the sequence stays locked until the caller commits
+    """
+    cur = conn.cursor()
+    cur.execute("INSERT OR IGNORE INTO sequences (name, last_id) VALUES (?, 0);", (table,))
+    cur.execute("UPDATE sequences SET last_id = last_id + ? WHERE name = ?;", (count, table))
+    cur.execute("SELECT last_id FROM sequences WHERE name = ?;", (table,))
+    last_id = cur.fetchone()[0]
+    if commit:
+        conn.commit()
+    cur.close()
+    return list(range(last_id - count + 1, last_id + 1))
+
+
+class SqliteBulkWriter(BulkWriter):
+    """ BulkWriter for SQLite: batches go in one transaction with executemany instead of COPY"""
+
+    def reserve_ids(self, table: str, count: int) -> List[int]:
+        return reserve_ids(self.conn, table, count)
+
+    def copy_rows(self, cur, table: str, rows: List[tuple]):
+        if len(rows) == 0:
+            return
+        columns = self.columns_for_table[table]
+        cur.executemany("INSERT INTO {0} ({1}) VALUES ({2});".format(table, ", ".join(columns),
+                                                                    ", ".join("?" * len(columns))), rows)
+
+
+class SqliteStorage(Storage):
+    """
+    Embedded database in one file ([sqlite] path in config.ini), no server needed.
+    WAL mode lets the background loader write while the project connection reads
+    """
+
+    @classmethod
+    def connect(cls):
+        # pooled connections move between threads, but only one thread uses a connection at a time
+        conn = sqlite3.connect(Config.get_sqlite_path(), timeout=60, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        conn.execute("PRAGMA foreign_keys=ON;")
+        # tables and indexes missing in the file are created, e.g. the ones added to the schema since it was created
+        with open(schema_path, "rt", encoding="utf-8") as schema_file:
+            conn.executescript(get_sqlite_schema(schema_file.read()))
+        return conn
+
+    def create_bulk_writer(self, batch_size: int, background: bool, run_stats: RunStats = None) -> BulkWriter:
+        return SqliteBulkWriter(self.conn, batch_size, self.pool if background else None, run_stats)
+
+    def insert_with_new_id(self, table: str, columns: List[str], row: tuple) -> int:
+        """ inserts row without committing, the id is taken from the sequence of the table"""
+        new_id = reserve_ids(self.conn, table, 1, commit=False)[0]
+        self.conn.execute("INSERT INTO {0} (id, {1}) VALUES ({2});".format(table, ", ".join(columns),
+                                                                          ", ".join("?" * (len(row) + 1))),
+                          (new_id,) + row)
+        return new_id
+
+    def add_new_project(self, project_info: ProjectInfo) -> int:
+        project_info.id = self.insert_with_new_id("projects", ["url", "name"], (project_info.url, project_info.name))
+        self.conn.commit()
+        return project_info.id
+
+    def add_file_with_regions(self, file_info: FileInfo, regions: List[RegionInfo]):
+        columns_for_table = BulkWriter.columns_for_table
+        try:
+            file_info.id = self.insert_with_new_id("files", columns_for_table["files"][1:],
+                                                   db_helpers.get_file_row(file_info))
+            for region_info in regions:
+                if region_info.is_inside_some_function:
+                    continue
+                if isinstance(region_info, FunctionInfo):
+                    region_info.id = self.insert_with_new_id("functions", columns_for_table["functions"][1:],
+                                                             db_helpers.get_function_row(region_info))
+                else:
+                    region_info.id = self.insert_with_new_id("regions", columns_for_table["regions"][1:],
+                                                             db_helpers.get_region_row(region_info))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            file_info.id = None
+            raise
+
+    def delete_project(self, project_id: int):
+        self.conn.execute("DELETE FROM projects WHERE id = ?;", (project_id,))
+        self.conn.commit()
+
+    def get_stored_files(self, project_info: ProjectInfo) -> Dict[str, int]:
+        rows = self.conn.execute("SELECT id, path FROM files WHERE project_id = ?;", (project_info.id,))
+        return {path: file_id for file_id, path in rows}
+
+    def get_previous_files(self, project_info: ProjectInfo) -> Dict[str, Tuple[int, str]]:
+        select_sql = """SELECT id, path, blob_sha FROM files
+            WHERE project_id = (SELECT max(id) FROM projects WHERE url = ? AND id < ?)
+            AND analyzer_version = ? AND blob_sha IS NOT NULL;"""
+        rows = self.conn.execute(select_sql, (project_info.url, project_info.id, project_info.tool_versions))
+        return {path: (file_id, blob_sha) for file_id, path, blob_sha in rows}
+
+    def create_id_map(self, name: str, table: str, old_ids: List[int]):
+        """ temp table <name> (old_id, new_id) with new ids reserved for rows of the table"""
+        self.conn.execute("DROP TABLE IF EXISTS temp.{0};".format(name))
+        self.conn.execute("CREATE TEMP TABLE {0} (old_id INTEGER PRIMARY KEY, new_id INTEGER);".format(name))
+        new_ids = reserve_ids(self.conn, table, len(old_ids), commit=False) if len(old_ids) > 0 else []
+        self.conn.executemany("INSERT INTO {0} (old_id, new_id) VALUES (?, ?);".format(name), zip(old_ids, new_ids))
+
+    def copy_files_to_project(self, file_ids: List[int], project_info: ProjectInfo) -> int:
+        """ same as db_helpers.copy_files_to_project, new ids are mapped here instead of by nextval()"""
+        if len(file_ids) == 0:
+            return 0
+        self.create_id_map("file_map", "files", file_ids)
+        self.conn.execute("""INSERT INTO files(id, project_id, path, language_name, cloc_blank_lines,
+                                               cloc_comment_lines, cloc_code_lines, blob_sha, analyzer_version)
+            SELECT fm.new_id, ?, f.path, f.language_name, f.cloc_blank_lines, f.cloc_comment_lines,
+                   f.cloc_code_lines, f.blob_sha, f.analyzer_version
+            FROM files f JOIN file_map fm ON fm.old_id = f.id;""", (project_info.id,))
+
+        region_ids = [row[0] for row in self.conn.execute(
+            "SELECT r.id FROM regions r JOIN file_map fm ON fm.old_id = r.file_id;")]
+        self.create_id_map("region_map", "regions", region_ids)
+        self.conn.execute("""INSERT INTO regions(id, file_id, region_type, short_name, outer_region_id, total_lines,
+                                                 code_lines, comment_lines, n_functions)
+            SELECT rm.new_id, fm.new_id, r.region_type, r.short_name, orm.new_id, r.total_lines, r.code_lines,
+                   r.comment_lines, r.n_functions
+            FROM regions r JOIN region_map rm ON rm.old_id = r.id
+                           JOIN file_map fm ON fm.old_id = r.file_id
+                           LEFT JOIN region_map orm ON orm.old_id = r.outer_region_id;""")
+
+        function_ids = [row[0] for row in self.conn.execute(
+            "SELECT fn.id FROM functions fn JOIN file_map fm ON fm.old_id = fn.file_id;")]
+        self.create_id_map("function_map", "functions", function_ids)
+        self.conn.execute("""INSERT INTO functions(id, file_id, region_id, short_name, total_lines, code_lines,
+                                                   comment_lines, cyclomatic_complexity)
+            SELECT fnm.new_id, fm.new_id, rm.new_id, fn.short_name, fn.total_lines, fn.code_lines, fn.comment_lines,
+                   fn.cyclomatic_complexity
+            FROM functions fn JOIN function_map fnm ON fnm.old_id = fn.id
+                              JOIN file_map fm ON fm.old_id = fn.file_id
+                              JOIN region_map rm ON rm.old_id = fn.region_id;""")
+        self.conn.commit()
+        self.conn.executescript("DROP TABLE temp.file_map; DROP TABLE temp.region_map; DROP TABLE temp.function_map;")
+        return len(file_ids)
+
+    def add_revision(self, project_info: ProjectInfo, commit_sha: str, committed_at: int, file_ids: List[int]) -> int:
+        revision_id = reserve_ids(self.conn, "revisions", 1)[0]
+        self.conn.execute("""INSERT INTO revisions(id, project_id, commit_sha, committed_at)
+            VALUES (?, ?, ?, datetime(?, 'unixepoch'));""", (revision_id, project_info.id, commit_sha, committed_at))
+        self.conn.executemany("INSERT INTO revision_files(revision_id, file_id) VALUES (?, ?);",
+                              ((revision_id, file_id) for file_id in file_ids))
+        self.conn.commit()
+        return revision_id
+
+    def add_run(self, project_info: ProjectInfo, project_report: dict) -> int:
+        run_id = reserve_ids(self.conn, "runs", 1)[0]
+        self.conn.execute("""INSERT INTO runs(id, project_id, started_at, wall_seconds, analyzer_version, report)
+            VALUES (?, ?, datetime(?, 'unixepoch'), ?, ?, ?);""",
+                          (run_id, project_info.id, project_report["started_at"], project_report["wall_seconds"],
+                           project_info.tool_versions, json.dumps(project_report)))
+        self.conn.commit()
+        return run_id
+
+    def get_language_stats_for_files(self, file_ids: List[int]) -> Dict[str, LanguageStat]:
+        if len(file_ids) == 0:
+            return {}
+        self.conn.execute("DROP TABLE IF EXISTS temp.selected_files;")
+        self.conn.execute("CREATE TEMP TABLE selected_files (id INTEGER PRIMARY KEY);")
+        self.conn.executemany("INSERT INTO selected_files (id) VALUES (?);", ((file_id,) for file_id in file_ids))
+        files_rows = self.conn.execute("""SELECT language_name, count(*), sum(cloc_blank_lines),
+                                                 sum(cloc_comment_lines), sum(cloc_code_lines)
+            FROM files WHERE id IN (SELECT id FROM selected_files) GROUP BY language_name;""").fetchall()
+        functions_rows = self.conn.execute("""SELECT f.language_name, fn.cyclomatic_complexity, count(*),
+                                                     sum(fn.code_lines)
+            FROM functions fn JOIN files f ON f.id = fn.file_id
+            WHERE fn.file_id IN (SELECT id FROM selected_files)
+            GROUP BY f.language_name, fn.cyclomatic_complexity;""").fetchall()
+        self.conn.execute("DROP TABLE temp.selected_files;")
+        self.conn.commit()
+        return db_helpers.get_language_stats_from_rows(files_rows, functions_rows)
+
+    def add_language_stats(self, project_info: ProjectInfo):
+        columns = db_helpers.language_stats_columns
+        self.conn.execute("DELETE FROM language_stats WHERE project_id = ?;", (project_info.id,))
+        self.conn.executemany("INSERT INTO language_stats ({0}) VALUES ({1});".format(
+            ", ".join(columns), ", ".join("?" * len(columns))), db_helpers.get_language_stat_rows(project_info))
+        self.conn.commit()
+
+    def add_quarantined_files(self, project_info: ProjectInfo, blob_shas: Dict[str, str]):
+        self.conn.executemany("""INSERT INTO quarantined_files(project_id, path, blob_sha, stage, reason)
+            VALUES (?, ?, ?, ?, ?);""", db_helpers.get_quarantined_file_rows(project_info, blob_shas))
+        self.conn.commit()
@@ -0,0 +1,175 @@
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Tuple, Type
+
+from config import Config
+from database import db_helpers
+from database.bulk_writer import BulkWriter
+from database.connection_pool import ConnectionPool
+from info.file_info import FileInfo
+from info.language_stat import LanguageStat
+from info.project_info import ProjectInfo
+from info.region_info import RegionInfo
+from instrumentation import RunStats
+
+
+class Storage(ABC):
+    """
+    Database where results go, holds one connection taken from the pool.
+    Every project opens its own storage, so projects analyzed in parallel don't share connections
+    """
+
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+        self.conn = pool.acquire()
+
+    @classmethod
+    @abstractmethod
+    def connect(cls):
+        """ :return: new open DB-API connection to the configured database"""
+        pass
+
+    def close(self):
+        """ gives the connection back to the pool, uncommitted changes are rolled back"""
+        self.pool.release(self.conn)
+        self.conn = None
+
+    @abstractmethod
+    def create_bulk_writer(self, batch_size: int, background: bool, run_stats: RunStats = None) -> BulkWriter:
+        """
+        :param batch_size: number of buffered rows which causes flush
+        :param background: send batches from a separate thread and connection
+        :param run_stats: timings of the project
+        """
+        pass
+
+    @abstractmethod
+    def add_new_project(self, project_info: ProjectInfo) -> int:
+        pass
+
+    @abstractmethod
+    def add_file_with_regions(self, file_info: FileInfo, regions: List[RegionInfo]):
+        """
+        Stores file with its regions and functions in one transaction, updating their ids.
+        If some row cannot be stored, nothing of the file is stored and the error is raised
+        :param regions: regions of the file (outer regions must go before inner ones)
+        """
+        pass
+
+    @abstractmethod
+    def delete_project(self, project_id: int):
+        pass
+
+    @abstractmethod
+    def get_stored_files(self, project_info: ProjectInfo) -> Dict[str, int]:
+        pass
+
+    @abstractmethod
+    def get_previous_files(self, project_info: ProjectInfo) -> Dict[str, Tuple[int, str]]:
+        pass
+
+    @abstractmethod
+    def copy_files_to_project(self, file_ids: List[int], project_info: ProjectInfo) -> int:
+        pass
+
+    @abstractmethod
+    def add_revision(self, project_info: ProjectInfo, commit_sha: str, committed_at: int, file_ids: List[int]) -> int:
+        pass
+
+    @abstractmethod
+    def add_run(self, project_info: ProjectInfo, project_report: dict) -> int:
+        pass
+
+    @abstractmethod
+    def get_language_stats_for_files(self, file_ids: List[int]) -> Dict[str, LanguageStat]:
+        pass
+
+    @abstractmethod
+    def add_language_stats(self, project_info: ProjectInfo):
+        pass
+
+    @abstractmethod
+    def add_quarantined_files(self, project_info: ProjectInfo, blob_shas: Dict[str, str]):
+        pass
+
+
+class PostgresStorage(Storage):
+    """ PostgreSQL server, queries are in db_helpers"""
+
+    @classmethod
+    def connect(cls):
+        import psycopg2
+        return psycopg2.connect(**Config.get_postgresql_conn_parameters())
+
+    def create_bulk_writer(self, batch_size: int, background: bool, run_stats: RunStats = None) -> BulkWriter:
+        return BulkWriter(self.conn, batch_size, self.pool if background else None, run_stats)
+
+    def add_new_project(self, project_info: ProjectInfo) -> int:
+        return db_helpers.add_new_project(self.conn, project_info)
+
+    def add_file_with_regions(self, file_info: FileInfo, regions: List[RegionInfo]):
+        db_helpers.add_file_with_regions(self.conn, file_info, regions)
+
+    def delete_project(self, project_id: int):
+        db_helpers.delete_project(self.conn, project_id)
+
+    def get_stored_files(self, project_info: ProjectInfo) -> Dict[str, int]:
+        return db_helpers.get_stored_files(self.conn, project_info)
+
+    def get_previous_files(self, project_info: ProjectInfo) -> Dict[str, Tuple[int, str]]:
+        return db_helpers.get_previous_files(self.conn, project_info)
+
+    def copy_files_to_project(self, file_ids: List[int], project_info: ProjectInfo) -> int:
+        return db_helpers.copy_files_to_project(self.conn, file_ids, project_info)
+
+    def add_revision(self, project_info: ProjectInfo, commit_sha: str, committed_at: int, file_ids: List[int]) -> int:
+        return db_helpers.add_revision(self.conn, project_info, commit_sha, committed_at, file_ids)
+
+    def add_run(self, project_info: ProjectInfo, project_report: dict) -> int:
+        return db_helpers.add_run(self.conn, project_info, project_report)
+
+    def get_language_stats_for_files(self, file_ids: List[int]) -> Dict[str, LanguageStat]:
+        return db_helpers.get_language_stats_for_files(self.conn, file_ids)
+
+    def add_language_stats(self, project_info: ProjectInfo):
+        db_helpers.add_language_stats(self.conn, project_info)
+
+    def add_quarantined_files(self, project_info: ProjectInfo, blob_shas: Dict[str, str]):
+        db_helpers.add_quarantined_files(self.conn, project_info, blob_shas)
+
+
+def get_storage_class() -> Type[Storage]:
+    backend = Config.get_storage_backend()
+    if backend == "sqlite":
+        from database.sqlite_storage import SqliteStorage
+        return SqliteStorage
+    if backend == "postgresql":
+        return PostgresStorage
+    raise ValueError("Unknown storage backend \"{0}\" in {1}".format(backend, Config.config_filename))
+
+
+connection_pool: ConnectionPool = None
+connection_pool_lock = threading.Lock()
+
+
+def get_connection_pool() -> ConnectionPool:
+    """ pool of the run, big enough for every project analyzed in parallel and its background loader"""
+    global connection_pool
+    with connection_pool_lock:
+        if connection_pool is None:
+            connections_per_project = 2 if Config.use_bulk_load() and Config.use_background_load() else 1
+            connection_pool = ConnectionPool(get_storage_class().connect,
+                                             Config.get_projects_in_parallel() * connections_per_project)
+        return connection_pool
+
+
+def close_connection_pool():
+    global connection_pool
+    with connection_pool_lock:
+        if connection_pool is not None:
+            connection_pool.close()
+            connection_pool = None
+
+
+def open_storage() -> Storage:
+    return get_storage_class()(get_connection_pool())
@@ -0,0 +1,121 @@
+import fnmatch
+import logging
+import os
+from typing import List, Optional
+
+from cloc_runner import iterate_project_paths
+from config import Config
+from incremental import normalize_path
+from info.project_info import ProjectInfo
+from staging import stage_files
+
+# bytes at the beginning of a file searched for the markers of generated code
+header_size = 4096
+
+# the file is read in blocks while its lines are counted
+read_size = 1024 * 1024
+
+
+class FileFilter:
+    """
+    Decides which files of a project are analyzed. Skipped are files matching the exclude globs
+    (vendored trees, generated sources by name), files over the size or line limit
+    and files with a marker of generated code in their header
+    """
+
+    def __init__(self, exclude_globs: List[str], max_size_bytes: int, max_lines: int, generated_markers: List[str]):
+        """
+        :param exclude_globs: globs without "/" are matched with the file name, others with the path inside
+        the project starting with "/" (like "/src/third_party/zlib/inflate.c")
+        :param max_size_bytes: 0 for no limit
+        :param max_lines: 0 for no limit
+        :param generated_markers: searched case-insensitively in the first header_size bytes of the file
+        """
+        self.name_globs = [glob for glob in exclude_globs if "/" not in glob]
+        self.path_globs = [glob for glob in exclude_globs if "/" in glob]
+        self.max_size_bytes = max_size_bytes
+        self.max_lines = max_lines
+        self.generated_markers = [marker.lower().encode("utf-8") for marker in generated_markers]
+
+    @classmethod
+    def from_config(cls) -> "FileFilter":
+        return cls(Config.get_filter_exclude_globs(), Config.get_filter_max_size_kb() * 1024,
+                   Config.get_filter_max_lines(), Config.get_filter_generated_markers())
+
+    def is_enabled(self) -> bool:
+        return len(self.name_globs) > 0 or len(self.path_globs) > 0 or self.max_size_bytes > 0 \
+            or self.max_lines > 0 or len(self.generated_markers) > 0
+
+    def is_excluded_by_path(self, path_in_project: str) -> bool:
+        file_name = path_in_project[path_in_project.rfind("/") + 1:]
+        return any(fnmatch.fnmatch(file_name, glob) for glob in self.name_globs) or \
+            any(fnmatch.fnmatch(path_in_project, glob) for glob in self.path_globs)
+
+    def has_too_many_lines(self, file_path: str) -> bool:
+        lines = 0
+        with open(file_path, "rb") as source_file:
+            while True:
+                block = source_file.read(read_size)
+                if len(block) == 0:
+                    return False
+                lines += block.count(b"\n")
+                if lines > self.max_lines:
+                    return True
+
+    def is_generated(self, file_path: str) -> bool:
+        with open(file_path, "rb") as source_file:
+            header = source_file.read(header_size).lower()
+        return any(marker in header for marker in self.generated_markers)
+
+    def get_skip_reason(self, path_in_project: str, file_path: str) -> Optional[str]:
+        """
+        :param path_in_project: normalized path inside the project, starting with "/"
+        :param file_path: path to the file on disk
+        :return: 'path', 'size' or 'generated', None if the file is analyzed
+        """
+        if self.is_excluded_by_path(path_in_project):
+            return "path"
+        if self.max_size_bytes > 0 and os.path.getsize(file_path) > self.max_size_bytes:
+            return "size"
+        if self.max_lines > 0 and self.has_too_many_lines(file_path):
+            return "size"
+        if len(self.generated_markers) > 0 and self.is_generated(file_path):
+            return "generated"
+        return None
+
+
+def filter_project_files(project_info: ProjectInfo):
+    """
+    Skips files of the source directory the filter rejects, the rest are staged for cloc, metrix++
+    and the result cache. Skipped files are counted in project_info
+    """
+    file_filter = FileFilter.from_config()
+    if not file_filter.is_enabled():
+        return
+
+    with project_info.run_stats.measure("filter"):
+        selected_paths = []
+        skipped = 0
+        project_prefix_length = len(project_info.name)
+        for path in iterate_project_paths(project_info):
+            file_path = project_info.get_source_path(path)
+            if os.path.islink(file_path) or not os.path.isfile(file_path):
+                selected_paths.append(path)
+                continue
+            reason = file_filter.get_skip_reason(normalize_path(path)[project_prefix_length:], file_path)
+            if reason is None:
+                selected_paths.append(path)
+                continue
+            skipped += 1
+            if reason == "path":
+                project_info.files_skipped_by_path += 1
+            elif reason == "size":
+                project_info.files_skipped_by_size += 1
+            else:
+                project_info.files_skipped_generated += 1
+
+        if skipped > 0:
+            stage_files(project_info, selected_paths)
+    logging.info("Project \"{0}\": files skipped before analysis: {1} by path, {2} oversized, {3} generated"
+                 .format(project_info.name, project_info.files_skipped_by_path, project_info.files_skipped_by_size,
+                         project_info.files_skipped_generated))
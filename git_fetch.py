@@ -0,0 +1,96 @@
+import os
+import re
+import threading
+from typing import Dict, List
+
+from config import Config
+from info.project_info import ProjectInfo
+from tool_runner import get_tool_runner
+
+clone_options_for_mode = {
+    "full": [],
+    "shallow": ["--depth", "1"],
+    "blobless": ["--filter=blob:none"],
+}
+
+mirror_locks: Dict[str, threading.Lock] = {}
+mirror_locks_guard = threading.Lock()
+
+
+def get_clone_options(clone_mode: str) -> List[str]:
+    if clone_mode not in clone_options_for_mode:
+        raise ValueError("Unknown git clone mode \"{0}\"".format(clone_mode))
+    return clone_options_for_mode[clone_mode]
+
+
+def get_fetch_url(url: str) -> str:
+    """ git ignores --depth and --filter for plain local paths, file:// urls make them work for local repos too"""
+    if os.path.isdir(url):
+        return "file://" + os.path.abspath(url).replace("\\", "/")
+    return url
+
+
+def get_mirror_path(url: str, clone_mode: str) -> str:
+    """
+    Mirrors of different clone modes are kept apart: a shallow or blobless mirror reused by a full run
+    would silently give it partial history
+    """
+    mirror_name = re.sub(r"[^\w.\-]+", "_", re.sub(r"^\w+://", "", url.rstrip("/")))
+    if mirror_name.endswith(".git"):
+        mirror_name = mirror_name[:-len(".git")]
+    mirror_name += ".{0}.git".format(clone_mode)
+    return os.path.abspath(os.path.join(Config.get_git_mirror_cache_path(), mirror_name))
+
+
+def get_mirror_lock(mirror_path: str) -> threading.Lock:
+    with mirror_locks_guard:
+        return mirror_locks.setdefault(mirror_path, threading.Lock())
+
+
+def run_git(args: List[str], cwd: str = None) -> int:
+    return get_tool_runner().call(['git'] + args, "git", cwd=cwd, timeout=Config.get_git_timeout_seconds())
+
+
+def update_mirror(url: str, mirror_path: str, clone_mode: str) -> int:
+    """
+    Creates local bare mirror of the repository or fetches new commits into the existing one
+    :return: git status code
+    """
+    if os.path.isdir(mirror_path):
+        fetch_options = ["--depth", "1"] if clone_mode == "shallow" else []
+        return run_git(['--git-dir', mirror_path, 'fetch', '--prune'] + fetch_options + ['origin'])
+
+    mirror_directory = os.path.dirname(mirror_path)
+    if not os.path.exists(mirror_directory):
+        os.makedirs(mirror_directory, exist_ok=True)
+    return run_git(['clone', '--mirror'] + get_clone_options(clone_mode) + [get_fetch_url(url), mirror_path])
+
+
+def fetch_project(project_info: ProjectInfo) -> int:
+    """
+    Makes checkout of the project in project_info.work_dir/project_info.name.
+    Without mirror cache the project is cloned directly,
+    otherwise the cached mirror is updated and a worktree of it is added
+    :return: git status code
+    """
+    clone_mode = Config.get_git_clone_mode()
+    destination = project_info.get_local_path(project_info.name)
+
+    if not Config.get_git_mirror_cache_path():
+        return run_git(['clone'] + get_clone_options(clone_mode) + [get_fetch_url(project_info.url), destination])
+
+    mirror_path = get_mirror_path(project_info.url, clone_mode)
+    with get_mirror_lock(mirror_path):
+        ret = update_mirror(project_info.url, mirror_path, clone_mode)
+        if ret != 0:
+            return ret
+        project_info.mirror_path = mirror_path
+        return run_git(['--git-dir', mirror_path, 'worktree', 'add', '--detach', destination, 'HEAD'])
+
+
+def release_project_checkout(project_info: ProjectInfo):
+    """ forgets worktree of the removed project directory, so the mirror stays clean"""
+    if project_info.mirror_path is None:
+        return
+    with get_mirror_lock(project_info.mirror_path):
+        run_git(['--git-dir', project_info.mirror_path, 'worktree', 'prune'])
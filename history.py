@@ -0,0 +1,66 @@
+import logging
+from datetime import datetime
+from typing import List, Tuple
+
+from config import Config
+from info.project_info import ProjectInfo
+from tool_runner import get_tool_runner
+
+
+def run_git_for_output(project_info: ProjectInfo, args: List[str]) -> str:
+    return get_tool_runner().run_for_output(['git'] + args, "git {0}".format(" ".join(args)),
+                                            cwd=project_info.get_local_path(project_info.name),
+                                            timeout=Config.get_git_timeout_seconds())
+
+
+def parse_commits(git_output: str) -> List[Tuple[str, int]]:
+    """ parses lines "<sha> <commit timestamp>" """
+    commits = []
+    for line in git_output.splitlines():
+        if line.strip() == "":
+            continue
+        commit_sha, timestamp = line.split()
+        commits.append((commit_sha, int(timestamp)))
+    return commits
+
+
+def select_revisions(project_info: ProjectInfo, revision_range: str, sample: str) -> List[Tuple[str, int]]:
+    """
+    Chooses commits of the project to be analyzed
+    :param revision_range: git revision range like "v1.0..HEAD", empty for the whole history of HEAD
+    :param sample: "every:N" (every N-th commit of the first-parent history and the last one),
+    "tags" (tagged commits) or "monthly" (the last commit of every month)
+    :return: (commit sha, commit timestamp) from the oldest to the newest
+    """
+    revision_range = revision_range or "HEAD"
+    commits = parse_commits(run_git_for_output(project_info, ['log', '--first-parent', '--reverse',
+                                                              '--format=%H %ct', revision_range]))
+    if len(commits) == 0:
+        return []
+
+    if sample.startswith("every:"):
+        step = int(sample[len("every:"):])
+        selected = commits[::step]
+        if selected[-1] != commits[-1]:
+            selected.append(commits[-1])
+        return selected
+
+    if sample == "tags":
+        commits_in_range = set(commit_sha for commit_sha, _ in commits)
+        tagged = parse_commits(run_git_for_output(project_info, ['log', '--no-walk', '--tags', '--format=%H %ct']))
+        return sorted(((commit_sha, timestamp) for commit_sha, timestamp in tagged if commit_sha in commits_in_range),
+                      key=lambda commit: commit[1])
+
+    if sample == "monthly":
+        last_commit_for_month = {}
+        for commit_sha, timestamp in commits:
+            month = datetime.utcfromtimestamp(timestamp).strftime("%Y-%m")
+            last_commit_for_month[month] = (commit_sha, timestamp)
+        return [last_commit_for_month[month] for month in sorted(last_commit_for_month)]
+
+    raise ValueError("Unknown revision sampling rule \"{0}\"".format(sample))
+
+
+def checkout_revision(project_info: ProjectInfo, commit_sha: str):
+    logging.info("Project \"{0}\": checkout {1}".format(project_info.name, commit_sha))
+    run_git_for_output(project_info, ['checkout', '--quiet', '--force', '--detach', commit_sha])
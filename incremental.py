@@ -0,0 +1,48 @@
+import os
+from typing import Dict
+
+from config import Config
+from info.project_info import ProjectInfo
+from language_handlers.native_extractor import extractor_version
+from retry import call_with_retries
+from tool_runner import get_tool_runner
+
+
+def normalize_path(path: str) -> str:
+    return path.replace("\\", "/")
+
+
+def get_blob_shas(project_info: ProjectInfo) -> Dict[str, str]:
+    """
+    Reads git blob hashes of all tracked files of the project checkout
+    :return: blob sha for every path relative to project_info.work_dir (like "<project_name>/src/main.c")
+    :raises ToolCrashed: if git ls-files failed on every attempt, an empty dict would pass for a project with no files
+    """
+    git_output = call_with_retries(
+        lambda: get_tool_runner().run_for_output(['git', 'ls-files', '--stage', '-z'], "git ls-files",
+                                                 cwd=project_info.get_local_path(project_info.name),
+                                                 timeout=Config.get_git_timeout_seconds()),
+        "Project \"{0}\": git ls-files".format(project_info.name))
+
+    blob_shas = {}
+    for entry in git_output.split("\0"):
+        if entry == "":
+            continue
+        # <mode> <sha> <stage>\t<path>
+        info, path = entry.split("\t", 1)
+        blob_shas[project_info.name + "/" + path] = info.split(" ")[1]
+    return blob_shas
+
+
+def get_tool_versions() -> str:
+    """ identifies tools which produced stored results, results of other tools versions are never reused"""
+    if Config.get_line_counter_engine() == "builtin":
+        cloc_version = "builtin"
+    else:
+        cloc_version = get_tool_runner().run_for_output([Config.get_cloc_path(), '--version'], "cloc --version",
+                                                        timeout=Config.get_cloc_timeout_seconds()).strip()
+    if Config.get_metrixpp_engine() == "builtin":
+        metrixpp_version = "builtin {0}".format(extractor_version)
+    else:
+        metrixpp_version = os.path.basename(os.path.dirname(os.path.abspath(Config.get_metrixpp_path())))
+    return "cloc {0}; {1}".format(cloc_version, metrixpp_version)
@@ -3,9 +3,12 @@ from info.project_info import ProjectInfo
 
 
 class FileInfo:
+    __slots__ = ("id", "project_info", "path", "language", "cloc_metrics", "blob_sha")
+
     def __init__(self, path: str, language: str):
         self.id: int = None
         self.project_info: ProjectInfo = None
         self.path = path
         self.language = language
         self.cloc_metrics: ClocFileMetrics = None
+        self.blob_sha: str = None
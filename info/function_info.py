@@ -3,6 +3,8 @@ from info.region_type import RegionType
 
 
 class FunctionInfo(RegionInfo):
+    __slots__ = ("cyclomatic_complexity",)
+
     def __init__(self, short_name: str = None):
         super().__init__(RegionType.Function, short_name)
         self.cyclomatic_complexity: int = None
@@ -0,0 +1,79 @@
+from collections import Counter
+from typing import Iterable, Optional
+
+from cloc_file_metrics import ClocFileMetrics
+from info.function_info import FunctionInfo
+from info.region_info import RegionInfo
+
+# percentiles of cyclomatic complexity stored for every language
+ccn_percentiles = (50, 90, 99)
+
+
+class LanguageStat:
+    """ totals of one language in a project, updated as files are counted and stored"""
+
+    def __init__(self, language):
+        self.language = language
+        self.files = 0  # stored files
+        self.functions = 0
+        self.code_lines = 0  # code lines of the functions
+        self.ccn = 0
+        self.cloc_files = 0  # files counted by cloc, with or without a handler
+        self.cloc_blank_lines = 0
+        self.cloc_comment_lines = 0
+        self.cloc_code_lines = 0
+        self.ccn_histogram = Counter()  # cyclomatic complexity -> number of functions
+
+    def add_cloc_info(self, cloc_files, cloc_blank_lines, cloc_comment_lines, cloc_code_lines):
+        self.cloc_files += cloc_files
+        self.cloc_blank_lines += cloc_blank_lines
+        self.cloc_comment_lines += cloc_comment_lines
+        self.cloc_code_lines += cloc_code_lines
+
+    def add_cloc_metrics(self, cloc_metrics: ClocFileMetrics):
+        self.add_cloc_info(1, cloc_metrics.blank, cloc_metrics.comment, cloc_metrics.code)
+
+    def add_functions(self, ccn: int, functions: int, code_lines: int):
+        """ :param ccn: cyclomatic complexity of each of the functions"""
+        self.functions += functions
+        self.code_lines += code_lines
+        self.ccn += ccn * functions
+        self.ccn_histogram[ccn] += functions
+
+    def merge(self, other: "LanguageStat"):
+        self.files += other.files
+        self.add_cloc_info(other.cloc_files, other.cloc_blank_lines, other.cloc_comment_lines, other.cloc_code_lines)
+        self.functions += other.functions
+        self.code_lines += other.code_lines
+        self.ccn += other.ccn
+        self.ccn_histogram.update(other.ccn_histogram)
+
+    def add_file(self, regions: Iterable[RegionInfo]):
+        """ adds stored file with its regions, functions inside functions are not stored so not counted"""
+        self.files += 1
+        for region_info in regions:
+            if isinstance(region_info, FunctionInfo) and not region_info.is_inside_some_function:
+                self.add_functions(region_info.cyclomatic_complexity or 0, 1, region_info.total_code_lines or 0)
+
+    def get_ccn_percentile(self, percent: int) -> Optional[int]:
+        """ nearest-rank percentile of cyclomatic complexity, None if there are no functions"""
+        if self.functions == 0:
+            return None
+        rank = max(1, -(-percent * self.functions // 100))
+        functions_before = 0
+        for ccn in sorted(self.ccn_histogram):
+            functions_before += self.ccn_histogram[ccn]
+            if functions_before >= rank:
+                return ccn
+
+    def get_metrics_tuple_for_db(self):
+        """
+        values for (code_lines, cloc_code_lines, cloc_comment_lines, cloc_blank_lines, functions,
+        average_cyclomatic_complexity, code_lines_per_function, files, cloc_files, ccn_p50, ccn_p90, ccn_p99, ccn_max)
+        """
+        average_ccn = self.ccn / self.functions if self.functions != 0 else None
+        code_lines_per_function = self.code_lines / self.functions if self.functions != 0 else None
+        max_ccn = max(self.ccn_histogram) if self.functions != 0 else None
+        return (self.code_lines, self.cloc_code_lines, self.cloc_comment_lines, self.cloc_blank_lines, self.functions,
+                average_ccn, code_lines_per_function, self.files, self.cloc_files) + \
+            tuple(self.get_ccn_percentile(percent) for percent in ccn_percentiles) + (max_ccn,)
@@ -1,9 +1,67 @@
+import logging
+import os
+from collections import OrderedDict
+
+from instrumentation import RunStats
+
+
 class ProjectInfo:
     def __init__(self, url: str, name: str):
         self.id: int = None
         self.url = url
         self.name = name
+        self.work_dir = os.curdir  # directory where project is cloned to, all file paths are relative to it
+        self.metrixpp_db_path: str = None
+        self.mirror_path: str = None  # local mirror the project has been checked out from
+        self.source_dir: str = None  # directory with pristine files to be analyzed, work_dir if None
+        self.analysis_dir: str = None  # directory with preprocessed sources metrix++ is run in, source_dir if None
+        self.tool_versions: str = None
         self.files_analyzed = 0
         self.files_with_errors = 0
         self.files_with_preprocessor_directives_changed = 0
         self.files_with_raw_strings_changed = 0
+        self.files_reused = 0  # unchanged since the previous run, results are copied
+        self.files_resumed = 0  # stored by an interrupted run of the project
+        self.files_cached = 0  # results are taken from the result cache
+        self.files_skipped_by_path = 0  # matching exclude globs of [filter]
+        self.files_skipped_by_size = 0  # over size or line limit of [filter]
+        self.files_skipped_generated = 0  # with a marker of generated code in the header
+        self.files_quarantined = 0  # went over the time or memory budget of a file
+        self.quarantined_files = OrderedDict()  # path -> (stage, reason), of the files analyzed now
+        self.run_stats = RunStats()
+        self.language_stats = OrderedDict()  # language -> LanguageStat
+
+    def get_language_stat(self, language: str):
+        """ :return: LanguageStat of the language, created on first use"""
+        if language not in self.language_stats:
+            from info.language_stat import LanguageStat  # info.language_stat imports this module indirectly
+            self.language_stats[language] = LanguageStat(language)
+        return self.language_stats[language]
+
+    def quarantine_file(self, path: str, stage: str, reason: str):
+        """ excludes the file from further analysis, it is recorded in the database with the reason"""
+        logging.error("Project \"{0}\": file \"{1}\" quarantined at {2}: {3}".format(self.name, path, stage, reason))
+        print("ERROR: file \"{0}\" quarantined at {1}: {2}".format(path, stage, reason))
+        self.quarantined_files[path] = (stage, reason)
+        self.files_quarantined += 1
+
+    def is_quarantined(self, path: str) -> bool:
+        return path in self.quarantined_files
+
+    def get_local_path(self, path: str) -> str:
+        """ path to the file inside work_dir"""
+        return os.path.join(self.work_dir, path)
+
+    def get_source_dir(self) -> str:
+        return self.source_dir if self.source_dir is not None else self.work_dir
+
+    def get_source_path(self, path: str) -> str:
+        """ path to the file inside source directory"""
+        return os.path.join(self.get_source_dir(), path)
+
+    def get_analysis_dir(self) -> str:
+        return self.analysis_dir if self.analysis_dir is not None else self.get_source_dir()
+
+    def get_analysis_path(self, path: str) -> str:
+        """ path to the file inside analysis directory"""
+        return os.path.join(self.get_analysis_dir(), path)
@@ -3,6 +3,11 @@ from info.region_type import RegionType
 
 
 class RegionInfo:
+    # there are millions of regions in big projects, slots keep them small
+    __slots__ = ("region_type", "short_name", "outer_region", "file_info", "id",
+                 "total_lines", "own_code_lines", "own_comment_lines", "total_code_lines", "total_comment_lines",
+                 "ccn_sum", "n_functions", "is_inside_some_function")
+
     def __init__(self, region_type: RegionType = None, short_name: str = None):
         self.region_type = region_type
         self.short_name = short_name
@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# CPU time of the current thread, projects are analyzed in threads of one process
+get_thread_cpu_time = getattr(time, "thread_time", time.process_time)
+
+stage_names = ("clone", "filter", "cloc", "preprocessing", "collect", "view", "parse", "extract", "db insert")
+
+# upper bounds (seconds) of per-file time histogram buckets, the last bucket has no bound
+histogram_bounds = (0.001, 0.01, 0.1, 1.0, 10.0)
+
+
+# CPU time of the tools (cloc, git, metrix++) every thread has waited for
+tool_cpu = threading.local()
+
+
+def add_tool_cpu_time(seconds: float):
+    """ called by the tool runner in the thread which waited for the tool"""
+    tool_cpu.seconds = get_tool_cpu_time() + seconds
+
+
+def get_tool_cpu_time() -> float:
+    return getattr(tool_cpu, "seconds", 0.0)
+
+
+def get_peak_rss_kb() -> int:
+    """
+    High-water mark of RSS of the whole process (all projects of the run) or of its largest finished child,
+    whichever is bigger (bytes on macOS)
+    """
+    if resource is None:
+        return 0
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+class Measurement:
+    """
+    Wall time and CPU time of a piece of work, can be taken in a worker process and sent back.
+    CPU time is the one of the measuring thread and of the tools it has waited for meanwhile,
+    so work of other threads and projects is not counted
+    """
+    __slots__ = ("seconds", "cpu_seconds", "started_at", "cpu_started_at")
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.started_at = time.perf_counter()
+        self.cpu_started_at = get_thread_cpu_time() + get_tool_cpu_time()
+
+    def stop(self) -> "Measurement":
+        self.seconds = time.perf_counter() - self.started_at
+        self.cpu_seconds = get_thread_cpu_time() + get_tool_cpu_time() - self.cpu_started_at
+        return self
+
+
+def call_measured(func_and_argument: Tuple[Callable, object]) -> Tuple[object, Measurement]:
+    """ calls func(argument) measuring it, can be run in a worker process"""
+    func, argument = func_and_argument
+    measurement = Measurement()
+    result = func(argument)
+    return result, measurement.stop()
+
+
+class StageStats:
+    def __init__(self):
+        self.seconds = 0.0  # summed over workers, may exceed the wall time of the project
+        self.cpu_seconds = 0.0
+        self.calls = 0
+
+    def add(self, measurement: Measurement):
+        self.seconds += measurement.seconds
+        self.cpu_seconds += measurement.cpu_seconds
+        self.calls += 1
+
+    def to_dict(self) -> dict:
+        return OrderedDict((("seconds", round(self.seconds, 3)), ("cpu_seconds", round(self.cpu_seconds, 3)),
+                            ("calls", self.calls)))
+
+
+class RunStats:
+    """ timings of one project, filled from several threads (analysis, cloc producer, db loader)"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.stages: Dict[str, StageStats] = OrderedDict((name, StageStats()) for name in stage_names)
+        self.file_seconds: Dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def add(self, stage: str, measurement: Measurement):
+        with self.lock:
+            self.stages[stage].add(measurement)
+
+    @contextmanager
+    def measure(self, stage: str):
+        measurement = Measurement()
+        try:
+            yield measurement
+        finally:
+            self.add(stage, measurement.stop())
+
+    def add_file_time(self, path: str, seconds: float):
+        with self.lock:
+            self.file_seconds[path] = self.file_seconds.get(path, 0.0) + seconds
+
+    def get_file_time_histogram(self) -> Dict[str, int]:
+        labels = ["<{0}s".format(bound) for bound in histogram_bounds] + [">={0}s".format(histogram_bounds[-1])]
+        counts = [0] * len(labels)
+        for seconds in self.file_seconds.values():
+            bucket = 0
+            while bucket < len(histogram_bounds) and seconds >= histogram_bounds[bucket]:
+                bucket += 1
+            counts[bucket] += 1
+        return OrderedDict(zip(labels, counts))
+
+    def get_slowest_files(self, count: int) -> List[Tuple[str, float]]:
+        return sorted(self.file_seconds.items(), key=lambda item: item[1], reverse=True)[:count]
+
+    def to_dict(self, slowest_files: int) -> dict:
+        return OrderedDict((
+            ("started_at", self.started_at),
+            ("wall_seconds", round(time.time() - self.started_at, 3)),
+            # not the project's own memory: projects analyzed at the same time share the process
+            ("process_peak_rss_kb", get_peak_rss_kb()),
+            ("stages", OrderedDict((name, stats.to_dict()) for name, stats in self.stages.items())),
+            ("file_time_histogram", self.get_file_time_histogram()),
+            ("slowest_files", [OrderedDict((("path", path), ("seconds", round(seconds, 4))))
+                               for path, seconds in self.get_slowest_files(slowest_files)]),
+        ))
+
+
+class RunReport:
+    """ machine-readable report of the whole run, one entry per project"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.projects: List[dict] = []
+        self.lock = threading.Lock()
+
+    def add_project(self, project_report: dict):
+        with self.lock:
+            self.projects.append(project_report)
+
+    def write(self, directory: str) -> str:
+        """ :return: path of the written report"""
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, time.strftime("%Y-%m-%d %H_%M_%S", time.localtime(self.started_at))
+                            + ".json")
+        report = OrderedDict((
+            ("started_at", self.started_at),
+            ("wall_seconds", round(time.time() - self.started_at, 3)),
+            ("process_peak_rss_kb", get_peak_rss_kb()),
+            ("projects", self.projects),
+        ))
+        with open(path, "wt", encoding="utf-8") as report_file:
+            json.dump(report, report_file, indent=2)
+        return path
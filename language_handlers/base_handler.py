@@ -1,18 +1,160 @@
+import logging
 from abc import ABC, abstractmethod
+
+from config import Config
+from database.bulk_writer import BulkWriter
+from database.storage import Storage
 from info.file_info import FileInfo
 from info.project_info import ProjectInfo
-from typing import Collection
+from info.region_info import RegionInfo
+from instrumentation import Measurement
+from result_cache import ResultCache, unflatten_regions
+from typing import Callable, Collection, Dict, List
+from worker_pool import TaskFailed, WorkerPool
 
 
 class BaseHandler(ABC):
-    def __init__(self, project_info: ProjectInfo, conn):
+    # budget of a batch job in a worker process, in file budgets per file of the batch
+    worker_timeout_factor = 1
+
+    def __init__(self, project_info: ProjectInfo, storage: Storage, bulk_writer: BulkWriter = None,
+                 worker_pool: WorkerPool = None, result_cache: ResultCache = None):
         """
         Create new language handler
         :param project_info: ProjectInfo object
-        :param conn: open db connection
+        :param storage: open storage of the results
+        :param bulk_writer: writer buffering results of the project, None to insert rows one by one
+        :param worker_pool: pool for per-file work, None to do everything in the current process
+        :param result_cache: cache where results of the analyzed files are put, None if it is disabled
         """
         self.project_info = project_info
-        self.conn = conn
+        self.storage = storage
+        self.bulk_writer = bulk_writer
+        self.worker_pool = worker_pool if worker_pool is not None else WorkerPool(1)
+        self.result_cache = result_cache
+
+    def store_regions(self, file_info: FileInfo, regions: List[RegionInfo], cached: bool = False):
+        """
+        Sends file and its regions to the database
+        :param file_info: analyzed file
+        :param regions: regions extracted for the file or None if extraction failed
+        :param cached: regions are taken from the result cache, so they are not put there again
+        """
+        if self.bulk_writer is not None:
+            self.buffer_regions(file_info, regions, cached)
+            return
+
+        self.project_info.files_analyzed += 1
+
+        try:
+            if regions is None:
+                raise ValueError("no regions extracted")
+
+            for region_info in regions:
+                region_info.file_info = file_info
+            # one transaction for the file: nothing is left to delete if it fails
+            self.storage.add_file_with_regions(file_info, list(reversed(regions)))
+            self.project_info.get_language_stat(file_info.language).add_file(regions)
+            if not cached:
+                self.put_to_cache(file_info, regions)
+
+        except Exception as e:
+            logging.error("ERROR: file \"{0}\" was skipped because of parse error".format(file_info.path))
+            print("ERROR: file \"{0}\" was skipped because of parse error".format(file_info.path))
+            self.project_info.files_with_errors += 1
+
+    def buffer_regions(self, file_info: FileInfo, regions: List[RegionInfo], cached: bool = False):
+        self.project_info.files_analyzed += 1
+
+        if regions is None:
+            logging.error("ERROR: file \"{0}\" was skipped because of parse error".format(file_info.path))
+            print("ERROR: file \"{0}\" was skipped because of parse error".format(file_info.path))
+            self.project_info.files_with_errors += 1
+            return
+
+        for region_info in regions:
+            region_info.file_info = file_info
+        self.bulk_writer.add_file(file_info, list(reversed(regions)))
+        self.project_info.get_language_stat(file_info.language).add_file(regions)
+        if not cached:
+            self.put_to_cache(file_info, regions)
+
+    def put_to_cache(self, file_info: FileInfo, regions: List[RegionInfo]):
+        if self.result_cache is not None:
+            self.result_cache.put(file_info, self.project_info.tool_versions, regions)
+
+    def add_measurements(self, measurements: Dict[str, Measurement]):
+        for stage, measurement in measurements.items():
+            self.project_info.run_stats.add(stage, measurement)
+
+    def store_regions_measured(self, file_info: FileInfo, regions: List[RegionInfo], extraction_seconds: float):
+        measurement = Measurement()
+        self.store_regions(file_info, regions)
+        self.project_info.run_stats.add("db insert", measurement.stop())
+        self.project_info.run_stats.add_file_time(file_info.path, extraction_seconds + measurement.seconds)
+
+    def handle_cached_file(self, file_info: FileInfo, regions: List[RegionInfo]):
+        """ stores file whose results have been found in the result cache, no external tool is run for it"""
+        measurement = Measurement()
+        self.store_regions(file_info, regions, cached=True)
+        self.project_info.files_cached += 1
+        self.project_info.run_stats.add("db insert", measurement.stop())
+        self.project_info.run_stats.add_file_time(file_info.path, measurement.seconds)
+
+    def get_files_to_extract(self, files: Collection[FileInfo]) -> List[FileInfo]:
+        """ files quarantined by an earlier step (preprocessing, line counting) are not extracted"""
+        return [file_info for file_info in files if not self.project_info.is_quarantined(file_info.path)]
+
+    @abstractmethod
+    def get_batch_job(self, batch: List[FileInfo]):
+        """ :return: argument of the batch function of the handler for the files"""
+        pass
+
+    def store_batch_result(self, batch: List[FileInfo], result, stage: str):
+        """
+        :param result: (flat regions for each of the files, measurements, seconds spent on each of the files)
+        as the batch function returns it, or TaskFailed if the batch went over its budget
+        :param stage: analysis step for the quarantine records
+        """
+        if isinstance(result, TaskFailed):
+            for file_info in batch:
+                self.project_info.quarantine_file(file_info.path, stage, result.reason)
+            return
+        regions_list, measurements, file_seconds = result
+        self.add_measurements(measurements)
+        for file_info, regions, extraction_seconds in zip(batch, regions_list, file_seconds):
+            if isinstance(regions, TaskFailed):
+                self.project_info.quarantine_file(file_info.path, stage, regions.reason)
+            else:
+                self.store_regions_measured(file_info, unflatten_regions(regions) if regions is not None else None,
+                                            extraction_seconds)
+
+    def handle_batches(self, extract_regions_for_batch: Callable, batches: List[List[FileInfo]], stage: str):
+        """
+        Extracts regions of the batches in worker processes, results are sent to the db from this one.
+        A batch going over the time or memory budget of its files is extracted again file by file,
+        so only the files going over their own budget are quarantined
+        :param extract_regions_for_batch: module level batch function of the handler
+        :param stage: analysis step for the quarantine records
+        """
+        file_timeout = Config.get_file_timeout_seconds() * self.worker_timeout_factor
+        max_batch_size = max((len(batch) for batch in batches), default=1)
+        files_count = sum(len(batch) for batch in batches)
+        jobs = (self.get_batch_job(batch) for batch in batches)
+        handled_files = 0
+        for batch, result in zip(batches, self.worker_pool.imap(extract_regions_for_batch, jobs,
+                                                                file_timeout * max_batch_size)):
+            if isinstance(result, TaskFailed) and len(batch) > 1:
+                logging.warning("{0}: batch of {1} files failed ({2}), handling files one by one"
+                                .format(stage, len(batch), result.reason))
+                single_jobs = (self.get_batch_job([file_info]) for file_info in batch)
+                for file_info, single_result in zip(batch, self.worker_pool.imap(extract_regions_for_batch,
+                                                                                 single_jobs, file_timeout)):
+                    self.store_batch_result([file_info], single_result, stage)
+            else:
+                self.store_batch_result(batch, result, stage)
+            handled_files += len(batch)
+            logging.info("Files handled: [{0}/{1}]".format(handled_files, files_count))
 
     @abstractmethod
     def handle_one_file(self, file_info: FileInfo):
@@ -21,3 +163,7 @@ class BaseHandler(ABC):
     @abstractmethod
     def handle_files(self, files: Collection[FileInfo]):
         pass
+
+    def finish_project(self):
+        """ called after all files of the analysis directory have been handled"""
+        pass
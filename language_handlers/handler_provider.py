@@ -1,8 +1,14 @@
 from typing import Union, Type
 
+from config import Config
+from database.bulk_writer import BulkWriter
+from database.storage import Storage
 from info.project_info import ProjectInfo
 from language_handlers.base_handler import BaseHandler
 from language_handlers.metrixpp_handler import MetrixppHandler
+from language_handlers.native_handler import NativeHandler
+from result_cache import ResultCache
+from worker_pool import WorkerPool
 
 
 class HandlerProvider:
@@ -15,22 +21,40 @@ class HandlerProvider:
         "C/C++ Header": MetrixppHandler,
     }
 
+    # [metrix++] engine=builtin
+    from_language_to_builtin_handler_class = {
+        "Java": NativeHandler,
+        "C#": NativeHandler,
+        "C++": NativeHandler,
+        "C": NativeHandler,
+        "C/C++ Header": NativeHandler,
+    }
+
 
-    def __init__(self, project_info: ProjectInfo, conn):
+    def __init__(self, project_info: ProjectInfo, storage: Storage, bulk_writer: BulkWriter = None,
+                 worker_pool: WorkerPool = None, result_cache: ResultCache = None):
         self.project_info = project_info
-        self.conn = conn
+        self.storage = storage
+        self.bulk_writer = bulk_writer
+        self.worker_pool = worker_pool
+        self.result_cache = result_cache
         self.__handlers_pool = {}
+        if Config.get_metrixpp_engine() == "builtin":
+            self.from_language_to_handler_class = HandlerProvider.from_language_to_builtin_handler_class
 
 
     def get_handler_for_language(self, language: str) -> Union[BaseHandler, None]:
         if language in self.__handlers_pool:
             return self.__handlers_pool[language]
         else:
-            if language not in HandlerProvider.from_language_to_handler_class:
+            if language not in self.from_language_to_handler_class:
                 return None
             else:
-                handler_class: Type[BaseHandler] = HandlerProvider.from_language_to_handler_class[language]
-                self.__handlers_pool[language] = handler_class(self.project_info, self.conn)
+                handler_class: Type[BaseHandler] = self.from_language_to_handler_class[language]
+                self.__handlers_pool[language] = handler_class(self.project_info, self.storage, self.bulk_writer,
+                                                                    self.worker_pool, self.result_cache)
                 return self.__handlers_pool[language]
 
-
+    def finish_project(self):
+        for handler in self.__handlers_pool.values():
+            handler.finish_project()
@@ -0,0 +1,161 @@
+import sqlite3
+import sys
+from typing import Collection, Dict, List
+
+from info.function_info import FunctionInfo
+from info.region_info import RegionInfo
+from info.region_type import RegionType
+
+# region groups as stored by metrix++ (see Region.T in mpp/api.py)
+from_metrixpp_group_to_region_type = {
+    0x01: RegionType.Global,
+    0x02: RegionType.Class,
+    0x04: RegionType.Struct,
+    0x08: RegionType.Namespace,
+    0x10: RegionType.Function,
+    0x20: RegionType.Interface,
+}
+
+
+def normalize_path(path: str) -> str:
+    path = path.replace("\\", "/")
+    if path.startswith("./"):
+        path = path[2:]
+    return path
+
+
+class MetrixppDbReader:
+    """
+    Builds region trees straight from the sqlite database written by `metrix++ collect`,
+    so no `metrix++ view` process and no xml are needed
+    """
+
+    def __init__(self, db_path: str):
+        self.conn = sqlite3.connect(db_path)
+        self.group_column = self.get_regions_group_column()
+        self.file_ids = {normalize_path(path): file_id
+                         for file_id, path in self.conn.execute("SELECT id, path FROM __files__")}
+
+    def close(self):
+        self.conn.close()
+
+    def get_regions_group_column(self) -> str:
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(__regions__)")]
+        return "group_id" if "group_id" in columns else "group"
+
+    def select_for_files(self, sql: str, file_ids: List[int]):
+        placeholders = ", ".join("?" * len(file_ids))
+        return self.conn.execute(sql.format(placeholders), file_ids)
+
+    def get_regions_for_files(self, paths: Collection[str]) -> Dict[str, List[RegionInfo]]:
+        """
+        Reads regions of several files in one pass over the database
+        :param paths: paths of the files, as they were passed to metrix++ collect
+        :return: regions in the same order as metrixpp_parser.parse_metrixpp_xml returns them, keyed by path.
+        Files unknown to metrix++ are absent
+        """
+        path_for_file_id = {}
+        for path in paths:
+            file_id = self.file_ids.get(normalize_path(path))
+            if file_id is not None:
+                path_for_file_id[file_id] = path
+        if len(path_for_file_id) == 0:
+            return {}
+        file_ids = list(path_for_file_id.keys())
+
+        lines = {}
+        for file_id, region_id, code, preprocessor, comments in self.select_for_files(
+                """SELECT file_id, region_id, code, preprocessor, comments FROM "std.code.lines"
+                WHERE file_id IN ({0})""", file_ids):
+            lines[(file_id, region_id)] = (code or 0) + (preprocessor or 0), comments or 0
+
+        complexity = {}
+        for file_id, region_id, cyclomatic in self.select_for_files(
+                """SELECT file_id, region_id, cyclomatic FROM "std.code.complexity" WHERE file_id IN ({0})""",
+                file_ids):
+            complexity[(file_id, region_id)] = cyclomatic or 0
+
+        rows_for_file_id = {file_id: [] for file_id in file_ids}
+        for row in self.select_for_files(
+                """SELECT file_id, region_id, name, begin, "end", line_begin, line_end, "{0}" FROM __regions__
+                WHERE file_id IN ({{0}}) ORDER BY file_id, region_id""".format(self.group_column), file_ids):
+            rows_for_file_id[row[0]].append(row)
+
+        result = {}
+        for file_id, rows in rows_for_file_id.items():
+            if len(rows) > 0:
+                result[path_for_file_id[file_id]] = build_regions(rows, lines, complexity)
+        return result
+
+
+def create_region_info(row, lines, complexity) -> RegionInfo:
+    file_id, region_id, name, begin, end, line_begin, line_end, group = row
+    key = (file_id, region_id)
+    name = sys.intern(name)
+
+    region_type = from_metrixpp_group_to_region_type.get(group, RegionType.Unknown)
+    if region_type == RegionType.Function:
+        region_info = FunctionInfo(name)
+        # metrixpp ccn is always mistaken by -1
+        cyclomatic_complexity = complexity.get(key, 0) + 1
+        region_info.cyclomatic_complexity = cyclomatic_complexity
+        region_info.ccn_sum = cyclomatic_complexity
+        region_info.n_functions = 1
+    else:
+        region_info = RegionInfo(region_type, name)
+        region_info.ccn_sum = 0
+        region_info.n_functions = 0
+
+    region_info.total_lines = line_end + 1 - line_begin
+    region_info.own_code_lines, region_info.own_comment_lines = lines.get(key, (0, 0))
+    region_info.total_code_lines = region_info.own_code_lines
+    region_info.total_comment_lines = region_info.own_comment_lines
+    return region_info
+
+
+def build_regions(rows, lines, complexity) -> List[RegionInfo]:
+    """
+    Restores nesting of regions of one file from their offsets and rolls totals up to outer regions
+    :param rows: rows of __regions__ for one file ordered by region_id (metrix++ numbers regions in pre-order)
+    :return: regions in post-order, as metrixpp_parser builds them
+    """
+    regions = [create_region_info(row, lines, complexity) for row in rows]
+    children = [[] for _ in rows]
+    roots = []
+
+    stack = []  # indexes of the regions enclosing the current one
+    for index, row in enumerate(rows):
+        begin = row[3]
+        while len(stack) > 0 and rows[stack[-1]][4] <= begin:
+            stack.pop()
+        if len(stack) == 0:
+            roots.append(index)
+        else:
+            outer_region = regions[stack[-1]]
+            regions[index].outer_region = outer_region
+            regions[index].is_inside_some_function = \
+                outer_region.is_inside_some_function or isinstance(outer_region, FunctionInfo)
+            children[stack[-1]].append(index)
+        stack.append(index)
+
+    post_order = []
+    for root in roots:
+        to_visit = [(root, False)]
+        while len(to_visit) > 0:
+            index, children_visited = to_visit.pop()
+            if children_visited:
+                post_order.append(regions[index])
+                continue
+            to_visit.append((index, True))
+            for child in reversed(children[index]):
+                to_visit.append((child, False))
+
+    for region_info in post_order:
+        outer_region = region_info.outer_region
+        if outer_region is not None:
+            outer_region.total_code_lines += region_info.total_code_lines
+            outer_region.total_comment_lines += region_info.total_comment_lines
+            if isinstance(region_info, FunctionInfo):
+                outer_region.ccn_sum += region_info.ccn_sum
+                outer_region.n_functions += region_info.n_functions
+    return post_order
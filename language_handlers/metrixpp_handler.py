@@ -1,78 +1,166 @@
-import subprocess
-from typing import Collection, List, Set
+import os
+import time
+from typing import Collection, Dict, List, Optional, Set, Tuple
 
 import logging
 
 from config import Config
-from database import db_helpers
+from database.bulk_writer import BulkWriter
+from database.storage import Storage
 from info.file_info import FileInfo
-from info.function_info import FunctionInfo
 from info.project_info import ProjectInfo
+from info.region_info import RegionInfo
+from instrumentation import Measurement
 from language_handlers.base_handler import BaseHandler
+from language_handlers.metrixpp_db_reader import MetrixppDbReader
+from result_cache import ResultCache, flatten_regions_list
+from retry import ToolCrashed, call_with_retries
+from tool_runner import ToolTimedOut, get_tool_runner
+from worker_pool import TaskFailed, WorkerPool, run_task
+
+
+def get_metrixpp_xml_for_files(work_dir: str, metrixpp_db_path: str, paths: List[str]) -> str:
+    """ :raises TaskFailed: if metrix++ view went over the time budget of the files"""
+    file_timeout = Config.get_file_timeout_seconds()
+
+    def run_view() -> str:
+        try:
+            return get_tool_runner().run_for_output([Config.get_python27_path(), Config.get_metrixpp_path(),
+                                                     'view', '--format=xml', '--nest-regions',
+                                                     '--db-file={0}'.format(metrixpp_db_path),
+                                                     '--log-level=ERROR', '--'] + paths,
+                                                    "metrix++ view", cwd=work_dir,
+                                                    timeout=file_timeout * len(paths) if file_timeout > 0
+                                                    else Config.get_metrixpp_timeout_seconds())
+        except ToolTimedOut as e:
+            if file_timeout > 0:
+                # a file too slow for metrix++ would be as slow again, so it is not retried
+                raise TaskFailed(str(e))
+            raise
+
+    metrixpp_xml = call_with_retries(run_view, "metrix++ view of {0} files".format(len(paths)))
+    logging.info("metrix++ view finished ({0} files)".format(len(paths)))
+    return metrixpp_xml
+
+
+def parse_regions_for_one_file(work_dir: str, metrixpp_db_path: str, path: str) -> Optional[List[RegionInfo]]:
+    """ :return: regions of the file, None if they cannot be extracted, TaskFailed if the file went over its budget"""
+    from language_handlers.metrixpp_parser import parse_metrixpp_xml
+
+    try:
+        metrixpp_xml = get_metrixpp_xml_for_files(work_dir, metrixpp_db_path, [path])
+        return parse_metrixpp_xml(metrixpp_xml)
+    except TaskFailed as e:
+        return e
+    except (MemoryError, RecursionError) as e:
+        return TaskFailed.from_error(e)
+    except Exception:
+        logging.exception("metrix++ results for \"{0}\" cannot be extracted".format(path))
+        return None
+
+
+def get_regions_for_batch(batch_job: Tuple[str, str, str, List[str]]) \
+        -> Tuple[List[Optional[List[RegionInfo]]], Dict[str, Measurement], List[float]]:
+    """
+    Gets regions of several files from metrix++ results
+    :param batch_job: (work_dir, metrixpp_db_path, reader, paths), reader is 'xml' or 'sqlite'
+    :return: regions for each of the paths (None where they could not be extracted, TaskFailed where they went
+    over their budget), measurements of 'view' and 'parse' stages, seconds spent on each of the paths
+    :raises TaskFailed: if metrix++ view of the whole batch went over the time budget
+    """
+    work_dir, metrixpp_db_path, reader, paths = batch_job
+
+    if reader == "sqlite":
+        view_measurement = Measurement()
+        db_reader = MetrixppDbReader(metrixpp_db_path)
+        try:
+            regions_for_path = db_reader.get_regions_for_files(paths)
+        finally:
+            db_reader.close()
+        view_measurement.stop()
+        file_seconds = [view_measurement.seconds / len(paths)] * len(paths)
+        return [regions_for_path.get(path) for path in paths], {"view": view_measurement}, file_seconds
+
+    from language_handlers.metrixpp_parser import ViewParser
+
+    view_measurement = Measurement()
+    try:
+        metrixpp_xml = get_metrixpp_xml_for_files(work_dir, metrixpp_db_path, paths)
+    except ToolCrashed:
+        metrixpp_xml = None
+    view_measurement.stop()
+    view_seconds_per_file = view_measurement.seconds / len(paths)
+
+    parse_measurement = Measurement()
+    parser = ViewParser()
+    try:
+        if metrixpp_xml is None:
+            raise ValueError("metrix++ view crashed")
+        regions_by_index = parser.parse(metrixpp_xml)
+    except Exception:
+        # one broken file spoils the whole batch, so view files separately to isolate it
+        logging.warning("metrix++ view: batch of {0} files cannot be viewed or parsed, handling files one by one"
+                        .format(len(paths)))
+        regions_list = []
+        file_seconds = []
+        for path in paths:
+            started_at = time.perf_counter()
+            regions_list.append(parse_regions_for_one_file(work_dir, metrixpp_db_path, path))
+            file_seconds.append(view_seconds_per_file + time.perf_counter() - started_at)
+        return regions_list, {"view": view_measurement, "parse": parse_measurement.stop()}, file_seconds
+
+    parse_measurement.stop()
+    file_seconds = [view_seconds_per_file + parser.file_seconds.get(index, 0.0) for index in range(len(paths))]
+    return [regions_by_index.get(index) for index in range(len(paths))], \
+        {"view": view_measurement, "parse": parse_measurement}, file_seconds
+
+
+def extract_regions_for_batch(batch_job: Tuple[str, str, str, List[str]]) \
+        -> Tuple[List[Optional[List[list]]], Dict[str, Measurement], List[float]]:
+    """
+    get_regions_for_batch in a worker process, the regions are returned flat (see flatten_regions)
+    """
+    regions_list, measurements, file_seconds = get_regions_for_batch(batch_job)
+    return flatten_regions_list(regions_list), measurements, file_seconds
 
 
 class MetrixppHandler(BaseHandler):
     already_collected_projects = set()
     error_filenames_for_project = {}
+    # metrix++ view of a batch, then of its files one by one, is stopped by its own timeout inside the worker,
+    # the worker is killed only when the work in it gets stuck
+    worker_timeout_factor = 3
 
     @classmethod
     def metrixpp_collect_performed_for(cls, project_info: ProjectInfo) -> bool:
         return project_info in cls.already_collected_projects
 
-    def __init__(self, project_info: ProjectInfo, conn):
-        super().__init__(project_info, conn)
-
+    def __init__(self, project_info: ProjectInfo, storage: Storage, bulk_writer: BulkWriter = None,
+                 worker_pool: WorkerPool = None, result_cache: ResultCache = None):
+        super().__init__(project_info, storage, bulk_writer, worker_pool, result_cache)
 
-    @staticmethod
-    def get_metrixpp_xml_for_file(file_info: FileInfo) -> str:
-        completed_process = subprocess.run([Config.get_python27_path(), Config.get_metrixpp_path(),
-                                            'view', '--format=xml', '--nest-regions',
-                                            '--db-file={0}'.format(Config.get_path_for_temp_metrixpp_db()),
-                                            '--log-level=ERROR', '--',
-                                            file_info.path], stdout=subprocess.PIPE, encoding='utf-8')
-        if completed_process.returncode != 0:
-            print("ERROR: metrix++ view crashed. Status code {0}".format(completed_process.returncode))
-            exit(1)
-        logging.info("metrix++ view finished")
-
-        return completed_process.stdout
-
-    def handle_one_file(self, file_info: FileInfo):
-        if not self.metrixpp_collect_performed_for(self.project_info):
-            self.invoke_metrixpp_collect()
 
+    def is_skipped_after_collect(self, file_info: FileInfo) -> bool:
         if file_info.path in self.error_filenames_for_project[self.project_info]:
             logging.error("ERROR: file \"{0}\" was skipped due to metrix++ collect warning".format(file_info.path))
             print("ERROR: file \"{0}\" was skipped due to metrix++ collect warning".format(file_info.path))
             self.project_info.files_with_errors += 1
-            return
+            return True
+        return False
 
-        from language_handlers.metrixpp_parser import parse_metrixpp_xml
-        db_helpers.add_new_file(self.conn, file_info)
+    def get_batch_job(self, batch: List[FileInfo]) -> tuple:
+        return (self.project_info.get_analysis_dir(), self.project_info.metrixpp_db_path, Config.get_metrixpp_reader(),
+                [file_info.path for file_info in batch])
 
-        self.project_info.files_analyzed += 1
-
-        metrixpp_xml = self.get_metrixpp_xml_for_file(file_info)
-        try:
-            regions = parse_metrixpp_xml(metrixpp_xml)
-            for region_info in regions:
-                region_info.file_info = file_info
-
-            for region_info in reversed(regions):
-                if region_info.is_inside_some_function:
-                    continue
-                if isinstance(region_info, FunctionInfo):
-                    db_helpers.add_new_function(self.conn, region_info)
-                else:
-                    db_helpers.add_new_region(self.conn, region_info)
-
-        except Exception as e:
-            logging.error("ERROR: file \"{0}\" was skipped because of parse error".format(file_info.path))
-            print("ERROR: file \"{0}\" was skipped because of parse error".format(file_info.path))
-            self.project_info.files_with_errors += 1
-            db_helpers.delete_file(self.conn, file_info)
+    def handle_one_file(self, file_info: FileInfo):
+        if not self.metrixpp_collect_performed_for(self.project_info):
+            self.invoke_metrixpp_collect()
 
+        if self.is_skipped_after_collect(file_info) or self.project_info.is_quarantined(file_info.path):
+            return
 
+        result = run_task((extract_regions_for_batch, self.get_batch_job([file_info]), 0, None, ()))
+        self.store_batch_result([file_info], result, "view")
 
     @staticmethod
     def get_error_file_set(collect_stdout: str) -> Set[str]:
@@ -87,20 +175,26 @@ class MetrixppHandler(BaseHandler):
         return result
 
 
+    def run_metrixpp_collect(self) -> str:
+        """ :return: stdout of metrix++ collect"""
+        if os.path.exists(self.project_info.metrixpp_db_path):
+            os.remove(self.project_info.metrixpp_db_path)
+        return get_tool_runner().run_for_output([Config.get_python27_path(), Config.get_metrixpp_path(),
+                                                 'collect', '--std.code.lines.total', '--std.code.lines.code',
+                                                 '--std.code.lines.preprocessor',
+                                                 '--std.code.lines.comments', '--std.code.complexity.cyclomatic',
+                                                 '--db-file={0}'.format(self.project_info.metrixpp_db_path),
+                                                 '--log-level=ERROR', '--', self.project_info.name],
+                                                "metrix++ collect", cwd=self.project_info.get_analysis_dir(),
+                                                timeout=Config.get_metrixpp_timeout_seconds())
+
     def invoke_metrixpp_collect(self):
         logging.info("metrix++ collect started")
-        completed_process = subprocess.run([Config.get_python27_path(), Config.get_metrixpp_path(),
-                                            'collect', '--std.code.lines.total', '--std.code.lines.code',
-                                            '--std.code.lines.preprocessor',
-                                            '--std.code.lines.comments', '--std.code.complexity.cyclomatic',
-                                            '--db-file={0}'.format(Config.get_path_for_temp_metrixpp_db()),
-                                            '--log-level=ERROR', '--', self.project_info.name],
-                                           stdout=subprocess.PIPE, encoding='utf-8')
-        if completed_process.returncode != 0:
-            print("ERROR: metrix++ collect crashed. Status code {0}".format(completed_process.returncode))
-            exit(1)
-
-        self.error_filenames_for_project[self.project_info] = self.get_error_file_set(completed_process.stdout)
+        with self.project_info.run_stats.measure("collect"):
+            collect_stdout = call_with_retries(self.run_metrixpp_collect,
+                                               "Project \"{0}\": metrix++ collect".format(self.project_info.name))
+
+        self.error_filenames_for_project[self.project_info] = self.get_error_file_set(collect_stdout)
 
         self.already_collected_projects.add(self.project_info)
         logging.info("metrix++ collect finished")
@@ -109,6 +203,14 @@ class MetrixppHandler(BaseHandler):
         if not self.metrixpp_collect_performed_for(self.project_info):
             self.invoke_metrixpp_collect()
 
-        for file_info in files:
-            self.handle_one_file(file_info)
-        return
+        files_to_view = [file_info for file_info in self.get_files_to_extract(files)
+                         if not self.is_skipped_after_collect(file_info)]
+
+        batch_size = Config.get_metrixpp_view_batch_size()
+        batches = [files_to_view[start: start + batch_size] for start in range(0, len(files_to_view), batch_size)]
+        self.handle_batches(extract_regions_for_batch, batches, "view")
+
+    def finish_project(self):
+        # the analysis directory may be collected again (for the next revision of the project)
+        self.already_collected_projects.discard(self.project_info)
+        self.error_filenames_for_project.pop(self.project_info, None)
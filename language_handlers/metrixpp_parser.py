@@ -1,97 +1,236 @@
-from typing import List, Union
-
-from lxml import etree
+import logging
+import re
+import sys
+import time
+from typing import Dict, List, Optional
+from xml.sax.saxutils import unescape
 
 from info.function_info import FunctionInfo
 from info.region_info import RegionInfo
 from info.region_type import RegionType
 
-
-def get_subregions(region_element: etree.ElementBase) -> List[etree.ElementBase]:
-    return region_element.findall("./subregions/subregion")
-
-
-def fill_region_info(region_info: RegionInfo, region_element: etree.ElementBase):
-    info_element = region_element.find("./info")
-    region_info.region_type = RegionType[info_element.get("type").capitalize()]
-    region_info.short_name = info_element.get("name")
-    region_info.total_lines = int(info_element.get("line_end")) + 1 - (int(info_element.get("line_begin")))
-
-    std_code_lines_element = region_element.find("./data/std.code.lines")
-    region_info.own_code_lines = int(std_code_lines_element.get("code")) \
-                                 + int(std_code_lines_element.get("preprocessor"))
-    region_info.own_comment_lines = int(std_code_lines_element.get("comments"))
-
-    region_info.total_code_lines = region_info.own_code_lines
-    region_info.total_comment_lines = region_info.own_comment_lines
-    region_info.ccn_sum = 0
-    region_info.n_functions = 0
-    return
-
-
-def create_region_info(region_element: etree.ElementBase) -> RegionInfo:
-    region_info = RegionInfo()
-    fill_region_info(region_info, region_element)
-    return region_info
-
-
-def create_function_info(region_element: etree.ElementBase) -> FunctionInfo:
-    function_info = FunctionInfo()
-    fill_region_info(function_info, region_element)
-
-    std_code_complexity_element = region_element.find("./data/std.code.complexity")
-
-    # metrixpp ccn is always mistaken by -1
-    cyclomatic_complexity = int(std_code_complexity_element.get("cyclomatic")) + 1
-
-    function_info.cyclomatic_complexity = cyclomatic_complexity
-    function_info.ccn_sum = cyclomatic_complexity
-    function_info.n_functions = 1
-
-    return function_info
-
-
-def extract_info_recursively(region_element: etree.ElementBase, outer_region: Union[RegionInfo, None],
-                             regions: List[RegionInfo]):
-    info_element = region_element.find("./info")
-    if info_element.get("type") == "function":
-        current_region_info = create_function_info(region_element)
-    else:
-        current_region_info = create_region_info(region_element)
-
-    if (outer_region is not None) and (outer_region.is_inside_some_function or isinstance(outer_region, FunctionInfo)):
-        current_region_info.is_inside_some_function = True
-
-    for inner_region in get_subregions(region_element):
-        extract_info_recursively(inner_region, current_region_info, regions)
-
-    current_region_info.outer_region = outer_region
-
-    if outer_region is not None:
-        outer_region.total_code_lines += current_region_info.total_code_lines
-        outer_region.total_comment_lines += current_region_info.total_comment_lines
-        if isinstance(current_region_info, FunctionInfo):
-            outer_region.ccn_sum += current_region_info.ccn_sum
-            outer_region.n_functions += current_region_info.n_functions
-    regions.append(current_region_info)
-    return
+# Metrix++ doesn't escape < > and & in attribute values (who knows why), e.g. name="operator<<",
+# so values are taken as is up to the closing quote instead of being checked by an XML parser
+tag_pattern = re.compile(r"<(/?)([\w.:-]+)((?:\s+[\w.:-]+\s*=\s*(?:\"[^\"]*\"|'[^']*'))*)\s*(/?)>")
+attribute_pattern = re.compile(r"([\w.:-]+)\s*=\s*(?:\"([^\"]*)\"|'([^']*)')")
+entities = {"&quot;": "\"", "&apos;": "'"}
+
+
+def unescape_value(value: str) -> str:
+    return unescape(value, entities) if "&" in value else value
+
+
+def parse_attributes(attributes: str) -> Dict[str, str]:
+    return {name: unescape_value(double_quoted or single_quoted)
+            for name, double_quoted, single_quoted in attribute_pattern.findall(attributes)}
+
+
+def iterate_tags(metrixpp_xml: str):
+    """
+    Single pass over the document without building a tree
+    :return: (is_closing, tag name, raw attributes string, is_self_closing) for every element
+    """
+    position = metrixpp_xml.find("<")
+    while position >= 0:
+        if metrixpp_xml.startswith("<?", position):
+            end = metrixpp_xml.find("?>", position)
+            end = end + 2 if end >= 0 else -1
+        elif metrixpp_xml.startswith("<!--", position):
+            end = metrixpp_xml.find("-->", position)
+            end = end + 3 if end >= 0 else -1
+        elif metrixpp_xml.startswith("<!", position):
+            end = metrixpp_xml.find(">", position)
+            end = end + 1 if end >= 0 else -1
+        else:
+            match = tag_pattern.match(metrixpp_xml, position)
+            if match is None:
+                raise ValueError("metrix++ xml: malformed tag at offset {0}".format(position))
+            yield match.group(1) == "/", match.group(2), match.group(3), match.group(4) == "/"
+            end = match.end()
+        if end < 0:
+            raise ValueError("metrix++ xml: unterminated markup at offset {0}".format(position))
+        position = metrixpp_xml.find("<", end)
+
+
+class RegionFrame:
+    """ region element which is being parsed"""
+
+    def __init__(self, outer_frame: Optional["RegionFrame"], depth: int):
+        self.outer_frame = outer_frame
+        self.depth = depth  # number of open elements including the region one
+        self.info_attributes: Dict[str, str] = None
+        self.lines_attributes: Dict[str, str] = None
+        self.complexity_attributes: Dict[str, str] = None
+        self.region_info: RegionInfo = None
+
+    def get_region_info(self) -> RegionInfo:
+        """ creates region when its own elements are read, before its subregions"""
+        if self.region_info is None:
+            self.region_info = self.create_region_info()
+        return self.region_info
+
+    def create_region_info(self) -> RegionInfo:
+        if self.info_attributes is None or self.lines_attributes is None:
+            raise ValueError("metrix++ xml: region without info or std.code.lines")
+
+        if self.info_attributes["type"] == "function":
+            region_info = FunctionInfo()
+            # metrixpp ccn is always mistaken by -1
+            region_info.cyclomatic_complexity = int(self.complexity_attributes["cyclomatic"]) + 1
+            region_info.ccn_sum = region_info.cyclomatic_complexity
+            region_info.n_functions = 1
+        else:
+            region_info = RegionInfo()
+            region_info.ccn_sum = 0
+            region_info.n_functions = 0
+
+        region_info.region_type = RegionType[self.info_attributes["type"].capitalize()]
+        # names repeat a lot (get, run, operator==...), interned they are stored once
+        region_info.short_name = sys.intern(self.info_attributes["name"])
+        region_info.total_lines = int(self.info_attributes["line_end"]) + 1 - int(self.info_attributes["line_begin"])
+        region_info.own_code_lines = int(self.lines_attributes["code"]) + int(self.lines_attributes["preprocessor"])
+        region_info.own_comment_lines = int(self.lines_attributes["comments"])
+        region_info.total_code_lines = region_info.own_code_lines
+        region_info.total_comment_lines = region_info.own_comment_lines
+
+        if self.outer_frame is not None:
+            outer_region = self.outer_frame.get_region_info()
+            region_info.outer_region = outer_region
+            if outer_region.is_inside_some_function or isinstance(outer_region, FunctionInfo):
+                region_info.is_inside_some_function = True
+        return region_info
+
+    def finish(self, regions: List[RegionInfo]):
+        """ appends completed region after its subregions and adds its totals to the outer region"""
+        region_info = self.get_region_info()
+        outer_region = region_info.outer_region
+        if outer_region is not None:
+            outer_region.total_code_lines += region_info.total_code_lines
+            outer_region.total_comment_lines += region_info.total_comment_lines
+            if isinstance(region_info, FunctionInfo):
+                outer_region.ccn_sum += region_info.ccn_sum
+                outer_region.n_functions += region_info.n_functions
+        regions.append(region_info)
+
+
+class ViewParser:
+    """
+    Builds regions of every file of `metrix++ view` xml in one pass, nesting depth is limited only by memory.
+    Regions of a file are in post-order: inner regions go before outer ones, the global region is the last
+    """
+
+    def __init__(self):
+        self.result: Dict[int, List[RegionInfo]] = {}
+        self.open_tags: List[str] = []
+        self.file_index: int = None
+        self.file_path: str = None
+        self.file_started_at: float = None
+        self.file_seconds: Dict[int, float] = {}  # parsing time of every file
+        self.file_failed = False
+        self.inside_file_data = False
+        self.global_region_seen = False
+        self.frame: RegionFrame = None
+        self.regions: List[RegionInfo] = None
+
+    def parse(self, metrixpp_xml: str) -> Dict[int, List[RegionInfo]]:
+        for is_closing, tag, attributes, is_self_closing in iterate_tags(metrixpp_xml):
+            if is_closing:
+                self.end_element(tag)
+                continue
+            parent = self.open_tags[-1] if len(self.open_tags) > 0 else None
+            self.open_tags.append(tag)
+            try:
+                self.start_element(tag, parent, attributes)
+            except Exception:
+                self.fail_file()
+            if is_self_closing:
+                self.end_element(tag)
+        return self.result
+
+    def fail_file(self):
+        logging.exception("metrix++ view: cannot extract regions for \"{0}\"".format(self.file_path))
+        self.file_failed = True
+        self.frame = None
+
+    def start_element(self, tag: str, parent: Optional[str], attributes: str):
+        depth = len(self.open_tags)
+        if depth == 2 and tag == "data":
+            self.file_started_at = time.perf_counter()
+            self.file_index = None
+            self.file_path = None
+            self.file_failed = False
+            self.global_region_seen = False
+            self.regions = []
+        elif self.file_failed:
+            return
+        elif depth == 3 and tag == "info" and parent == "data":
+            info_attributes = parse_attributes(attributes)
+            self.file_path = info_attributes.get("path")
+            # metrix++ numbers requested paths starting from 1
+            self.file_index = int(info_attributes["id"]) - 1
+        elif depth == 3 and tag == "file-data":
+            self.inside_file_data = True
+        elif self.inside_file_data:
+            self.start_file_data_element(tag, parent, attributes)
+
+    def start_file_data_element(self, tag: str, parent: Optional[str], attributes: str):
+        frame = self.frame
+        if tag == "region" and parent == "regions" and frame is None:
+            if self.global_region_seen:
+                return
+            self.global_region_seen = True
+            self.frame = RegionFrame(None, len(self.open_tags))
+            return
+        if frame is None:
+            return
+        # only direct children of the current region element are its own
+        depth = len(self.open_tags) - frame.depth
+        if depth == 2 and tag == "subregion" and parent == "subregions":
+            frame.get_region_info()
+            self.frame = RegionFrame(frame, len(self.open_tags))
+        elif depth == 1 and tag == "info":
+            frame.info_attributes = parse_attributes(attributes)
+        elif depth == 2 and tag == "std.code.lines" and parent == "data":
+            frame.lines_attributes = parse_attributes(attributes)
+        elif depth == 2 and tag == "std.code.complexity" and parent == "data":
+            frame.complexity_attributes = parse_attributes(attributes)
+
+    def end_element(self, tag: str):
+        if len(self.open_tags) == 0 or self.open_tags[-1] != tag:
+            raise ValueError("metrix++ xml: unexpected closing tag </{0}>".format(tag))
+        closed_depth = len(self.open_tags)
+        self.open_tags.pop()
+        depth = len(self.open_tags)
+
+        if self.frame is not None and self.frame.depth == closed_depth:
+            try:
+                self.frame.finish(self.regions)
+                self.frame = self.frame.outer_frame
+            except Exception:
+                self.fail_file()
+        elif depth == 2 and tag == "file-data":
+            self.inside_file_data = False
+        elif depth == 1 and tag == "data":
+            if not self.file_failed and self.file_index is not None and self.global_region_seen:
+                self.result[self.file_index] = self.regions
+            if self.file_index is not None:
+                self.file_seconds[self.file_index] = time.perf_counter() - self.file_started_at
+            self.frame = None
+            self.regions = None
 
 
 def parse_metrixpp_xml(metrixpp_xml: str) -> List[RegionInfo]:
-    from xml.sax.saxutils import escape
-    try:
-        root = etree.fromstring(metrixpp_xml)
-    except etree.XMLSyntaxError:
-        # escaping in XML attributes < > and & because Metrix++ doesn't do it (who knows why)
-        troubles = (
-            "operator<<", "operator>>", "operator<", "operator>", "operator<=",
-            "operator>=", "operator&", "operator&&", "operator <", "operator >",
-            "operator <=", "operator >=", "operator <<", "operator >>", "operator &", "operator->", "operator ->")
-        for trouble in troubles:
-            metrixpp_xml = metrixpp_xml.replace(trouble, escape(trouble))
-        root = etree.fromstring(metrixpp_xml)
-
-    global_region_element = root.find("./data/file-data/regions/region")
-    regions = []
-    extract_info_recursively(global_region_element, None, regions)
-    return regions
+    result = ViewParser().parse(metrixpp_xml)
+    if len(result) == 0:
+        raise ValueError("metrix++ xml: no regions found")
+    return next(iter(result.values()))
+
+
+def parse_metrixpp_view_xml(metrixpp_xml: str) -> Dict[int, List[RegionInfo]]:
+    """
+    Parses output of one `metrix++ view` invocation for several files
+    :param metrixpp_xml: xml printed by metrix++ view
+    :return: regions for each file, keyed by the position of the file in the view arguments (starting from 0).
+    Files which could not be extracted are absent
+    """
+    return ViewParser().parse(metrixpp_xml)
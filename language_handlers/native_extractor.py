@@ -0,0 +1,504 @@
+import re
+import sys
+from typing import List, Optional, Set, Tuple
+
+from info.function_info import FunctionInfo
+from info.region_info import RegionInfo
+from info.region_type import RegionType
+from preprocessing import languages_with_preprocessor, remove_preprocessor_directives
+
+# stored results of other versions are never reused, see incremental.get_tool_versions()
+extractor_version = 2
+
+identifier_pattern = r"(?:[^\W\d]|\$)(?:\w|\$)*"
+
+
+def build_token_pattern(language: str):
+    """ one alternation for all tokens of the language, alternatives are tried in order"""
+    parts = [
+        ("space", r"\s+"),
+        # a directive only when # is the first token of the line, checked by the extractor
+        ("preprocessor", r"#(?:[^\n\\]|\\(?:\r?\n|[\s\S]))*" if language in languages_with_preprocessor else None),
+        ("comment", r"//[^\n]*|/\*[\s\S]*?(?:\*/|\Z)"),
+        # C++11 raw strings may contain anything, e.g. unbalanced quotes and braces
+        ("string", r"(?:u8|[uUL])?R\"(?P<delimiter>[^()\\\s]{0,16})\([\s\S]*?\)(?P=delimiter)\""
+         if language in ("C", "C++", "C/C++ Header") else None),
+        ("string", r'"""[\s\S]*?(?:"""|\Z)' if language == "Java" else None),
+        ("string", r'\$?@\$?"(?:[^"]|"")*"?' if language == "C#" else None),
+        ("string", r'"(?:[^"\\\n]|\\[\s\S])*"?|\'(?:[^\'\\\n]|\\[\s\S])*\'?'),
+        ("identifier", identifier_pattern),
+        # C++14 digit separators: 1'000'000
+        ("number", r"\.?\d(?:[eEpP][+-]|'?[\w.])*" if language in ("C++", "C/C++ Header") else
+         r"\.?\d(?:[eEpP][+-]|[\w.])*"),
+        ("punctuation", r"&&|\|\||\?\?|::|->|\S" if language == "C#" else r"&&|\|\||::|->|\S"),
+    ]
+    alternatives = []
+    for kind, pattern in parts:
+        if pattern is not None:
+            # a kind may have several alternatives, group names must be unique
+            alternatives.append("(?P<{0}{1}>{2})".format(kind, len(alternatives), pattern))
+    return re.compile("|".join(alternatives))
+
+
+supported_languages = ("Java", "C#", "C", "C++", "C/C++ Header")
+token_patterns = {language: build_token_pattern(language) for language in supported_languages}
+# group name -> token kind
+token_kinds = {name: name.rstrip("0123456789") for pattern in token_patterns.values() for name in pattern.groupindex}
+
+# the same decision points metrix++ counts: if, case, for, while, catch, &&, || and ?, for C# also foreach and ??
+complexity_tokens = {language: {"if", "case", "for", "while", "catch", "&&", "||", "?"} for language in supported_languages}
+complexity_tokens["C#"] |= {"foreach", "??"}
+
+class_keywords = {
+    "Java": {"class": RegionType.Class, "interface": RegionType.Interface},
+    "C#": {"class": RegionType.Class, "struct": RegionType.Struct, "interface": RegionType.Interface,
+           "namespace": RegionType.Namespace},
+    "C": {"struct": RegionType.Struct},
+    "C++": {"class": RegionType.Class, "struct": RegionType.Struct, "namespace": RegionType.Namespace},
+    "C/C++ Header": {"class": RegionType.Class, "struct": RegionType.Struct, "namespace": RegionType.Namespace},
+}
+
+# identifiers followed by parentheses which never start a function definition
+not_function_names = {"if", "else", "for", "foreach", "while", "do", "switch", "case", "catch", "try", "using",
+                      "lock", "fixed", "synchronized", "return", "sizeof", "typeof", "alignof", "decltype", "new",
+                      "delete", "throw", "noexcept", "defined", "checked", "unchecked", "nameof", "default", "when",
+                      "static_assert", "assert", "await", "yield", "__attribute__", "__declspec", "alignas",
+                      "constexpr"}
+
+# compiler specific attributes with arguments, skipped like annotations: __declspec(dllexport)
+attribute_keywords = {"__attribute__", "__declspec", "alignas"}
+
+# end of the class name: class Foo<T> : Bar, class Foo extends Bar
+class_name_terminators = {":", "<", "{", "extends", "implements", "where", "final", "sealed"}
+
+# token of a statement: (text, kind, first line, last line)
+Token = Tuple[str, str, int, int]
+# comment, preprocessor directive or blank line of a statement: (kind, first line, last line, tokens before it)
+Extra = Tuple[str, int, int, int]
+
+
+def skip_group(texts: List[str], start: int, opening: str, closing: str) -> int:
+    """ :return: index after the closing bracket matching the opening one at start (or after the last token)"""
+    depth = 0
+    for i in range(start, len(texts)):
+        if texts[i] == opening:
+            depth += 1
+        elif texts[i] == closing:
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return len(texts)
+
+
+class OpenRegion:
+    """ region whose closing brace has not been reached yet"""
+    __slots__ = ("region_info", "outer", "line_begin", "code_lines", "comment_lines", "preprocessor_lines",
+                 "complexity")
+
+    def __init__(self, region_info: RegionInfo, outer: Optional["OpenRegion"], line_begin: int):
+        self.region_info = region_info
+        self.outer = outer
+        self.line_begin = line_begin
+        self.code_lines: Set[int] = set()
+        self.comment_lines: Set[int] = set()
+        self.preprocessor_lines: Set[int] = set()
+        self.complexity = 0  # decision points in own code, nested functions excluded
+
+        region_info.total_code_lines = 0
+        region_info.total_comment_lines = 0
+        region_info.ccn_sum = 0
+        region_info.n_functions = 1 if isinstance(region_info, FunctionInfo) else 0
+        if outer is not None:
+            region_info.outer_region = outer.region_info
+            if outer.region_info.is_inside_some_function or isinstance(outer.region_info, FunctionInfo):
+                region_info.is_inside_some_function = True
+
+    def add_tokens(self, tokens: List[Token], decision_points: Set[str]):
+        for text, kind, first_line, last_line in tokens:
+            if first_line == last_line:
+                self.code_lines.add(first_line)
+            else:
+                self.code_lines.update(range(first_line, last_line + 1))
+            if text in decision_points:
+                self.complexity += 1
+
+    def add_extras(self, extras: List[Extra]):
+        for kind, first_line, last_line, _ in extras:
+            if kind == "comment":
+                self.comment_lines.update(range(first_line, last_line + 1))
+            elif kind == "preprocessor":
+                self.preprocessor_lines.update(range(first_line, last_line + 1))
+
+    def finish(self, line_end: int, regions: List[RegionInfo]):
+        """ appends completed region after its subregions and adds its totals to the outer region"""
+        region_info = self.region_info
+        region_info.total_lines = line_end + 1 - self.line_begin
+        region_info.own_code_lines = len(self.code_lines) + len(self.preprocessor_lines)
+        region_info.own_comment_lines = len(self.comment_lines)
+        region_info.total_code_lines += region_info.own_code_lines
+        region_info.total_comment_lines += region_info.own_comment_lines
+        if isinstance(region_info, FunctionInfo):
+            region_info.cyclomatic_complexity = self.complexity + 1
+            region_info.ccn_sum += region_info.cyclomatic_complexity
+
+        outer_region = region_info.outer_region
+        if outer_region is not None:
+            outer_region.total_code_lines += region_info.total_code_lines
+            outer_region.total_comment_lines += region_info.total_comment_lines
+            if isinstance(region_info, FunctionInfo):
+                outer_region.ccn_sum += region_info.ccn_sum
+                outer_region.n_functions += region_info.n_functions
+        regions.append(region_info)
+
+
+class RegionExtractor:
+    """
+    Finds classes, namespaces and functions of a C-like source with a tokenizer and brace matching,
+    without metrix++. Regions and their metrics follow metrix++: a region starts after the previous statement
+    or the last blank line before its name, so comments and annotations above it are its own lines,
+    code and comment lines are counted for the innermost region they belong to
+    """
+
+    def __init__(self, language: str):
+        self.language = language
+        self.token_pattern = token_patterns[language]
+        self.class_keywords = class_keywords[language]
+        self.decision_points = complexity_tokens[language]
+        self.cpp_syntax = language in ("C", "C++", "C/C++ Header")
+
+    def extract(self, code: str) -> List[RegionInfo]:
+        """
+        :param code: source with inactive preprocessor branches already blanked
+        :return: regions in post-order like metrix++ view parser: inner regions go before outer ones,
+        the global region is the last
+        """
+        regions: List[RegionInfo] = []
+        current = OpenRegion(RegionInfo(RegionType.Global, "__global__"), None, 1)
+        # for every open brace: (statement interrupted by the brace or None, its extras, its paren depth,
+        # region opened by it)
+        blocks: List[Tuple[Optional[List[Token]], List[Extra], int, Optional[OpenRegion]]] = []
+        pending: List[Token] = []  # tokens of the statement before the next ; { or }
+        pending_extras: List[Extra] = []  # comments, directives and blank lines before the next ; { or }
+        paren_depth = 0
+        line = 1
+
+        for match in self.token_pattern.finditer(code):
+            kind = token_kinds[match.lastgroup]
+            text = match.group()
+            if kind == "space":
+                newlines = text.count("\n")
+                if newlines > 1:
+                    pending_extras.append(("blank", line, line, len(pending)))
+                line += newlines
+                continue
+            last_line = line + text.count("\n") if kind in ("comment", "string", "preprocessor") else line
+
+            if kind == "preprocessor" and code[code.rfind("\n", 0, match.start()) + 1:match.start()].strip() != "":
+                # not a directive: # outside of them is no valid code anyway
+                kind = "punctuation"
+                text = "#"
+                last_line = line
+
+            if kind in ("comment", "preprocessor"):
+                pending_extras.append((kind, line, last_line, len(pending)))
+            elif kind != "punctuation" or text not in "{};()":
+                pending.append((text, kind, line, last_line))
+            elif text == "(":
+                paren_depth += 1
+                pending.append((text, kind, line, line))
+            elif text == ")":
+                paren_depth = max(0, paren_depth - 1)
+                pending.append((text, kind, line, line))
+            elif text == ";":
+                pending.append((text, kind, line, line))
+                if paren_depth == 0:  # not inside for (;;)
+                    current.add_tokens(pending, self.decision_points)
+                    current.add_extras(pending_extras)
+                    pending = []
+                    pending_extras = []
+            elif text == "{":
+                if paren_depth > 0 or self.is_member_initializer(pending):
+                    # lambda or initializer inside an expression, the statement goes on after the block
+                    blocks.append((pending, pending_extras, paren_depth, None))
+                    current.code_lines.add(line)
+                else:
+                    header = self.find_region_header(pending)
+                    if header is None:
+                        current.add_tokens(pending, self.decision_points)
+                        current.add_extras(pending_extras)
+                        current.code_lines.add(line)
+                        blocks.append((None, [], 0, None))
+                    else:
+                        region_info, name_index = header
+                        begin, region_extras = self.split_statement(pending, pending_extras, name_index, current)
+                        line_begin = pending[begin][2]
+                        if len(region_extras) > 0:
+                            line_begin = min(line_begin, region_extras[0][1])
+                        current = OpenRegion(region_info, current, line_begin)
+                        current.add_tokens(pending[begin:], self.decision_points)
+                        current.add_extras(region_extras)
+                        current.code_lines.add(line)
+                        blocks.append((None, [], 0, current))
+                pending = []
+                pending_extras = []
+                paren_depth = 0
+            else:  # }
+                current.add_tokens(pending, self.decision_points)
+                current.add_extras(pending_extras)
+                current.code_lines.add(line)
+                pending = []
+                pending_extras = []
+                paren_depth = 0
+                if len(blocks) > 0:
+                    interrupted_statement, interrupted_extras, interrupted_paren_depth, opened_region = blocks.pop()
+                    if opened_region is not None:
+                        opened_region.finish(line, regions)
+                        current = opened_region.outer
+                    if interrupted_statement is not None:
+                        pending = interrupted_statement
+                        pending.append((text, kind, line, line))
+                        pending_extras = interrupted_extras
+                        paren_depth = interrupted_paren_depth
+            line = last_line
+
+        current.add_tokens(pending, self.decision_points)
+        current.add_extras(pending_extras)
+        # like metrix++, the line after the last line break counts even when it is empty
+        last_line = code.count("\n") + 1
+        # regions left open by unbalanced braces end with the file
+        while current.outer is not None:
+            current.finish(last_line, regions)
+            current = current.outer
+        current.finish(last_line, regions)
+        return regions
+
+    def split_statement(self, tokens: List[Token], extras: List[Extra], name_index: int, outer: OpenRegion) \
+            -> Tuple[int, List[Extra]]:
+        """
+        Gives the part of the statement before the last blank line which precedes the region name to the outer region
+        :return: index of the first token of the region and the extras which belong to it
+        """
+        begin = 0
+        split = 0
+        for position, (kind, first_line, last_line, tokens_before) in enumerate(extras):
+            if tokens_before > name_index:
+                break
+            if kind == "blank":
+                begin = tokens_before
+                split = position + 1
+        outer.add_tokens(tokens[:begin], self.decision_points)
+        outer.add_extras(extras[:split])
+        return begin, extras[split:]
+
+    def is_member_initializer(self, tokens: List[Token]) -> bool:
+        """ brace initializer in C++ constructor initializer list: Foo() : x_{0}, y_{1} {"""
+        if not self.cpp_syntax or len(tokens) == 0 or tokens[-1][1] != "identifier":
+            return False
+        depth = 0
+        after_parentheses = False
+        for text, kind, first_line, last_line in tokens:
+            if text == "(":
+                depth += 1
+            elif text == ")":
+                depth -= 1
+                after_parentheses = depth == 0
+            elif text == ":" and depth == 0 and after_parentheses:
+                return True
+        return False
+
+    def get_significant_tokens(self, texts: List[str]) -> List[int]:
+        """ :return: indexes of tokens without annotations, attributes and template parameter lists"""
+        result = []
+        i = 0
+        n = len(texts)
+        while i < n:
+            text = texts[i]
+            if text == "@" and self.language == "Java" and i + 1 < n and texts[i + 1] != "interface":
+                # @Name, @a.b.Name or @Name(...)
+                i += 2
+                while i + 1 < n and texts[i] == ".":
+                    i += 2
+                if i < n and texts[i] == "(":
+                    i = skip_group(texts, i, "(", ")")
+                continue
+            if text == "[" and (len(result) == 0 or texts[result[-1]] in ("=", ",", "(", ":")):
+                # C# attributes, C++11 attributes and lambda captures, not array types and indexers
+                i = skip_group(texts, i, "[", "]")
+                continue
+            if text == "template" and i + 1 < n and texts[i + 1] == "<":
+                i = skip_group(texts, i + 1, "<", ">")
+                continue
+            if text in attribute_keywords and i + 1 < n and texts[i + 1] == "(":
+                i = skip_group(texts, i + 1, "(", ")")
+                continue
+            result.append(i)
+            i += 1
+        return result
+
+    def find_region_header(self, tokens: List[Token]) -> Optional[Tuple[RegionInfo, int]]:
+        """
+        Decides what the statement before an opening brace declares
+        :return: new region and index of the token where it starts, None for other blocks
+        (control statements, initializers, lambdas, anonymous classes, enums)
+        """
+        if len(tokens) == 0:
+            return None
+        texts = [token[0] for token in tokens]
+        significant = self.get_significant_tokens(texts)
+
+        # tokens outside parentheses, the parentheses themselves included
+        top_level: List[int] = []
+        depth = 0
+        for index in significant:
+            text = texts[index]
+            if text == "(":
+                if depth == 0:
+                    top_level.append(index)
+                depth += 1
+            elif text == ")":
+                depth -= 1
+                if depth == 0:
+                    top_level.append(index)
+            elif depth == 0:
+                top_level.append(index)
+
+        top_level_texts = [texts[index] for index in top_level]
+        if self.language == "C#" and len(top_level) > 0 and top_level_texts[-1] in ("get", "set"):
+            # property accessor, a function for metrix++: get { return value; }
+            return FunctionInfo(sys.intern(top_level_texts[-1])), top_level[-1]
+        if "=" in top_level_texts and "operator" not in top_level_texts:
+            return None  # initializer: int a[] = {...}, Runnable r = new Runnable() {...}
+
+        for position, text in enumerate(top_level_texts):
+            if text in self.class_keywords:
+                if position > 0 and top_level_texts[position - 1] == "enum":
+                    return None
+                if "(" in top_level_texts[:position]:
+                    break  # where T : class
+                class_header = self.get_class_header(tokens, top_level, position)
+                if class_header is not None:
+                    return class_header
+                break  # a function returning struct
+
+        return self.get_function_header(tokens, top_level)
+
+    def get_class_header(self, tokens: List[Token], top_level: List[int], keyword_position: int) \
+            -> Optional[Tuple[RegionInfo, int]]:
+        name = None
+        for index in top_level[keyword_position + 1:]:
+            text, kind = tokens[index][0], tokens[index][1]
+            if text in class_name_terminators:
+                break
+            if text == "(":
+                return None
+            if kind == "identifier":
+                name = text  # the name goes after macros: class EXPORT Foo
+            elif text in ("::", ".") and name is not None:
+                break  # metrix++ takes the first part of a qualified name: namespace Example.Store is Example
+        if name is None:
+            return None  # anonymous namespace or struct
+        keyword_index = top_level[keyword_position]
+        region_info = RegionInfo(self.class_keywords[tokens[keyword_index][0]], sys.intern(name))
+        return region_info, keyword_index
+
+    def get_function_header(self, tokens: List[Token], top_level: List[int]) -> Optional[Tuple[RegionInfo, int]]:
+        """ function name is the last identifier before ( of the signature: constructor initializers,
+        trailing return types and exception specifications are not the signature.
+        Like in metrix++, the name has no class: Foo::bar is bar"""
+        header = None
+        seen_parentheses = False
+        for position, index in enumerate(top_level):
+            text = tokens[index][0]
+            if text in (":", "->") and seen_parentheses:
+                break
+            if text != "(":
+                continue
+            seen_parentheses = True
+            named = self.get_function_name(tokens, top_level, position)
+            if named is not None:
+                header = named
+        if header is None:
+            return None
+        name, start = header
+        return FunctionInfo(sys.intern(name)), start
+
+    @staticmethod
+    def skip_type_arguments(texts: List[str], closing_position: int) -> int:
+        """ :return: position before < matching > at closing_position, -1 if there is no such one"""
+        depth = 0
+        for position in range(closing_position, -1, -1):
+            if texts[position] == ">":
+                depth += 1
+            elif texts[position] == "<":
+                depth -= 1
+                if depth == 0:
+                    return position - 1
+        return -1
+
+    def get_function_name(self, tokens: List[Token], top_level: List[int], paren_position: int) \
+            -> Optional[Tuple[str, int]]:
+        """ :return: name of the function whose parameters start at top_level[paren_position] and its first token"""
+        if paren_position == 0:
+            return None
+        texts = [tokens[index][0] for index in top_level[:paren_position]]
+        name_position = paren_position - 1
+
+        if texts[name_position] == ">":
+            # generic method: T Make<T>() {
+            name_position = self.skip_type_arguments(texts, name_position)
+
+        # operator<<, operator(), operator bool, operator new[]
+        if len(texts) >= 3 and texts[-3:] == ["operator", "(", ")"]:
+            name_position = paren_position - 3
+            name = "operator()"
+        elif "operator" in texts and "(" not in texts[texts.index("operator"):]:
+            name_position = len(texts) - 1 - texts[::-1].index("operator")
+            name = "operator"
+            # metrix++ removes the spaces of C# names: operator int is operatorint
+            separator = " " if self.cpp_syntax else ""
+            for index in top_level[name_position + 1:paren_position]:
+                name += separator + tokens[index][0] if tokens[index][1] == "identifier" else tokens[index][0]
+        elif name_position >= 0 and tokens[top_level[name_position]][1] == "identifier" and \
+                texts[name_position] not in not_function_names:
+            name = texts[name_position]
+            if self.language == "C#":
+                # metrix++ keeps type parameters and interfaces of C# names: Convert<T>, IDisposable.Dispose
+                while name_position >= 2 and texts[name_position - 1] == ".":
+                    scope_position = name_position - 2
+                    if texts[scope_position] == ">":
+                        scope_position = self.skip_type_arguments(texts, scope_position)
+                    if scope_position < 0 or tokens[top_level[scope_position]][1] != "identifier":
+                        break
+                    name_position = scope_position
+                name = "".join(texts[name_position:paren_position])
+        else:
+            return None
+
+        if name_position > 0 and texts[name_position - 1] == "~":
+            name_position -= 1
+            name = "~" + name
+        if name_position > 0 and texts[name_position - 1] == "new":
+            return None  # anonymous class: new Runnable() {...}
+        return name, top_level[name_position]
+
+
+def extract_regions(code: str, language: str) -> List[RegionInfo]:
+    """
+    Extracts regions of one file in the current process
+    :param code: contents of the file
+    :param language: cloc name of the language (Java, C#, C, C++, C/C++ Header)
+    :return: regions of the file, inner regions go before outer ones, the global region is the last
+    """
+    if code.startswith("\ufeff"):
+        code = code[1:]
+    if language in languages_with_preprocessor:
+        # the first branch of #if is kept, like for metrix++, but the lines keep their numbers
+        lines, _ = remove_preprocessor_directives(code.splitlines(True), keep_line_numbers=True)
+        code = "".join(lines)
+    return RegionExtractor(language).extract(code)
+
+
+def extract_regions_from_file(path: str, language: str) -> List[RegionInfo]:
+    with open(path, "rb") as source_file:
+        code = source_file.read().decode("utf-8", errors="replace")
+    return extract_regions(code, language)
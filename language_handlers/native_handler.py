@@ -0,0 +1,58 @@
+import logging
+import time
+from typing import Collection, Dict, List, Optional, Tuple
+
+from info.file_info import FileInfo
+from instrumentation import Measurement
+from language_handlers.base_handler import BaseHandler
+from language_handlers.native_extractor import extract_regions_from_file
+from result_cache import flatten_regions
+from worker_pool import TaskFailed, run_task
+
+# files sent to a worker process at once, small enough to keep all workers busy
+files_per_job = 20
+
+
+def extract_regions_for_batch(batch_job: List[Tuple[str, str]]) \
+        -> Tuple[List[Optional[List[list]]], Dict[str, Measurement], List[float]]:
+    """
+    Extracts regions of several files in-process, can be run in a worker process
+    :param batch_job: (path to the source file, language) for each of the files
+    :return: flat regions (see flatten_regions) for each of the files (None where they could not be extracted,
+    TaskFailed where they went over the memory budget), measurement of 'extract' stage, seconds spent on each of the files
+    """
+    measurement = Measurement()
+    regions_list = []
+    file_seconds = []
+    for path, language in batch_job:
+        started_at = time.perf_counter()
+        try:
+            regions_list.append(flatten_regions(extract_regions_from_file(path, language)))
+        except (MemoryError, RecursionError) as e:
+            regions_list.append(TaskFailed.from_error(e))
+        except Exception:
+            logging.exception("native extractor: cannot extract regions for \"{0}\"".format(path))
+            regions_list.append(None)
+        file_seconds.append(time.perf_counter() - started_at)
+    return regions_list, {"extract": measurement.stop()}, file_seconds
+
+
+class NativeHandler(BaseHandler):
+    """
+    Finds regions and cyclomatic complexity of Java, C# and C/C++ files without metrix++ (see native_extractor).
+    Sources are read from the source directory, the preprocessed overlay is not needed
+    """
+
+    def get_batch_job(self, batch: List[FileInfo]) -> List[Tuple[str, str]]:
+        return [(self.project_info.get_source_path(file_info.path), file_info.language) for file_info in batch]
+
+    def handle_one_file(self, file_info: FileInfo):
+        if self.project_info.is_quarantined(file_info.path):
+            return
+        result = run_task((extract_regions_for_batch, self.get_batch_job([file_info]), 0, None, ()))
+        self.store_batch_result([file_info], result, "extract")
+
+    def handle_files(self, files: Collection[FileInfo]):
+        files = self.get_files_to_extract(files)
+        batches = [files[start: start + files_per_job] for start in range(0, len(files), files_per_job)]
+        self.handle_batches(extract_regions_for_batch, batches, "extract")
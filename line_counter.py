@@ -0,0 +1,160 @@
+import json
+import os
+import re
+from typing import Dict, Iterator, Optional, Tuple
+
+from cloc_file_metrics import ClocFileMetrics
+from cloc_runner import iterate_project_paths
+from config import Config
+from info.file_info import FileInfo
+from info.project_info import ProjectInfo
+from instrumentation import call_measured
+from worker_pool import TaskFailed, WorkerPool
+
+supported_languages = ("Java", "C", "C++", "C/C++ Header", "C#")
+
+# the next place where something else than plain code may start
+interesting_token_pattern = re.compile(r'//|/\*|@"|"|\'')
+
+
+def load_extension_to_language() -> Dict[str, str]:
+    mapping_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "from_extension_to_cloc_name.json")
+    with open(mapping_path, "rt") as mapping_file:
+        mapping = json.load(mapping_file)
+    return {extension: language for extension, language in mapping.items() if language in supported_languages}
+
+
+extension_to_language = load_extension_to_language()
+
+
+def get_language(path: str) -> Optional[str]:
+    extension = os.path.splitext(path)[1][1:].lower()
+    return extension_to_language.get(extension)
+
+
+def find_string_end(line: str, start: int, quote: str, verbatim: bool) -> int:
+    """
+    :return: index after the closing quote, -1 if the string goes on after the end of the line
+    """
+    i = start
+    while True:
+        j = line.find(quote, i)
+        if j < 0:
+            return -1
+        if verbatim:
+            # "" is an escaped quote inside C# verbatim strings
+            if line.startswith(quote * 2, j):
+                i = j + 2
+                continue
+            return j + 1
+        backslashes = 0
+        while j - backslashes - 1 >= start and line[j - backslashes - 1] == "\\":
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return j + 1
+        i = j + 1
+
+
+def count_lines(text: str, language: str) -> ClocFileMetrics:
+    """
+    Classifies lines the way cloc does for C-like languages: whitespace-only lines are blank,
+    lines with anything outside comments are code, the rest are comment lines
+    """
+    blank = comment = code = 0
+    in_block_comment = False
+    in_verbatim_string = False  # C# @"..." strings may span several lines
+
+    for line in text.splitlines():
+        if line.strip() == "":
+            blank += 1
+            continue
+
+        has_code = False
+        has_comment = in_block_comment
+        i = 0
+        n = len(line)
+        while i < n:
+            if in_block_comment:
+                j = line.find("*/", i)
+                if j < 0:
+                    break
+                in_block_comment = False
+                i = j + 2
+                continue
+            if in_verbatim_string:
+                has_code = True
+                j = find_string_end(line, i, '"', verbatim=True)
+                if j < 0:
+                    break
+                in_verbatim_string = False
+                i = j
+                continue
+
+            match = interesting_token_pattern.search(line, i)
+            if match is None:
+                if line[i:].strip() != "":
+                    has_code = True
+                break
+            if line[i:match.start()].strip() != "":
+                has_code = True
+            token = match.group()
+            if token == "//":
+                has_comment = True
+                break
+            if token == "/*":
+                has_comment = True
+                in_block_comment = True
+                i = match.end()
+                continue
+
+            has_code = True
+            if token == '@"' and language == "C#":
+                j = find_string_end(line, match.end(), '"', verbatim=True)
+                if j < 0:
+                    in_verbatim_string = True
+                    break
+                i = j
+                continue
+            quote = token[-1]
+            j = find_string_end(line, match.end(), quote, verbatim=False)
+            if j < 0:
+                break
+            i = j
+
+        if has_comment and not has_code:
+            comment += 1
+        else:
+            code += 1
+
+    return ClocFileMetrics(blank, comment, code)
+
+
+def count_lines_of_file(path_and_language: Tuple[str, str]) -> ClocFileMetrics:
+    """ can be run in a worker process"""
+    path, language = path_and_language
+    with open(path, "rb") as file:
+        text = file.read().decode("utf-8", errors="replace")
+    return count_lines(text, language)
+
+
+def iterate_counted_files(project_info: ProjectInfo, worker_pool: WorkerPool) -> Iterator[FileInfo]:
+    """
+    Built-in replacement of cloc for the languages with handlers, counts files in worker processes
+    :return: files with their line counts
+    """
+    files = ((path, get_language(path)) for path in iterate_project_paths(project_info))
+    files = [(path, language) for path, language in files if language is not None]
+    jobs = ((count_lines_of_file, (project_info.get_source_path(path), language)) for path, language in files)
+
+    for (path, language), result in zip(files, worker_pool.imap(call_measured, jobs,
+                                                                Config.get_file_timeout_seconds())):
+        if isinstance(result, TaskFailed):
+            project_info.quarantine_file(path, "cloc", result.reason)
+            continue
+        cloc_metrics, measurement = result
+        project_info.run_stats.add("cloc", measurement)
+        project_info.run_stats.add_file_time(path, measurement.seconds)
+        file_info = FileInfo(path, language)
+        file_info.project_info = project_info
+        file_info.cloc_metrics = cloc_metrics
+        yield file_info
@@ -1,23 +1,37 @@
 import errno
-import json
 import os
 import shutil
 import stat
-import subprocess
 import traceback
+from collections import OrderedDict
 from datetime import datetime
-from typing import List
+from functools import partial
+from typing import Dict, List, Tuple
 
 import logging
 
-import psycopg2
-
+from checkpoint import Checkpoint
 from config import Config
-from database import db_helpers
+from cloc_runner import iterate_cloc_files, iterate_project_paths
+from database.storage import Storage, close_connection_pool, open_storage
+from file_filter import filter_project_files
+from git_fetch import fetch_project, release_project_checkout
+from history import checkout_revision, select_revisions
+from incremental import get_blob_shas, get_tool_versions, normalize_path
+from instrumentation import RunReport
+from line_counter import get_language, iterate_counted_files
+from pipeline import Pipeline, Stage
 from info.project_info import ProjectInfo
+from preprocessing import create_preprocessed_overlay
+from result_cache import ResultCache, close_result_cache, get_result_cache
+from retry import ToolCrashed, call_with_retries
+from staging import stage_files
+from tool_runner import close_tool_runner, get_process_slots, set_process_slots
+from worker_pool import WorkerPool
+from language_handlers.base_handler import BaseHandler
 from language_handlers.handler_provider import HandlerProvider
 from info.file_info import FileInfo
-from cloc_file_metrics import ClocFileMetrics
+from info.language_stat import LanguageStat
 
 
 def handle_remove_readonly(func, path, exc):
@@ -29,25 +43,6 @@ def handle_remove_readonly(func, path, exc):
         raise Exception("ERROR: Problem with removing")
 
 
-class LanguageStat:
-    def __init__(self, language):
-        self.language = language
-        self.files = 0
-        self.functions = 0
-        self.code_lines = 0
-        self.ccn = 0
-
-    def add_cloc_info(self, cloc_files, cloc_blank_lines, cloc_comment_lines, cloc_code_lines):
-        self.cloc_files = cloc_files
-        self.cloc_blank_lines = cloc_blank_lines
-        self.cloc_comment_lines = cloc_comment_lines
-        self.cloc_code_lines = cloc_code_lines
-
-    def get_metrics_tuple_for_db(self):
-        return (self.code_lines, self.cloc_code_lines, self.cloc_comment_lines, self.cloc_blank_lines, self.functions,
-                self.ccn / self.functions, self.code_lines / self.functions, self.files, self.cloc_files)
-
-
 def init_logging(level=logging.INFO):
     datetime_fmt = "%Y-%m-%d %H_%M_%S"
     now = datetime.now()
@@ -73,204 +68,445 @@ def make_project_name_from_url(url: str) -> str:
 def git_clone(project_info: ProjectInfo):
     logging.info("Project \"{0}\": git clone started".format(project_info.name))
 
-    # clone project to local directory ./<project_name>
-    ret = subprocess.call(['git', 'clone', project_info.url, project_info.name])
-    if ret != 0:
-        print("ERROR: git clone crashed. Status code {0}".format(ret))
-        exit(1)
+    def clone():
+        # clone project to local directory <work_dir>/<project_name>, what is left by a failed attempt is removed
+        destination = project_info.get_local_path(project_info.name)
+        if os.path.exists(destination):
+            shutil.rmtree(destination, ignore_errors=False, onerror=handle_remove_readonly)
+            release_project_checkout(project_info)
+        ret = fetch_project(project_info)
+        if ret != 0:
+            raise ToolCrashed("git clone", ret)
+
+    call_with_retries(clone, "Project \"{0}\": git clone".format(project_info.name))
     logging.info("Project \"{0}\": git clone finished".format(project_info.name))
     print("Project \"{0}\": git clone finished".format(project_info.name))
 
 
+def prepare_work_dir(project_info: ProjectInfo, project_number: int):
+    """ creates separate directory for the project clone and its metrix++ db, so projects can be handled in parallel"""
+    project_info.work_dir = os.path.abspath(os.path.join(Config.get_workspace_path(),
+                                                         "{0}_{1}".format(project_number, project_info.name)))
+    if os.path.exists(project_info.work_dir):
+        shutil.rmtree(project_info.work_dir, ignore_errors=False, onerror=handle_remove_readonly)
+    os.makedirs(project_info.work_dir)
+    project_info.metrixpp_db_path = os.path.join(project_info.work_dir,
+                                                 os.path.basename(Config.get_path_for_temp_metrixpp_db()))
+
+
 def remove_local_project_directory(project_info: ProjectInfo):
     logging.info("Project \"{0}\": removing project directory...".format(project_info.name))
-    shutil.rmtree(project_info.name, ignore_errors=False, onerror=handle_remove_readonly)
+    shutil.rmtree(project_info.work_dir, ignore_errors=False, onerror=handle_remove_readonly)
+    release_project_checkout(project_info)
     logging.info("Project \"{0}\": project directory has been removed".format(project_info.name))
     print("Project \"{0}\": project directory has been removed".format(project_info.name))
 
 
-def get_cloc_json_for_project(project_info: ProjectInfo) -> str:
-    logging.info("Project \"{0}\": cloc started".format(project_info.name))
-    completed_process = subprocess.run([Config.get_cloc_path(), '--json', '--by-file', project_info.name],
-                                       stdout=subprocess.PIPE, encoding='utf-8')
-    if completed_process.returncode != 0:
-        logging.error("Project \"{0}\": cloc crashed. Status code = {1}"
-                      .format(project_info.name, completed_process.returncode))
-        print("ERROR: Project \"{0}\": cloc crashed. Status code = {1}"
-              .format(project_info.name, completed_process.returncode))
-        exit(1)
-    logging.info("Project \"{0}\": cloc finished".format(project_info.name))
-    return completed_process.stdout
-
-
-def remove_preprocessor_directives(project_info: ProjectInfo, filename: str):
-    file = open(filename, "rt")
-    lines = file.readlines()
-    file.close()
-
-    if_synonyms = ("#if", "#ifdef", "#ifndef")
-    else_synonyms = ("#elif", "#else")
-
-    nesting_level = 0
-    inside_bad_area = False
-    bad_area_start: int
-    target_nesting_level: int
-
-    lines_to_remove = set()  # lines numbers to remove
-
-    for i in range(0, len(lines)):
-        line = lines[i]
-        line = line.lstrip()
-
-        if inside_bad_area and line.startswith("#endif") and target_nesting_level == nesting_level:
-            inside_bad_area = False
-            lines_to_remove |= set(range(bad_area_start, i))
-
-        if line.startswith("#endif"):
-            nesting_level -= 1
-
-        if line.startswith(if_synonyms):
-            nesting_level += 1
+def add_language_stats(project_info: ProjectInfo, language_stats: Dict[str, LanguageStat]):
+    for language, language_stat in language_stats.items():
+        project_info.get_language_stat(language).merge(language_stat)
+
+
+def start_or_resume_project(storage: Storage, project_info: ProjectInfo, checkpoint: Checkpoint) -> Dict[str, int]:
+    """
+    Adds the project to the database, or takes the one left by an interrupted run of the same url
+    :return: file_id for every path (normalized) stored by the interrupted run
+    """
+    project_id = checkpoint.get_project_id(project_info.url)
+    if project_id is not None and Config.is_history_mode():
+        # revisions are not resumed, the project is analyzed again
+        storage.delete_project(project_id)
+        project_id = None
+
+    if project_id is None:
+        storage.add_new_project(project_info)
+        checkpoint.start_project(project_info.url, project_info.id)
+        return {}
+
+    project_info.id = project_id
+    stored_files = {normalize_path(path): file_id for path, file_id in storage.get_stored_files(project_info).items()}
+    add_language_stats(project_info, storage.get_language_stats_for_files(list(stored_files.values())))
+    project_info.files_resumed = len(stored_files)
+    logging.info("Project \"{0}\": resumed, {1} files stored by the interrupted run"
+                 .format(project_info.name, project_info.files_resumed))
+    print("Project \"{0}\": resumed, {1} files stored by the interrupted run"
+          .format(project_info.name, project_info.files_resumed))
+    return stored_files
+
+
+def reuse_unchanged_files(storage: Storage, project_info: ProjectInfo, blob_shas: Dict[str, str]):
+    """
+    Copies results of files unchanged since the previous run of the same url,
+    only the other files are staged for cloc and metrix++
+    """
+    previous_files = {normalize_path(path): previous_file
+                      for path, previous_file in storage.get_previous_files(project_info).items()}
+    reused_file_ids = []
+    changed_paths = []
+    for path, blob_sha in blob_shas.items():
+        previous_file = previous_files.get(path)
+        if previous_file is not None and previous_file[1] == blob_sha:
+            reused_file_ids.append(previous_file[0])
+        else:
+            changed_paths.append(path)
+
+    project_info.files_reused = storage.copy_files_to_project(reused_file_ids, project_info)
+    add_language_stats(project_info, storage.get_language_stats_for_files(reused_file_ids))
+    logging.info("Project \"{0}\": {1} unchanged files reused".format(project_info.name, project_info.files_reused))
+    stage_files(project_info, changed_paths)
+
+
+def take_cached_files(project_info: ProjectInfo, blob_shas: Dict[str, str], handler_provider: HandlerProvider,
+                      result_cache: ResultCache) -> List[FileInfo]:
+    """
+    Stores files of the source directory whose results are in the result cache,
+    only the other files are staged for cloc and the language handlers
+    :return: stored files
+    """
+    cached_files = []
+    missed_paths = []
+    for path in iterate_project_paths(project_info):
+        blob_sha = blob_shas.get(normalize_path(path))
+        language = get_language(path)
+        language_handler = handler_provider.get_handler_for_language(language) if language is not None else None
+        cached_result = None
+        if blob_sha is not None and language_handler is not None:
+            cached_result = result_cache.get(blob_sha, language, project_info.tool_versions)
+        if cached_result is None:
+            missed_paths.append(path)
             continue
 
-        if line.startswith(else_synonyms) and not inside_bad_area:
-            inside_bad_area = True
-            bad_area_start = i + 1
-            target_nesting_level = nesting_level
-            continue
-
-    if len(lines_to_remove) > 0:
-        project_info.files_with_preprocessor_directives_changed += 1
-
-    new_file = open(filename, "wt")
-    for i in range(0, len(lines)):
-        if i not in lines_to_remove:
-            new_file.write(lines[i])
-
-    new_file.close()
-    return
+        file_info = FileInfo(path, language)
+        file_info.project_info = project_info
+        file_info.blob_sha = blob_sha
+        file_info.cloc_metrics, regions = cached_result
+        project_info.get_language_stat(language).add_cloc_metrics(file_info.cloc_metrics)
+        language_handler.handle_cached_file(file_info, regions)
+        cached_files.append(file_info)
 
+    if len(cached_files) > 0:
+        stage_files(project_info, missed_paths)
+    logging.info("Project \"{0}\": {1} files taken from the result cache, {2} files left for analysis"
+                 .format(project_info.name, len(cached_files), len(missed_paths)))
+    return cached_files
 
-def escape_cpp_raw_string_literals(project_info: ProjectInfo, filename: str):
-    import re
 
-    file = open(filename)
-    code = file.read()
-    file.close()
-
-    raw_string_pattern = \
-        re.compile(r"R\"(?P<delimiter>[^)(\\ \t\x0b\x0c\r\n]{0,16})\((.|\n|\r)*?\)(?P=delimiter)\"")
-
-    if raw_string_pattern.search(code):
-        project_info.files_with_raw_strings_changed += 1
+def get_project_summary(project_info: ProjectInfo) -> str:
+    return """Files added: {0}
+                Files with errors: {1}
+                Files changed because of preprocessor directives: {2}
+                Files with C++11 raw string literals changed: {3}
+                Files reused from the previous run: {4}
+                Files stored by the interrupted run: {5}
+                Files taken from the result cache: {6}
+                Files skipped by path: {7}
+                Files skipped as oversized: {8}
+                Files skipped as generated: {9}
+                Files quarantined: {10}""" \
+        .format(project_info.files_analyzed,
+                project_info.files_with_errors,
+                project_info.files_with_preprocessor_directives_changed,
+                project_info.files_with_raw_strings_changed,
+                project_info.files_reused,
+                project_info.files_resumed,
+                project_info.files_cached,
+                project_info.files_skipped_by_path,
+                project_info.files_skipped_by_size,
+                project_info.files_skipped_generated,
+                project_info.files_quarantined)
+
+
+def get_project_report(project_info: ProjectInfo) -> dict:
+    """ summary and timings of the project for the run report"""
+    report = OrderedDict((
+        ("name", project_info.name),
+        ("url", project_info.url),
+        ("project_id", project_info.id),
+        ("analyzer_version", project_info.tool_versions),
+        ("files_analyzed", project_info.files_analyzed),
+        ("files_with_errors", project_info.files_with_errors),
+        ("files_with_preprocessor_directives_changed", project_info.files_with_preprocessor_directives_changed),
+        ("files_with_raw_strings_changed", project_info.files_with_raw_strings_changed),
+        ("files_reused", project_info.files_reused),
+        ("files_resumed", project_info.files_resumed),
+        ("files_cached", project_info.files_cached),
+        ("files_skipped_by_path", project_info.files_skipped_by_path),
+        ("files_skipped_by_size", project_info.files_skipped_by_size),
+        ("files_skipped_generated", project_info.files_skipped_generated),
+        ("files_quarantined", project_info.files_quarantined),
+    ))
+    report.update(project_info.run_stats.to_dict(Config.get_report_slowest_files()))
+    return report
+
+
+def store_language_stats(storage: Storage, project_info: ProjectInfo):
+    storage.add_language_stats(project_info)
+    for language_stat in project_info.language_stats.values():
+        logging.info("Project \"{0}\": {1}: {2} files, {3} functions, CCN p50/p90/p99/max {4}/{5}/{6}/{7}"
+                     .format(project_info.name, language_stat.language, language_stat.files, language_stat.functions,
+                             *language_stat.get_metrics_tuple_for_db()[-4:]))
+
+
+def store_run(storage: Storage, project_info: ProjectInfo):
+    if Config.store_runs_in_database():
+        storage.add_run(project_info, get_project_report(project_info))
+
+
+def analyze_files(storage: Storage, project_info: ProjectInfo, blob_shas: Dict[str, str]) -> List[FileInfo]:
+    """
+    Prepares sources, counts lines, runs language handlers and stores results for files in the source directory
+    :param storage: open storage of the results
+    :param project_info: project, already added to the database
+    :param blob_shas: git blob hashes of the project files
+    :return: files stored to the database
+    """
+    all_files: List[FileInfo] = []
+    result_cache = get_result_cache()
+    # with budgets per file work goes to worker processes, where a stuck file can be stopped.
+    # Tools started there (metrix++ view) take the slots of the run, so [tools] max_processes holds for them too
+    worker_pool = WorkerPool(Config.get_file_workers(), Config.get_file_memory_mb() * 1024 * 1024,
+                             isolated=Config.get_file_timeout_seconds() > 0 or Config.get_file_memory_mb() > 0,
+                             setup=set_process_slots, setup_args=(get_process_slots(),))
+    project_info.quarantined_files = OrderedDict()
+    # handlers get files in portions big enough to keep all workers busy
+    portion_size = Config.get_metrixpp_view_batch_size() * max(1, Config.get_file_workers())
+
+    def handle_portion(language_handler: BaseHandler, files: List[FileInfo]):
+        logging.info("Start handling {0} files with {1}".format(len(files), type(language_handler).__name__))
+        language_handler.handle_files(files)
+        logging.info("OK")
+
+    bulk_writer = None
+    if Config.use_bulk_load():
+        bulk_writer = storage.create_bulk_writer(Config.get_bulk_batch_size(), Config.use_background_load(),
+                                                 project_info.run_stats)
+
+    counted_files = None
+    analysis_failed = True
+    try:
+        # skipped files are neither counted nor cached
+        filter_project_files(project_info)
+        handler_provider = HandlerProvider(project_info, storage, bulk_writer, worker_pool, result_cache)
+        if result_cache is not None:
+            all_files.extend(take_cached_files(project_info, blob_shas, handler_provider, result_cache))
+
+        # preprocessing doesn't depend on line counts, so files go to handlers as soon as their lines are counted.
+        # The builtin extractor handles preprocessor directives and raw strings itself
+        if Config.get_metrixpp_engine() != "builtin":
+            create_preprocessed_overlay(project_info, worker_pool)
+
+        if Config.get_line_counter_engine() == "builtin":
+            counted_files = iterate_counted_files(project_info, worker_pool)
+        else:
+            counted_files = iterate_cloc_files(project_info)
+
+        files_for_handler: Dict[BaseHandler, List[FileInfo]] = OrderedDict()
+        for file_info in counted_files:
+            file_info.blob_sha = blob_shas.get(normalize_path(file_info.path))
+            all_files.append(file_info)
+            project_info.get_language_stat(file_info.language).add_cloc_metrics(file_info.cloc_metrics)
+            language_handler = handler_provider.get_handler_for_language(file_info.language)
+            if language_handler is None:
+                logging.info("Handler for {0} not found".format(file_info.path))
+                continue
+            files = files_for_handler.setdefault(language_handler, [])
+            files.append(file_info)
+            if len(files) >= portion_size:
+                handle_portion(language_handler, files)
+                files_for_handler[language_handler] = []
+
+        for language_handler, files in files_for_handler.items():
+            if len(files) > 0:
+                handle_portion(language_handler, files)
+
+        if bulk_writer is not None:
+            bulk_writer.flush()
+        handler_provider.finish_project()
+        if len(project_info.quarantined_files) > 0:
+            storage.add_quarantined_files(project_info, blob_shas)
+        analysis_failed = False
+    finally:
+        if counted_files is not None:
+            # stops the line counting of a failed project at once (kills cloc, ends its producer thread)
+            counted_files.close()
+        worker_pool.close()
+        if bulk_writer is not None:
+            bulk_writer.close(raise_error=not analysis_failed)
+        if result_cache is not None:
+            result_cache.flush()
 
-    new_file = open(filename, "wt")
-    new_file.write(raw_string_pattern.sub("\"***\"", code))
-    new_file.close()
-    return
+    return [file_info for file_info in all_files if file_info.id is not None]
 
 
-def analyze_project(project_info: ProjectInfo):
-    cloc_json = get_cloc_json_for_project(project_info)
-    conn = None
+def analyze_project(project_info: ProjectInfo, checkpoint: Checkpoint):
+    project_info.tool_versions = get_tool_versions()
+    storage = None
 
     try:
-        conn_params = Config.get_postgresql_conn_parameters()
-        conn = psycopg2.connect(**conn_params)
+        blob_shas = get_blob_shas(project_info)
+        storage = open_storage()
 
-        project_id = db_helpers.add_new_project(conn, project_info)
-        logging.info("Project \"{0}\": project_id = {1}".format(project_info.name, project_id))
+        stored_files = start_or_resume_project(storage, project_info, checkpoint)
+        logging.info("Project \"{0}\": project_id = {1}".format(project_info.name, project_info.id))
+        pending_blob_shas = {path: blob_sha for path, blob_sha in blob_shas.items()
+                             if normalize_path(path) not in stored_files}
 
-        cloc_results = json.loads(cloc_json)
+        if Config.is_incremental():
+            reuse_unchanged_files(storage, project_info, pending_blob_shas)
+        elif len(stored_files) > 0:
+            stage_files(project_info, list(pending_blob_shas))
 
-        all_files: List[FileInfo] = []
-
-        for file_element in cloc_results:
-            if file_element in ["header", "SUM"]:
-                continue
-            file_info = FileInfo(file_element, cloc_results[file_element]["language"])
-            file_info.project_info = project_info
-            cloc_file_metrics = ClocFileMetrics(cloc_results[file_element]["blank"],
-                                                cloc_results[file_element]["comment"],
-                                                cloc_results[file_element]["code"])
-            file_info.cloc_metrics = cloc_file_metrics
-            all_files.append(file_info)
-
-        for file_info in all_files:
-            if file_info.language in ("C#", "C", "C++", "C/C++ Header"):
-                try:
-                    remove_preprocessor_directives(project_info, file_info.path)
-                except UnicodeDecodeError as e:
-                    print(e)
-            if file_info.language in ("C++", "C/C++ Header", "C"):
-                try:
-                    escape_cpp_raw_string_literals(project_info, file_info.path)
-                except UnicodeDecodeError as e:
-                    print(e)
-
-        handler_provider = HandlerProvider(project_info, conn)
-
-        i = 0
-        for file_info in all_files:
-            i += 1
-            language_handler = handler_provider.get_handler_for_language(file_info.language)
-            if language_handler is None:
-                logging.info("Handler for {0} not found".format(file_info.path))
-            else:
-                logging.info("Start handling file {0} [{1}/{2}]".format(file_info.path, i, len(all_files)))
-                language_handler.handle_one_file(file_info)
-                logging.info("OK")
+        analyze_files(storage, project_info, blob_shas)
+        store_language_stats(storage, project_info)
+        store_run(storage, project_info)
+        checkpoint.finish_project(project_info.url)
 
         logging.info("Project \"{0}\": analyze_project() successfully finished".format(project_info.name))
-        logging.info("""Files added: {0}
-                Files with errors: {1}
-                Files changed because of preprocessor directives: {2}
-                Files with C++11 raw string literals changed: {3}"""
-                     .format(project_info.files_analyzed,
-                             project_info.files_with_errors,
-                             project_info.files_with_preprocessor_directives_changed,
-                             project_info.files_with_raw_strings_changed))
+        logging.info(get_project_summary(project_info))
         print("Project \"{0}\": analyze_project() successfully finished".format(project_info.name))
-        print("""Files added: {0}
-                Files with errors: {1}
-                Files changed because of preprocessor directives: {2}
-                Files with C++11 raw string literals changed: {3}"""
-              .format(project_info.files_analyzed,
-                      project_info.files_with_errors,
-                      project_info.files_with_preprocessor_directives_changed,
-                      project_info.files_with_raw_strings_changed))
+        print(get_project_summary(project_info))
 
-    except (psycopg2.DatabaseError, Exception):
+    except Exception:
         print("Project \"{0}\": analyze_project() FATAL ERROR".format(project_info.name))
         traceback.print_exc()
         logging.critical("Project \"{0}\": analyze_project() FATAL ERROR".format(project_info.name))
         logging.exception("FATAL ERROR")
     finally:
-        if conn is not None:
-            conn.close()
+        if storage is not None:
+            storage.close()
         logging.info("connection_closed")
 
 
-def handle_one_project(url: str):
+def analyze_history(project_info: ProjectInfo, checkpoint: Checkpoint):
+    """
+    Analyzes several revisions of the project. Every revision measures only files whose blobs are new,
+    the rest is linked to the revision from earlier ones, so the cost is proportional to the churn
+    """
+    revisions = select_revisions(project_info, Config.get_history_range(), Config.get_history_sample())
+    project_info.tool_versions = get_tool_versions()
+    storage = None
+
+    try:
+        storage = open_storage()
+
+        start_or_resume_project(storage, project_info, checkpoint)
+        logging.info("Project \"{0}\": project_id = {1}, {2} revisions to analyze"
+                     .format(project_info.name, project_info.id, len(revisions)))
+
+        seen_blob_shas: Dict[str, str] = {}  # blobs already passed to analysis, stored or not
+        stored_files: Dict[str, Tuple[str, int]] = {}  # (blob_sha, file_id) of the latest stored version of a path
+
+        for revision_number, (commit_sha, committed_at) in enumerate(revisions):
+            checkout_revision(project_info, commit_sha)
+            blob_shas = get_blob_shas(project_info)
+
+            changed_paths = [path for path, blob_sha in blob_shas.items() if seen_blob_shas.get(path) != blob_sha]
+            stage_files(project_info, changed_paths)
+            for file_info in analyze_files(storage, project_info, blob_shas):
+                stored_files[normalize_path(file_info.path)] = (file_info.blob_sha, file_info.id)
+            seen_blob_shas.update((path, blob_shas[path]) for path in changed_paths)
+
+            file_ids = [stored_files[path][1] for path, blob_sha in blob_shas.items()
+                        if path in stored_files and stored_files[path][0] == blob_sha]
+            storage.add_revision(project_info, commit_sha, committed_at, file_ids)
+            logging.info("Project \"{0}\": revision {1} [{2}/{3}]: {4} files changed, {5} files linked"
+                         .format(project_info.name, commit_sha, revision_number + 1, len(revisions),
+                                 len(changed_paths), len(file_ids)))
+        store_language_stats(storage, project_info)
+        store_run(storage, project_info)
+        checkpoint.finish_project(project_info.url)
+
+        logging.info("Project \"{0}\": analyze_history() successfully finished".format(project_info.name))
+        logging.info(get_project_summary(project_info))
+        print("Project \"{0}\": analyze_history() successfully finished".format(project_info.name))
+        print(get_project_summary(project_info))
+
+    except Exception:
+        print("Project \"{0}\": analyze_history() FATAL ERROR".format(project_info.name))
+        traceback.print_exc()
+        logging.critical("Project \"{0}\": analyze_history() FATAL ERROR".format(project_info.name))
+        logging.exception("FATAL ERROR")
+    finally:
+        if storage is not None:
+            storage.close()
+        logging.info("connection_closed")
+
+
+def fetch_stage(numbered_url: Tuple[int, str]) -> ProjectInfo:
+    project_number, url = numbered_url
     project_name = make_project_name_from_url(url)
     project_info: ProjectInfo = ProjectInfo(url, project_name)
 
     logging.info("Project \"{0}\": start processing".format(project_info.name))
     print("Project \"{0}\": start processing".format(project_info.name))
 
-    git_clone(project_info)
-    analyze_project(project_info)
+    prepare_work_dir(project_info, project_number)
+    try:
+        with project_info.run_stats.measure("clone"):
+            git_clone(project_info)
+    except (Exception, SystemExit):
+        remove_local_project_directory(project_info)
+        raise
+    return project_info
+
+
+def analysis_stage(checkpoint: Checkpoint, project_info: ProjectInfo) -> ProjectInfo:
+    if Config.is_history_mode():
+        analyze_history(project_info, checkpoint)
+    else:
+        analyze_project(project_info, checkpoint)
+    return project_info
+
+
+def cleanup_stage(run_report: RunReport, project_info: ProjectInfo):
     remove_local_project_directory(project_info)
+    run_report.add_project(get_project_report(project_info))
 
 
 def main():
     init_logging(logging.INFO)
 
     todo_file = open(Config.get_todo_file_path(), 'rt')
-    for line in todo_file:
-        if line.isspace():
-            continue
-        handle_one_project(line.strip())
+    urls = [line.strip() for line in todo_file if not line.isspace()]
+    todo_file.close()
+
+    checkpoint = Checkpoint(Config.get_checkpoint_path())
+    numbered_urls = [(project_number, url) for project_number, url in enumerate(urls)
+                     if not checkpoint.is_finished(url)]
+    if len(numbered_urls) < len(urls):
+        logging.info("{0} projects finished by the previous run are skipped".format(len(urls) - len(numbered_urls)))
+        print("{0} projects finished by the previous run are skipped".format(len(urls) - len(numbered_urls)))
+
+    run_report = RunReport()
+    # clones wait for analysis in a bounded queue, so cloning goes ahead of analysis by pending_clones projects only.
+    # Projects on disk: clone_workers being cloned + pending_clones waiting + projects_in_parallel analyzed
+    # + 1 waiting for cleanup + 1 being removed
+    pipeline = Pipeline([
+        Stage("clone", fetch_stage, Config.get_clone_workers(), 1),
+        Stage("analysis", partial(analysis_stage, checkpoint), Config.get_projects_in_parallel(), Config.get_max_pending_clones(),
+              forward_failed=True),
+        Stage("cleanup", partial(cleanup_stage, run_report), 1, 1),
+    ])
+    logging.info("Handling {0} projects, {1} in parallel".format(len(numbered_urls),
+                                                                 Config.get_projects_in_parallel()))
+    try:
+        pipeline.run(numbered_urls)
+    finally:
+        # tools still running after an interrupt are killed, not left behind
+        close_tool_runner()
+    close_connection_pool()
+    close_result_cache()
+
+    if all(checkpoint.is_finished(url) for url in urls):
+        checkpoint.clear()
+    else:
+        logging.info("Some projects failed, run again to retry them")
+        print("Some projects failed, run again to retry them")
+
+    if Config.get_report_path() != "":
+        report_path = run_report.write(Config.get_report_path())
+        logging.info("Run report: {0}".format(report_path))
+        print("Run report: {0}".format(report_path))
 
     exit(0)
 
@@ -0,0 +1,88 @@
+import logging
+import queue
+import threading
+import traceback
+from typing import Callable, Iterable, List, Optional
+
+end_of_stream = object()
+
+
+class Stage:
+    """
+    Step of a pipeline: its own worker threads take items from the input queue and put results to the next stage.
+    Queues are bounded, so when the next stage is busy the workers wait instead of piling up results
+    """
+
+    def __init__(self, name: str, func: Callable, workers: int, queue_size: int, forward_failed: bool = False):
+        """
+        :param func: handles one item, returns the item for the next stage (None drops it)
+        :param workers: number of items handled at the same time
+        :param queue_size: number of items which may wait for this stage
+        :param forward_failed: pass the item to the next stage even if func failed (e.g. to clean up after it)
+        """
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.input_queue = queue.Queue(maxsize=max(1, queue_size))
+        self.forward_failed = forward_failed
+        self.next_stage: Optional[Stage] = None
+        self.threads: List[threading.Thread] = []
+        self.finished_workers = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        for worker_number in range(self.workers):
+            thread = threading.Thread(target=self.run_worker, name="{0}-{1}".format(self.name, worker_number),
+                                      daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def handle_item(self, item):
+        try:
+            return self.func(item)
+        except (Exception, SystemExit):
+            # a failed item must not stop the stage, the other items go on
+            print("ERROR: stage \"{0}\" failed".format(self.name))
+            traceback.print_exc()
+            logging.exception("stage \"{0}\" failed".format(self.name))
+            return item if self.forward_failed else None
+
+    def run_worker(self):
+        while True:
+            item = self.input_queue.get()
+            if item is end_of_stream:
+                self.input_queue.put(end_of_stream)  # for the other workers of the stage
+                break
+            result = self.handle_item(item)
+            if result is not None and self.next_stage is not None:
+                self.next_stage.input_queue.put(result)
+
+        with self.lock:
+            self.finished_workers += 1
+            is_last_worker = self.finished_workers == self.workers
+        if is_last_worker and self.next_stage is not None:
+            self.next_stage.input_queue.put(end_of_stream)
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+
+
+class Pipeline:
+    """ stages handling different items at the same time, every item passes all of them in order"""
+
+    def __init__(self, stages: List[Stage]):
+        self.stages = stages
+        for stage, next_stage in zip(stages, stages[1:]):
+            stage.next_stage = next_stage
+
+    def run(self, items: Iterable):
+        """ feeds items to the first stage (waiting while it is busy) and returns when all stages are done"""
+        for stage in self.stages:
+            stage.start()
+        first_stage = self.stages[0]
+        for item in items:
+            first_stage.input_queue.put(item)
+        first_stage.input_queue.put(end_of_stream)
+        for stage in self.stages:
+            stage.join()
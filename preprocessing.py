@@ -0,0 +1,167 @@
+import logging
+import os
+import re
+import shutil
+from collections import deque
+from typing import Iterator, List, Optional, Tuple
+
+from cloc_runner import iterate_project_paths
+from config import Config
+from info.project_info import ProjectInfo
+from instrumentation import call_measured
+from line_counter import get_language
+from staging import link_or_copy
+from worker_pool import TaskFailed, WorkerPool
+
+languages_with_preprocessor = ("C#", "C", "C++", "C/C++ Header")
+languages_with_raw_strings = ("C++", "C/C++ Header", "C")
+
+if_synonyms = ("#if", "#ifdef", "#ifndef")
+else_synonyms = ("#elif", "#else")
+
+raw_string_pattern = re.compile(r"R\"(?P<delimiter>[^)(\\ \t\x0b\x0c\r\n]{0,16})\([\s\S]*?\)(?P=delimiter)\"")
+
+
+def remove_preprocessor_directives(lines: Iterator[str], keep_line_numbers: bool = False) -> Tuple[List[str], bool]:
+    """
+    Removes code inside #elif and #else in one pass over the lines
+    :param keep_line_numbers: replace removed lines with empty ones instead of deleting them
+    :return: remaining lines, True if some lines have been removed
+    """
+    nesting_level = 0
+    inside_bad_area = False
+    bad_area_start: int  # index in result where the current bad area starts
+    target_nesting_level: int
+
+    result = []
+    changed = False
+
+    for line in lines:
+        stripped_line = line.lstrip()
+
+        if inside_bad_area and stripped_line.startswith("#endif") and target_nesting_level == nesting_level:
+            inside_bad_area = False
+            if len(result) > bad_area_start:
+                if keep_line_numbers:
+                    result[bad_area_start:] = ["\n"] * (len(result) - bad_area_start)
+                else:
+                    del result[bad_area_start:]
+                changed = True
+
+        result.append(line)
+
+        if stripped_line.startswith("#endif"):
+            nesting_level -= 1
+
+        if stripped_line.startswith(if_synonyms):
+            nesting_level += 1
+            continue
+
+        if stripped_line.startswith(else_synonyms) and not inside_bad_area:
+            inside_bad_area = True
+            bad_area_start = len(result)
+            target_nesting_level = nesting_level
+            continue
+
+    return result, changed
+
+
+def escape_cpp_raw_string_literals(code: str) -> Tuple[str, bool]:
+    """
+    Replaces C++11 raw string literals with "***"
+    :return: new code, True if some literals have been replaced
+    """
+    new_code, replacements = raw_string_pattern.subn("\"***\"", code)
+    return new_code, replacements > 0
+
+
+def preprocess_code(lines: Iterator[str], language: str) -> Tuple[Optional[str], bool, bool]:
+    """
+    :return: (new code or None if nothing has changed, preprocessor directives removed, raw string literals escaped)
+    """
+    directives_changed = False
+    raw_strings_changed = False
+    if language in languages_with_preprocessor:
+        lines, directives_changed = remove_preprocessor_directives(lines)
+    code = "".join(lines)
+    if language in languages_with_raw_strings:
+        code, raw_strings_changed = escape_cpp_raw_string_literals(code)
+    if not directives_changed and not raw_strings_changed:
+        return None, False, False
+    return code, directives_changed, raw_strings_changed
+
+
+def preprocess_file(job: Tuple[str, str, str]) -> Tuple[bool, bool]:
+    """
+    Prepares file for metrix++, can be run in a worker process.
+    The source file is never modified: the result is written to the overlay only if it differs from the source,
+    otherwise the source is linked there
+    :param job: (path to the source file, path to the file in the overlay, language)
+    :return: (preprocessor directives removed, raw string literals escaped)
+    """
+    source_path, overlay_path, language = job
+    new_code = None
+    directives_changed = False
+    raw_strings_changed = False
+    try:
+        with open(source_path, "rt") as source_file:
+            new_code, directives_changed, raw_strings_changed = preprocess_code(source_file, language)
+    except UnicodeDecodeError as e:
+        print(e)
+
+    if new_code is None:
+        link_or_copy(source_path, overlay_path)
+    else:
+        with open(overlay_path, "wt") as overlay_file:
+            overlay_file.write(new_code)
+    return directives_changed, raw_strings_changed
+
+
+def create_preprocessed_overlay(project_info: ProjectInfo, worker_pool: WorkerPool):
+    """
+    Creates <work_dir>/overlay/<project_name> with all files of the source directory, where sources are preprocessed,
+    and makes it project_info.analysis_dir. Files which need no changes are hard links, so the source directory
+    stays pristine and the overlay costs almost nothing for them
+    """
+    overlay_dir = os.path.join(project_info.work_dir, "overlay")
+    if os.path.exists(overlay_dir):
+        shutil.rmtree(overlay_dir)
+
+    preprocessed_paths = deque()  # results come in the order of jobs
+
+    def iterate_jobs():
+        for path in iterate_project_paths(project_info):
+            overlay_path = os.path.join(overlay_dir, path)
+            overlay_directory = os.path.dirname(overlay_path)
+            if not os.path.exists(overlay_directory):
+                os.makedirs(overlay_directory, exist_ok=True)
+
+            language = get_language(path)
+            if language in languages_with_preprocessor:
+                preprocessed_paths.append(path)
+                yield preprocess_file, (project_info.get_source_path(path), overlay_path, language)
+            else:
+                link_or_copy(project_info.get_source_path(path), overlay_path)
+
+    os.makedirs(os.path.join(overlay_dir, project_info.name), exist_ok=True)
+    files_preprocessed = 0
+    for result in worker_pool.imap(call_measured, iterate_jobs(), Config.get_file_timeout_seconds()):
+        path = preprocessed_paths.popleft()
+        if isinstance(result, TaskFailed):
+            # metrix++ must not see the file either
+            project_info.quarantine_file(path, "preprocessing", result.reason)
+            overlay_path = os.path.join(overlay_dir, path)
+            if os.path.exists(overlay_path):
+                os.remove(overlay_path)
+            continue
+        (directives_changed, raw_strings_changed), measurement = result
+        files_preprocessed += 1
+        project_info.run_stats.add("preprocessing", measurement)
+        project_info.run_stats.add_file_time(path, measurement.seconds)
+        if directives_changed:
+            project_info.files_with_preprocessor_directives_changed += 1
+        if raw_strings_changed:
+            project_info.files_with_raw_strings_changed += 1
+
+    project_info.analysis_dir = overlay_dir
+    logging.info("Project \"{0}\": {1} files preprocessed".format(project_info.name, files_preprocessed))
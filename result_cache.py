@@ -0,0 +1,225 @@
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from typing import List, Optional, Tuple
+
+from cloc_file_metrics import ClocFileMetrics
+from config import Config
+from info.file_info import FileInfo
+from info.function_info import FunctionInfo
+from info.region_info import RegionInfo
+from info.region_type import RegionType
+
+cache_schema = """
+CREATE TABLE IF NOT EXISTS results (
+  blob_sha  TEXT    NOT NULL,
+  language  TEXT    NOT NULL,
+  analyzer  TEXT    NOT NULL,
+  blank     INTEGER NOT NULL,
+  comment   INTEGER NOT NULL,
+  code      INTEGER NOT NULL,
+  regions   BLOB    NOT NULL,
+  size      INTEGER NOT NULL,
+  last_used REAL    NOT NULL,
+  PRIMARY KEY (blob_sha, language, analyzer)
+);
+CREATE INDEX IF NOT EXISTS results_last_used_idx ON results (last_used);
+"""
+
+# entries buffered before they are written in one transaction
+flush_size = 500
+
+
+def flatten_regions(regions: List[RegionInfo]) -> List[list]:
+    """
+    Flat form of the regions with the outer region given by its index, as they are cached and sent from worker
+    processes: pickling the outer_region links recursively fails for deeply nested regions
+    :param regions: regions of a file in post-order (inner before outer), as handlers produce them
+    """
+    index_of_region = {id(region_info): index for index, region_info in enumerate(regions)}
+    rows = []
+    for region_info in regions:
+        outer_index = index_of_region[id(region_info.outer_region)] if region_info.outer_region is not None else None
+        rows.append([region_info.region_type.value, region_info.short_name, outer_index, region_info.total_lines,
+                     region_info.own_code_lines, region_info.own_comment_lines, region_info.total_code_lines,
+                     region_info.total_comment_lines, region_info.ccn_sum, region_info.n_functions,
+                     region_info.is_inside_some_function,
+                     region_info.cyclomatic_complexity if isinstance(region_info, FunctionInfo) else None])
+    return rows
+
+
+def flatten_regions_list(regions_list: list) -> list:
+    """ :param regions_list: regions of several files, None and TaskFailed in place of regions are kept"""
+    return [flatten_regions(regions) if isinstance(regions, list) else regions for regions in regions_list]
+
+
+def unflatten_regions(rows: List[list]) -> List[RegionInfo]:
+    """ :return: regions in the order of the rows, linked to their outer regions"""
+    regions: List[RegionInfo] = []
+    for region_type, short_name, outer_index, total_lines, own_code_lines, own_comment_lines, total_code_lines, \
+            total_comment_lines, ccn_sum, n_functions, is_inside_some_function, cyclomatic_complexity in rows:
+        if region_type == RegionType.Function.value:
+            region_info = FunctionInfo(sys.intern(short_name))
+            region_info.cyclomatic_complexity = cyclomatic_complexity
+        else:
+            region_info = RegionInfo(RegionType(region_type), sys.intern(short_name))
+        region_info.total_lines = total_lines
+        region_info.own_code_lines = own_code_lines
+        region_info.own_comment_lines = own_comment_lines
+        region_info.total_code_lines = total_code_lines
+        region_info.total_comment_lines = total_comment_lines
+        region_info.ccn_sum = ccn_sum
+        region_info.n_functions = n_functions
+        region_info.is_inside_some_function = is_inside_some_function
+        regions.append(region_info)
+    for region_info, row in zip(regions, rows):
+        outer_index = row[2]
+        if outer_index is not None:
+            region_info.outer_region = regions[outer_index]
+    return regions
+
+
+def serialize_regions(regions: List[RegionInfo]) -> bytes:
+    """ :param regions: regions of a file in post-order (inner before outer), as handlers produce them"""
+    return zlib.compress(json.dumps(flatten_regions(regions), separators=(",", ":")).encode("utf-8"))
+
+
+def deserialize_regions(data: bytes) -> List[RegionInfo]:
+    return unflatten_regions(json.loads(zlib.decompress(data).decode("utf-8")))
+
+
+class ResultCache:
+    """
+    Results of files (cloc counts and regions) keyed by the git blob sha of their content, the language
+    and the versions of the tools, shared by all projects and runs: forks and vendored copies of the same
+    library are analyzed once. Least recently used entries are evicted when the file grows over max_size_bytes.
+    Safe for the threads of one run, several runs may share the file
+    """
+
+    def __init__(self, path: str, max_size_bytes: int):
+        self.path = path
+        self.max_size_bytes = max_size_bytes
+        self.lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.executescript(cache_schema)
+        self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM results;").fetchone()[0]
+
+        self.pending_entries: List[tuple] = []
+        self.pending_touches: List[tuple] = []
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.evicted = 0
+
+    def get(self, blob_sha: str, language: str, analyzer: str) -> Optional[Tuple[ClocFileMetrics, List[RegionInfo]]]:
+        """ :return: cloc counts and regions of the file, None if the file is not in the cache"""
+        with self.lock:
+            row = self.conn.execute("SELECT blank, comment, code, regions FROM results "
+                                    "WHERE blob_sha = ? AND language = ? AND analyzer = ?;",
+                                    (blob_sha, language, analyzer)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.pending_touches.append((time.time(), blob_sha, language, analyzer))
+            if len(self.pending_touches) >= flush_size:
+                self.flush_locked()
+        return ClocFileMetrics(row[0], row[1], row[2]), deserialize_regions(row[3])
+
+    def put(self, file_info: FileInfo, analyzer: str, regions: List[RegionInfo]):
+        """ remembers results of the analyzed file, they are written by flush()"""
+        if file_info.blob_sha is None or file_info.cloc_metrics is None:
+            return
+        data = serialize_regions(regions)
+        cloc_metrics = file_info.cloc_metrics
+        with self.lock:
+            self.pending_entries.append((file_info.blob_sha, file_info.language, analyzer, cloc_metrics.blank,
+                                         cloc_metrics.comment, cloc_metrics.code, data, len(data), time.time()))
+            if len(self.pending_entries) >= flush_size:
+                self.flush_locked()
+
+    def flush(self):
+        with self.lock:
+            self.flush_locked()
+
+    def flush_locked(self):
+        if len(self.pending_entries) == 0 and len(self.pending_touches) == 0:
+            return
+        with self.conn:
+            self.conn.executemany("UPDATE results SET last_used = ? "
+                                  "WHERE blob_sha = ? AND language = ? AND analyzer = ?;", self.pending_touches)
+            for entry in self.pending_entries:
+                cur = self.conn.execute("INSERT OR IGNORE INTO results (blob_sha, language, analyzer, blank, comment, "
+                                        "code, regions, size, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);", entry)
+                if cur.rowcount > 0:
+                    self.size += entry[7]
+                    self.stored += 1
+        self.pending_entries = []
+        self.pending_touches = []
+        if self.size > self.max_size_bytes:
+            self.evict()
+
+    def evict(self):
+        """ removes least recently used entries until the cache takes 90% of its limit"""
+        # other runs may have added or removed entries
+        self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM results;").fetchone()[0]
+        target_size = self.max_size_bytes * 0.9
+        while self.size > target_size:
+            rows = self.conn.execute("SELECT blob_sha, language, analyzer, size FROM results "
+                                     "ORDER BY last_used LIMIT 1000;").fetchall()
+            if len(rows) == 0:
+                break
+            keys = []
+            for blob_sha, language, analyzer, size in rows:
+                keys.append((blob_sha, language, analyzer))
+                self.size -= size
+                if self.size <= target_size:
+                    break
+            with self.conn:
+                self.conn.executemany("DELETE FROM results WHERE blob_sha = ? AND language = ? AND analyzer = ?;",
+                                      keys)
+            self.evicted += len(keys)
+
+    def get_summary(self) -> str:
+        lookups = self.hits + self.misses
+        return "Result cache {0}: {1} hits, {2} misses ({3:.1f}% hit rate), {4} entries stored, {5} evicted, " \
+               "{6:.1f} MB".format(self.path, self.hits, self.misses, 100.0 * self.hits / lookups if lookups else 0.0,
+                                   self.stored, self.evicted, self.size / 1024 / 1024)
+
+    def close(self):
+        with self.lock:
+            self.flush_locked()
+            self.conn.close()
+
+
+result_cache: ResultCache = None
+result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """ :return: cache of the run, None if it is disabled"""
+    global result_cache
+    with result_cache_lock:
+        if result_cache is None and Config.get_result_cache_path() != "":
+            result_cache = ResultCache(Config.get_result_cache_path(),
+                                       Config.get_result_cache_max_size_mb() * 1024 * 1024)
+        return result_cache
+
+
+def close_result_cache():
+    global result_cache
+    with result_cache_lock:
+        if result_cache is not None:
+            logging.info(result_cache.get_summary())
+            print(result_cache.get_summary())
+            result_cache.close()
+            result_cache = None
@@ -0,0 +1,37 @@
+import logging
+import time
+from typing import Callable
+
+from config import Config
+
+
+class ToolCrashed(Exception):
+    """ external tool (git, cloc, metrix++) finished with non-zero status code"""
+
+    def __init__(self, tool: str, returncode: int):
+        super().__init__("{0} crashed. Status code {1}".format(tool, returncode))
+        self.tool = tool
+        self.returncode = returncode
+
+
+def call_with_retries(func: Callable, description: str):
+    """
+    Calls func() again when an external tool crashes, as it may be a network hiccup or lack of memory.
+    Waits backoff_seconds, then twice as long before every next attempt
+    :param description: what is being done, for the log
+    :return: result of func
+    :raises ToolCrashed: if the last attempt failed too
+    """
+    attempts = Config.get_retry_attempts()
+    delay = Config.get_retry_backoff_seconds()
+    for attempt in range(1, attempts + 1):
+        try:
+            return func()
+        except ToolCrashed as e:
+            if attempt >= attempts:
+                raise
+            logging.warning("{0}: {1}, attempt {2}/{3}, retrying in {4:.1f} s"
+                            .format(description, e, attempt, attempts, delay))
+            print("WARNING: {0}: {1}, retrying in {2:.1f} s".format(description, e, delay))
+            time.sleep(delay)
+            delay *= 2
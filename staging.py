@@ -0,0 +1,39 @@
+import errno
+import logging
+import os
+import shutil
+from typing import Collection
+
+from info.project_info import ProjectInfo
+
+
+def link_or_copy(source: str, destination: str):
+    """ hard links are enough as long as nobody changes the file in place, copies are used where links are impossible"""
+    try:
+        os.link(source, destination)
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+            raise
+        shutil.copy2(source, destination)
+
+
+def stage_files(project_info: ProjectInfo, paths: Collection[str]):
+    """
+    Creates separate tree <work_dir>/stage/<project_name> with only the given files of the project
+    and makes it project_info.source_dir, so external tools see only these files under the usual relative paths
+    :param paths: paths relative to project_info.work_dir
+    """
+    stage_dir = os.path.join(project_info.work_dir, "stage")
+    if os.path.exists(stage_dir):
+        shutil.rmtree(stage_dir)
+    os.makedirs(os.path.join(stage_dir, project_info.name), exist_ok=True)
+
+    for path in paths:
+        staged_path = os.path.join(stage_dir, path)
+        staged_directory = os.path.dirname(staged_path)
+        if not os.path.exists(staged_directory):
+            os.makedirs(staged_directory, exist_ok=True)
+        link_or_copy(project_info.get_local_path(path), staged_path)
+
+    project_info.source_dir = stage_dir
+    logging.info("Project \"{0}\": {1} files staged for analysis".format(project_info.name, len(paths)))
@@ -0,0 +1,24 @@
+// <copyright file="Sample.cs">
+// </copyright>
+
+using System;
+
+namespace Sample
+{
+    /// <summary>
+    /// Sample class
+    /// </summary>
+    public class Sample
+    {
+        private const string Path = @"C:\temp\"; // verbatim string ending with a backslash
+        private const string Query = @"select * from table where id = ""1""";
+
+        public string Greet(string name)
+        {
+            /* block comment */
+            return "Hello, " + name + "!"; // greeting
+        }
+
+        public char Quote() => '\'';
+    }
+}
@@ -0,0 +1,34 @@
+/*
+ * Licensed under the Apache License, Version 2.0
+ */
+package org.example.sample;
+
+import java.util.List;   // trailing comment
+
+/**
+ * Javadoc of the class.
+ *
+ * @author nobody
+ */
+public class Sample {
+    private static final String URL = "http://example.org/*not a comment*/"; // comment after a string
+    private static final char QUOTE = '"';
+    private static final String ESCAPED = "a \"quoted\" // text";
+
+    	
+    // a comment line
+    public int sum(List<Integer> values) { /* inline block */
+        int total = 0;
+        for (int value : values) {
+            total += value; /* multi-line
+                               block comment after code */
+        }
+        /* block */ return total;
+    }
+
+    /* comment */ /* another comment */
+
+    public String text() {
+        return "/*" + "*/";
+    }
+}
@@ -0,0 +1,6 @@
+class Queries
+{
+    const string Select = @"select *
+// inside the string
+from table";
+}
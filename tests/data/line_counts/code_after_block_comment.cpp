@@ -0,0 +1,4 @@
+class Point {
+    int x; /* horizontal
+    */ int y;
+};
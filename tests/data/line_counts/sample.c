@@ -0,0 +1,24 @@
+#include <stdio.h>
+#include "sample.h"
+
+/* file comment
+   spanning
+
+   several lines */
+
+#define SQUARE(x) ((x) * (x)) /* macro */
+
+static const char *messages[] = {
+    "first // not a comment",
+    "escaped backslash at the end \\",
+};
+
+int main(void)
+{
+    int i; // loop variable
+    for (i = 0; i < 3; i++) {
+        printf("%s\n", messages[i]);
+    }
+    /**/
+    return SQUARE(2) == 4 ? 0 : 1;
+}
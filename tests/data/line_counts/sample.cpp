@@ -0,0 +1,31 @@
+// Copyright header
+// second line of the header
+
+#include <string>
+#include <vector>
+
+namespace sample {
+
+/// Documentation comment of the class
+class Counter {
+public:
+    explicit Counter(int start) : value_(start) {}
+
+    int next() { return ++value_; } // trailing
+
+    std::string name() const {
+        return "counter /* with a comment marker */";
+    }
+
+private:
+    int value_; /* value
+                   of the counter */
+};
+
+}  // namespace sample
+
+/*
+int disabled() {
+    return 0;
+}
+*/
@@ -0,0 +1,10 @@
+#ifndef SAMPLE_H
+#define SAMPLE_H
+
+// declarations of sample.c
+
+extern int counter; /* defined elsewhere */
+
+int helper(int value);  
+
+#endif /* SAMPLE_H */
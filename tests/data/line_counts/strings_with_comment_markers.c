@@ -0,0 +1,8 @@
+static const char *messages[] = {
+    "first",
+    "second /* looks like the start of a comment",
+};
+
+int counter;
+int helper(int value);
+/* the end */
@@ -0,0 +1,60 @@
+using System;
+using System.Collections.Generic;
+using System.Linq;
+
+namespace Bank
+{
+    [Serializable]
+    public class Account : IComparable<Account>, IDisposable
+    {
+        private decimal balance;
+
+        public string Owner { get; set; }
+
+        public decimal Balance
+        {
+            get { return balance; }
+            private set
+            {
+                if (value < 0)
+                {
+                    throw new InvalidOperationException();
+                }
+                balance = value;
+            }
+        }
+
+        public Account(string owner)
+        {
+            Owner = owner ?? "nobody";
+        }
+
+        public static Account operator +(Account account, decimal amount)
+        {
+            account.Balance += amount;
+            return account;
+        }
+
+        public T Convert<T>(Func<Account, T> converter)
+        {
+            return converter != null ? converter(this) : default(T);
+        }
+
+        int IComparable<Account>.CompareTo(Account other)
+        {
+            return balance.CompareTo(other?.balance ?? 0);
+        }
+
+        public IEnumerable<string> History(int limit)
+        {
+            foreach (var entry in Enumerable.Range(0, limit).Where(i => i % 2 == 0))
+            {
+                yield return entry.ToString();
+            }
+        }
+
+        void IDisposable.Dispose()
+        {
+        }
+    }
+}
@@ -0,0 +1,47 @@
+package org.example.events;
+
+import java.util.ArrayList;
+import java.util.Comparator;
+import java.util.List;
+import java.util.function.Predicate;
+
+@SuppressWarnings("unchecked")
+public abstract class Events<T extends Comparable<T>> implements Iterable<T> {
+    private final List<T> items = new ArrayList<>();
+    private final Comparator<T> order = new Comparator<T>() {
+        @Override
+        public int compare(T left, T right) {
+            return left == null ? -1 : left.compareTo(right);
+        }
+    };
+
+    protected abstract boolean accept(T item);
+
+    public <R> List<R> map(java.util.function.Function<T, R> mapper) {
+        List<R> result = new ArrayList<>();
+        items.forEach(item -> {
+            if (accept(item)) {
+                result.add(mapper.apply(item));
+            }
+        });
+        return result;
+    }
+
+    public long count(Predicate<T> filter) {
+        return items.stream().filter(item -> item != null && filter.test(item)).count();
+    }
+
+    static {
+        System.out.println("loaded");
+    }
+
+    @Deprecated
+    @SuppressWarnings({"rawtypes", "unused"})
+    synchronized void clear() throws IllegalStateException {
+        synchronized (items) {
+            while (!items.isEmpty()) {
+                items.remove(0);
+            }
+        }
+    }
+}
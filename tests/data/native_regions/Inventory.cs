@@ -0,0 +1,63 @@
+using System;
+using System.Collections.Generic;
+
+namespace Example.Store
+{
+    /// <summary>
+    /// Items in stock
+    /// </summary>
+    public class Inventory
+    {
+        private readonly Dictionary<string, int> counts = new Dictionary<string, int>();
+
+        public void Add(string item, int count)
+        {
+            if (string.IsNullOrEmpty(item) || count <= 0)
+            {
+                throw new ArgumentException("bad item");
+            }
+            int current;
+            counts.TryGetValue(item, out current);
+            counts[item] = current + count;
+        }
+
+        public int Total()
+        {
+            int total = 0;
+            foreach (var pair in counts)
+            {
+                total += pair.Value;
+            }
+            return total;
+        }
+
+        public string Level(string item)
+        {
+            int count;
+            if (!counts.TryGetValue(item, out count))
+            {
+                return "none";
+            }
+            while (count > 1000)
+            {
+                count /= 10;
+            }
+            return count > 100 ? "high" : "low";
+        }
+    }
+
+    public struct Price
+    {
+        public decimal Amount;
+
+        public bool IsFree()
+        {
+            return Amount == 0;
+        }
+    }
+
+    interface IPriced
+    {
+        Price GetPrice();
+    }
+}
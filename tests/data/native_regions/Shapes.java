@@ -0,0 +1,76 @@
+package org.example.shapes;
+
+import java.util.ArrayList;
+import java.util.List;
+
+/**
+ * Shapes and their areas.
+ */
+public class Shapes {
+    private final List<Shape> shapes = new ArrayList<>();
+
+    public interface Shape {
+        double area();
+    }
+
+    public static class Circle implements Shape {
+        private final double radius;
+
+        public Circle(double radius) {
+            if (radius < 0) {
+                throw new IllegalArgumentException("negative radius");
+            }
+            this.radius = radius;
+        }
+
+        @Override
+        public double area() {
+            return Math.PI * radius * radius;
+        }
+    }
+
+    public void add(Shape shape) {
+        if (shape != null && !shapes.contains(shape)) {
+            shapes.add(shape);
+        }
+    }
+
+    // total area of the shapes bigger than the limit
+    public double totalArea(double limit) {
+        double total = 0;
+        for (Shape shape : shapes) {
+            double area = shape.area();
+            if (area > limit || limit < 0) {
+                total += area;
+            }
+        }
+        return total;
+    }
+
+    public String describe(int kind) {
+        switch (kind) {
+            case 0:
+                return "none";
+            case 1:
+                return "one";
+            default:
+                return kind > 10 ? "many" : "some";
+        }
+    }
+
+    public int parse(String text) {
+        try {
+            return Integer.parseInt(text);
+        } catch (NumberFormatException e) {
+            return -1;
+        }
+    }
+
+    enum Color {
+        RED, GREEN;
+
+        boolean isWarm() {
+            return this == RED;
+        }
+    }
+}
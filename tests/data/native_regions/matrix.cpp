@@ -0,0 +1,71 @@
+#include <cstddef>
+#include <vector>
+
+namespace math {
+
+/* Dense matrix of doubles */
+class Matrix {
+public:
+    Matrix(std::size_t rows, std::size_t columns)
+        : rows_(rows), columns_(columns), values_(rows * columns) {}
+
+    double& at(std::size_t row, std::size_t column) {
+        return values_[row * columns_ + column];
+    }
+
+    bool isSquare() const { return rows_ == columns_; }
+
+    Matrix operator*(const Matrix& other) const;
+
+private:
+    std::size_t rows_;
+    std::size_t columns_;
+    std::vector<double> values_;
+};
+
+Matrix Matrix::operator*(const Matrix& other) const {
+    Matrix result(rows_, other.columns_);
+    for (std::size_t i = 0; i < rows_; ++i) {
+        for (std::size_t j = 0; j < other.columns_; ++j) {
+            double sum = 0;
+            for (std::size_t k = 0; k < columns_; ++k) {
+                sum += values_[i * columns_ + k] * other.values_[k * other.columns_ + j];
+            }
+            result.at(i, j) = sum;
+        }
+    }
+    return result;
+}
+
+struct Range {
+    int begin;
+    int end;
+
+    bool contains(int value) const {
+        return value >= begin && value < end;
+    }
+};
+
+}  // namespace math
+
+// sign of the value: -1, 0 or 1
+int sign(int value) {
+    if (value > 0) {
+        return 1;
+    } else if (value < 0) {
+        return -1;
+    }
+    return 0;
+}
+
+int classify(char c) {
+    switch (c) {
+    case 'a':
+    case 'e':
+        return 1;
+    case ' ':
+        return 0;
+    default:
+        return c == '\n' || c == '\t' ? 0 : 2;
+    }
+}
@@ -0,0 +1,28 @@
+#include <stdio.h>
+
+struct config {
+    int verbose;
+};
+
+#ifdef _WIN32
+static int is_separator(char c) {
+    return c == '\\' || c == '/';
+#else
+static int is_separator(char c) {
+    return c == '/';
+#endif
+}
+
+/* prints the last part of the path */
+void print_base_name(const char *path, const struct config *config) {
+    const char *base = path;
+    for (; *path; path++) {
+        if (is_separator(*path) && path[1] != '\0') {
+            base = path + 1;
+        }
+    }
+    if (config && config->verbose) {
+        printf("base name: ");
+    }
+    puts(base);
+}
@@ -0,0 +1,71 @@
+#ifndef TREE_HPP
+#define TREE_HPP
+
+#include <memory>
+#include <ostream>
+
+namespace util {
+namespace detail {
+
+template <typename T>
+struct Node {
+    T value;
+    std::unique_ptr<Node> left, right;
+
+    explicit Node(T v) : value(v) {}
+    ~Node() = default;
+};
+
+}  // namespace detail
+
+template <typename T>
+class Tree {
+public:
+    Tree() {}
+
+    ~Tree() {
+        clear();
+    }
+
+    void insert(T value) {
+        auto* slot = &root_;
+        while (*slot) {
+            slot = value < (*slot)->value ? &(*slot)->left : &(*slot)->right;
+        }
+        slot->reset(new detail::Node<T>(value));
+    }
+
+    template <typename F>
+    void visit(F&& f) const {
+        auto walk = [&](const detail::Node<T>* node, auto& self) -> void {
+            if (!node) return;
+            self(node->left.get(), self);
+            f(node->value);
+            self(node->right.get(), self);
+        };
+        walk(root_.get(), walk);
+    }
+
+    void clear() { root_.reset(); }
+
+    friend std::ostream& operator<<(std::ostream& out, const Tree& tree) {
+        tree.visit([&out](const T& v) { out << v << ' '; });
+        return out;
+    }
+
+private:
+    std::unique_ptr<detail::Node<T>> root_;
+};
+
+#ifdef TREE_DEBUG
+inline void dump() {
+}
+#endif
+
+inline int depth(int n) {
+    return n <= 1 ? 1 : 1 + depth(n / 2);
+}
+
+}  // namespace util
+
+#endif
@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+import main
+from config import Config
+from database.bulk_writer import BulkWriter
+from database.connection_pool import ConnectionPool
+from info.project_info import ProjectInfo
+
+
+class FailingLoadConnection:
+    """ connection of the background loader, every COPY fails"""
+
+    def cursor(self):
+        return self
+
+    def copy_expert(self, sql, buffer):
+        raise IOError("connection lost")
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class ExtractionFailed(Exception):
+    pass
+
+
+class FakeStorage:
+    def __init__(self, bulk_writer: BulkWriter):
+        self.bulk_writer = bulk_writer
+
+    def create_bulk_writer(self, batch_size, background, run_stats=None):
+        return self.bulk_writer
+
+
+def create_failed_writer() -> BulkWriter:
+    """ writer whose background loader has failed already"""
+    bulk_writer = BulkWriter(None, 10, ConnectionPool(FailingLoadConnection, 1))
+    bulk_writer.add_row("files", (1,))
+    bulk_writer.flush()
+    waited = 0.0
+    while bulk_writer.load_error is None and waited < 5:
+        time.sleep(0.01)
+        waited += 0.01
+    return bulk_writer
+
+
+def test_close_raises_load_error():
+    bulk_writer = create_failed_writer()
+    with pytest.raises(RuntimeError, match="background load failed"):
+        bulk_writer.close()
+
+
+def test_load_error_does_not_hide_analysis_error(monkeypatch):
+    def fail_filter(project_info):
+        raise ExtractionFailed("extraction failed")
+
+    monkeypatch.setattr(Config, "use_bulk_load", classmethod(lambda cls: True))
+    monkeypatch.setattr(Config, "get_file_timeout_seconds", classmethod(lambda cls, section="limits": 0))
+    monkeypatch.setattr(Config, "get_file_memory_mb", classmethod(lambda cls, section="limits": 0))
+    monkeypatch.setattr(main, "get_result_cache", lambda: None)
+    monkeypatch.setattr(main, "get_process_slots", lambda: None)
+    monkeypatch.setattr(main, "filter_project_files", fail_filter)
+
+    bulk_writer = create_failed_writer()
+    with pytest.raises(ExtractionFailed):
+        main.analyze_files(FakeStorage(bulk_writer), ProjectInfo("https://example.org/project.git", "project"), {})
+    assert isinstance(bulk_writer.load_error, IOError)
@@ -0,0 +1,85 @@
+import pytest
+
+from info.region_type import RegionType
+from language_handlers import metrixpp_handler, native_handler
+from language_handlers.metrixpp_parser import ViewParser
+from result_cache import unflatten_regions
+from worker_pool import WorkerPool
+
+# deeper than pickle can follow outer_region links with the default recursion limit
+depth = 2000
+
+
+def region_xml(tag: str, name: str, region_type: str, subregions: str) -> str:
+    return '<{0}><info line_begin="1" line_end="10" name="{1}" type="{2}" />' \
+           '<data><std.code.lines code="1" comments="0" preprocessor="0" total="1" /></data>' \
+           '<subregions>{3}</subregions></{0}>'.format(tag, name, region_type, subregions)
+
+
+def deep_view_xml() -> str:
+    subregions = ""
+    for level in range(depth, 0, -1):
+        subregions = region_xml("subregion", "n{0}".format(level), "namespace", subregions)
+    return '<view><data><info path="./project/deep.cpp" id="1" /><file-data><regions>{0}</regions>' \
+           '</file-data></data></view>'.format(region_xml("region", "__global__", "global", subregions))
+
+
+def check_chain(regions):
+    assert len(regions) == depth + 1
+    global_region = regions[-1]
+    assert global_region.region_type == RegionType.Global
+    assert global_region.total_code_lines == depth + 1
+    innermost = regions[0]
+    assert innermost.short_name == "n{0}".format(depth)
+    levels = 0
+    region_info = innermost
+    while region_info.outer_region is not None:
+        region_info = region_info.outer_region
+        levels += 1
+    assert levels == depth
+    assert region_info is global_region
+
+
+def test_parser_builds_deep_regions():
+    check_chain(ViewParser().parse(deep_view_xml())[0])
+
+
+@pytest.fixture
+def deep_metrixpp_view(monkeypatch):
+    # the worker processes are forked, they see the patched view
+    metrixpp_xml = deep_view_xml()
+    monkeypatch.setattr(metrixpp_handler, "get_metrixpp_xml_for_files", lambda work_dir, db_path, paths: metrixpp_xml)
+
+
+def test_deep_regions_come_back_from_worker_processes(deep_metrixpp_view):
+    worker_pool = WorkerPool(2, isolated=True)
+    try:
+        job = ("work", "metrixpp.db", "xml", ["project/deep.cpp"])
+        result = next(worker_pool.imap(metrixpp_handler.extract_regions_for_batch, [job], timeout=60))
+    finally:
+        worker_pool.close()
+
+    regions_list, measurements, file_seconds = result
+    assert len(regions_list) == 1
+    check_chain(unflatten_regions(regions_list[0]))
+
+
+def test_deep_native_regions_come_back_from_worker_processes(tmp_path):
+    source_path = tmp_path / "Deep.java"
+    source_path.write_text("".join("class C{0} {{\n".format(level) for level in range(1, depth + 1)) + "}\n" * depth)
+    worker_pool = WorkerPool(2, isolated=True)
+    try:
+        job = [(str(source_path), "Java")]
+        result = next(worker_pool.imap(native_handler.extract_regions_for_batch, [job], timeout=60))
+    finally:
+        worker_pool.close()
+
+    regions_list, measurements, file_seconds = result
+    regions = unflatten_regions(regions_list[0])
+    assert len(regions) == depth + 1
+    levels = 0
+    region_info = regions[0]
+    while region_info.outer_region is not None:
+        region_info = region_info.outer_region
+        levels += 1
+    assert levels == depth
@@ -0,0 +1,49 @@
+import pytest
+
+import main
+from config import Config
+from incremental import get_blob_shas
+from info.project_info import ProjectInfo
+from retry import ToolCrashed
+from tool_runner import close_tool_runner
+
+
+class FakeCheckpoint:
+    def __init__(self):
+        self.finished = []
+
+    def finish_project(self, url: str):
+        self.finished.append(url)
+
+
+@pytest.fixture
+def broken_checkout(tmp_path, monkeypatch):
+    """ project whose checkout is not a git repository, so git ls-files fails"""
+    monkeypatch.setattr(Config, "get_retry_attempts", classmethod(lambda cls, section="retry": 2))
+    monkeypatch.setattr(Config, "get_retry_backoff_seconds", classmethod(lambda cls, section="retry": 0))
+    (tmp_path / "project").mkdir()
+    project_info = ProjectInfo("https://example.org/project.git", "project")
+    project_info.work_dir = str(tmp_path)
+    yield project_info
+    close_tool_runner()
+
+
+def test_failed_ls_files_is_raised(broken_checkout):
+    with pytest.raises(ToolCrashed, match="git ls-files"):
+        get_blob_shas(broken_checkout)
+
+
+def test_failed_ls_files_does_not_finish_project(broken_checkout, monkeypatch):
+    storage_opened = []
+
+    def open_storage():
+        storage_opened.append(True)
+        raise IOError("no database in tests")
+
+    monkeypatch.setattr(main, "get_tool_versions", lambda: "test")
+    monkeypatch.setattr(main, "open_storage", open_storage)
+    checkpoint = FakeCheckpoint()
+    main.analyze_project(broken_checkout, checkpoint)
+    # a project without the list of its files is not stored, it is retried by the next run
+    assert storage_opened == []
+    assert checkpoint.finished == []
@@ -0,0 +1,29 @@
+import json
+import os
+
+import pytest
+
+from line_counter import count_lines_of_file, get_language
+
+samples_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "line_counts")
+
+with open(os.path.join(samples_dir, "expected.json"), "rt", encoding="utf-8") as expected_file:
+    expected_counts = json.load(expected_file)["files"]
+
+
+@pytest.mark.parametrize("file_name", sorted(expected_counts))
+def test_counts_match_cloc(file_name):
+    """ counts recorded from cloc, files with a known difference are checked against the builtin counts"""
+    expected = expected_counts[file_name]
+    path = os.path.join(samples_dir, file_name)
+    language = get_language(path)
+    assert language == expected["language"]
+
+    counts = expected.get("builtin", expected)
+    metrics = count_lines_of_file((path, language))
+    assert (metrics.blank, metrics.comment, metrics.code) == (counts["blank"], counts["comment"], counts["code"])
+
+
+def test_every_sample_has_expected_counts():
+    samples = [file_name for file_name in os.listdir(samples_dir) if get_language(file_name) is not None]
+    assert sorted(samples) == sorted(expected_counts)
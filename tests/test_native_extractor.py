@@ -0,0 +1,44 @@
+import json
+import os
+
+import pytest
+
+from language_handlers.native_extractor import extract_regions_from_file
+from line_counter import get_language
+
+samples_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "native_regions")
+
+with open(os.path.join(samples_dir, "expected.json"), "rt", encoding="utf-8") as expected_file:
+    expected_regions = json.load(expected_file)["files"]
+
+
+def get_region_path(region_info) -> str:
+    names = []
+    while region_info is not None:
+        names.append("{0} {1}".format(region_info.region_type.name, region_info.short_name))
+        region_info = region_info.outer_region
+    return " / ".join(reversed(names))
+
+
+@pytest.mark.parametrize("file_name", sorted(expected_regions))
+def test_regions_match_metrixpp(file_name):
+    """ region trees recorded from metrix++, files with a known difference are checked against the builtin ones"""
+    expected = expected_regions[file_name]
+    path = os.path.join(samples_dir, file_name)
+    language = get_language(path)
+    assert language == expected["language"]
+
+    expected_list = expected.get("builtin", expected["regions"])
+    with_lines = "lines" in expected_list[0]  # not recorded for files changed by preprocessing
+    actual = []
+    for region_info in reversed(extract_regions_from_file(path, language)):
+        region = {"region": get_region_path(region_info), "ccn": getattr(region_info, "cyclomatic_complexity", None)}
+        if with_lines:
+            region["lines"] = [region_info.total_lines, region_info.own_code_lines, region_info.own_comment_lines]
+        actual.append(region)
+    assert actual == expected_list
+
+
+def test_every_sample_has_expected_regions():
+    samples = [file_name for file_name in os.listdir(samples_dir) if get_language(file_name) is not None]
+    assert sorted(samples) == sorted(expected_regions)
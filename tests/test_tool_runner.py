@@ -0,0 +1,78 @@
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+from tool_runner import ProcessSlots, ToolRunner, get_tool_runner, set_process_slots
+from worker_pool import WorkerPool
+
+sleep_args = [sys.executable, "-c", "import time; time.sleep(0.3)"]
+
+
+def run_tool(item):
+    """ :return: when the tool started and finished, seen from a worker process"""
+    started_at = time.time()
+    get_tool_runner().run_for_output(sleep_args, "sleep")
+    return started_at, time.time()
+
+
+def hold_slot(slots: ProcessSlots, acquired):
+    slots.try_acquire()
+    acquired.set()
+    time.sleep(60)
+
+
+def test_worker_processes_share_the_slots():
+    slots = ProcessSlots(1)
+    worker_pool = WorkerPool(2, setup=set_process_slots, setup_args=(slots,))
+    try:
+        intervals = list(worker_pool.imap(run_tool, range(2)))
+    finally:
+        worker_pool.close()
+        slots.remove()
+    # the tools were started at once, the second one waited for the slot of the first one
+    assert max(finished_at for _, finished_at in intervals) - min(started_at for started_at, _ in intervals) >= 0.6
+
+
+def test_slots_of_killed_process_are_freed():
+    slots = ProcessSlots(1)
+    acquired = multiprocessing.Event()
+    holder = multiprocessing.Process(target=hold_slot, args=(slots, acquired))
+    holder.start()
+    try:
+        assert acquired.wait(10)
+        assert slots.try_acquire() is None
+        holder.terminate()
+        holder.join()
+        slot = slots.try_acquire()
+        assert slot is not None
+        slots.release(slot)
+    finally:
+        holder.join()
+        slots.remove()
+
+
+def test_output_is_not_read_ahead_of_the_consumer(tmp_path):
+    marker_path = str(tmp_path / "written")
+    other_marker_path = str(tmp_path / "other")
+    # 10 MB of output, far more than the pipe and the queue of iterate_output_lines hold
+    script = "import sys\nfor _ in range(100000): sys.stdout.write('x' * 99 + '\\n')\nsys.stdout.flush()\n" \
+             "open({0!r}, 'w').close()\n".format(marker_path)
+    other_args = [sys.executable, "-c", "open({0!r}, 'w').close()".format(other_marker_path)]
+    runner = ToolRunner(1)
+    try:
+        lines = runner.iterate_output_lines([sys.executable, "-c", script], "writer", timeout=0.5)
+        assert next(lines) == "x" * 99 + "\n"
+        other = threading.Thread(target=runner.run_for_output, args=(other_args, "other"))
+        other.start()
+        time.sleep(1)
+        assert not os.path.exists(marker_path)
+        # the waiting tool keeps its slot and its timeout does not run meanwhile
+        assert not os.path.exists(other_marker_path)
+        assert sum(1 for _ in lines) == 99999
+        assert os.path.exists(marker_path)
+        other.join(10)
+        assert os.path.exists(other_marker_path)
+    finally:
+        runner.close()
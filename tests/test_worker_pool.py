@@ -0,0 +1,138 @@
+import os
+import sys
+import time
+
+import pytest
+
+from config import Config
+from info.file_info import FileInfo
+from info.project_info import ProjectInfo
+from language_handlers.base_handler import BaseHandler
+from worker_pool import TaskFailed, WorkerPool, resource
+
+
+def make_result(item):
+    """ a nested list too deep to be pickled for odd items"""
+    if item % 2 == 0:
+        return item
+    result = []
+    for _ in range(sys.getrecursionlimit() * 10):
+        result = [result]
+    return result
+
+
+def make_lambda(item):
+    return item if item != 1 else (lambda: item)
+
+
+def sleep_on_one(item):
+    if item == 1:
+        time.sleep(60)
+    return item
+
+
+def crash_on_one(item):
+    if item == 1:
+        os._exit(1)
+    return item
+
+
+def allocate_on_one(item):
+    if item == 1:
+        return len(bytearray(2 * 1024 ** 3))
+    return item
+
+
+def extract_batch(paths):
+    """ batch function of FakeHandler, the worker process dies on a file named crash"""
+    if "crash" in paths:
+        os._exit(1)
+    return [None] * len(paths), {}, [0.0] * len(paths)
+
+
+class FakeHandler(BaseHandler):
+    """ records the stored files instead of sending them to the database"""
+
+    def __init__(self, project_info: ProjectInfo, worker_pool: WorkerPool):
+        super().__init__(project_info, None, worker_pool=worker_pool)
+        self.stored_paths = []
+
+    def get_batch_job(self, batch):
+        return [file_info.path for file_info in batch]
+
+    def store_regions(self, file_info, regions, cached=False):
+        self.stored_paths.append(file_info.path)
+
+    def handle_one_file(self, file_info):
+        pass
+
+    def handle_files(self, files):
+        pass
+
+
+def test_results_which_cannot_be_pickled_become_task_failed():
+    worker_pool = WorkerPool(2, isolated=True)
+    try:
+        results = list(worker_pool.imap(make_result, range(6)))
+        lambda_results = list(worker_pool.imap(make_lambda, range(3)))
+    finally:
+        worker_pool.close()
+
+    assert [results[i] for i in (0, 2, 4)] == [0, 2, 4]
+    for failed in (results[1], results[3], results[5], lambda_results[1]):
+        assert isinstance(failed, TaskFailed)
+        assert failed.reason.startswith("task failed: ")
+    assert [lambda_results[0], lambda_results[2]] == [0, 2]
+
+
+def test_pool_is_restarted_after_timeout():
+    worker_pool = WorkerPool(2, isolated=True)
+    try:
+        results = list(worker_pool.imap(sleep_on_one, range(5), timeout=1))
+    finally:
+        worker_pool.close()
+
+    assert isinstance(results[1], TaskFailed)
+    assert results[1].reason == "timed out after 1 s"
+    assert [results[i] for i in (0, 2, 3, 4)] == [0, 2, 3, 4]
+
+
+def test_crashing_item_is_found_among_running_ones():
+    worker_pool = WorkerPool(2, isolated=True)
+    try:
+        results = list(worker_pool.imap(crash_on_one, range(5)))
+    finally:
+        worker_pool.close()
+
+    assert isinstance(results[1], TaskFailed)
+    assert results[1].reason == "worker process crashed"
+    assert [results[i] for i in (0, 2, 3, 4)] == [0, 2, 3, 4]
+
+
+@pytest.mark.skipif(resource is None, reason="memory of the workers is not limited on windows")
+def test_item_over_memory_limit_fails_alone():
+    worker_pool = WorkerPool(2, memory_limit_bytes=1024 ** 3, isolated=True)
+    try:
+        results = list(worker_pool.imap(allocate_on_one, range(5)))
+    finally:
+        worker_pool.close()
+
+    assert isinstance(results[1], TaskFailed)
+    assert results[1].reason in ("out of memory", "worker process crashed")
+    assert [results[i] for i in (0, 2, 3, 4)] == [0, 2, 3, 4]
+
+
+def test_handle_batches_quarantines_only_crashing_file(monkeypatch):
+    monkeypatch.setattr(Config, "get_file_timeout_seconds", classmethod(lambda cls, section="limits": 30))
+    project_info = ProjectInfo("https://example.org/project.git", "project")
+    batches = [[FileInfo(path, "C") for path in ("a.c", "crash", "b.c")], [FileInfo("c.c", "C")]]
+    worker_pool = WorkerPool(2, isolated=True)
+    try:
+        handler = FakeHandler(project_info, worker_pool)
+        handler.handle_batches(extract_batch, batches, "extract")
+    finally:
+        worker_pool.close()
+
+    assert list(project_info.quarantined_files) == ["crash"]
+    assert project_info.quarantined_files["crash"] == ("extract", "worker process crashed")
+    assert sorted(handler.stored_paths) == ["a.c", "b.c", "c.c"]
@@ -0,0 +1,470 @@
+import asyncio
+import codecs
+import logging
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from config import Config
+from instrumentation import add_tool_cpu_time
+from retry import ToolCrashed
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # windows
+    import msvcrt
+
+# bytes read from the stdout pipe at once
+read_size = 64 * 1024
+# chunks of output read ahead of the consumer of iterate_output_lines, reading the pipe waits for it meanwhile
+output_queue_size = 16
+# seconds between attempts to take a slot of the run when all of them are taken
+slot_poll_interval = 0.05
+
+end_of_output = object()
+
+
+class ToolTimedOut(ToolCrashed):
+    """ external tool was killed after running longer than its timeout, retried like a crash"""
+
+    def __init__(self, tool: str, timeout: float):
+        Exception.__init__(self, "{0} timed out after {1:g} s".format(tool, timeout))
+        self.tool = tool
+        self.returncode = None
+        self.timeout = timeout
+
+
+class ToolCancelled(Exception):
+    """ external tool was stopped because the run is shutting down, never retried"""
+
+    def __init__(self, tool: str):
+        super().__init__("{0} cancelled on shutdown".format(tool))
+        self.tool = tool
+
+
+def normalize_newlines(text: str) -> str:
+    """ the same output as subprocess gives in text mode"""
+    return text.replace("\r\n", "\n")
+
+
+def set_future_result(future: asyncio.Future, result):
+    if not future.done():  # cancelled with its run
+        future.set_result(result)
+
+
+def get_returncode(wait_status: int) -> int:
+    """ status code like subprocess gives it: negative signal number for a killed tool"""
+    if os.WIFSIGNALED(wait_status):
+        return -os.WTERMSIG(wait_status)
+    return os.WEXITSTATUS(wait_status)
+
+
+class ProcessSlots:
+    """
+    max_processes slots of the whole run, shared by the main process and the worker processes.
+    A slot is a lock on one of the files in a temporary directory, so the slots of a worker process killed
+    while its tools were running are freed by the OS. Pickled as the directory, see set_process_slots()
+    """
+
+    def __init__(self, count: int):
+        self.directory = tempfile.mkdtemp(prefix="tool_slots_")
+        self.count = count
+        self.owner_pid = os.getpid()
+        for slot in range(count):
+            with open(self.get_path(slot), "wb") as slot_file:
+                slot_file.write(b"\0")  # windows locks bytes of the file
+
+    def get_path(self, slot: int) -> str:
+        return os.path.join(self.directory, str(slot))
+
+    def try_acquire(self) -> Optional[int]:
+        """ :return: descriptor of the locked slot file to pass to release(), None when all slots are taken"""
+        for slot in range(self.count):
+            fd = os.open(self.get_path(slot), os.O_RDWR)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                return fd
+            except OSError:
+                os.close(fd)
+        return None
+
+    @staticmethod
+    def release(fd: int):
+        try:
+            # unlocked explicitly: a worker forked meanwhile shares the descriptor
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+
+    def remove(self):
+        """ removes the slot files, in the process which created them"""
+        if self.owner_pid == os.getpid():
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class ToolProcess:
+    """
+    Running tool. stdout is read on the loop, the process is reaped by a runner thread with os.wait4,
+    which gives CPU time of the tool itself (with its finished children), not of the other tools running meanwhile
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, threads: ThreadPoolExecutor, args: List[str],
+                 cwd: Optional[str], capture_output: bool):
+        self.loop = loop
+        self.threads = threads
+        self.popen = subprocess.Popen(args, cwd=cwd, stdout=subprocess.PIPE if capture_output else None)
+        self.returncode: int = None
+        self.cpu_seconds = 0.0
+        self.stdout_reader: asyncio.StreamReader = None
+        self.stdout_transport: asyncio.BaseTransport = None
+        # one wait for the whole life of the process, a cancelled run still gets the process reaped
+        self.exit_future = loop.run_in_executor(threads, self.wait_for_exit)
+
+    def wait_for_exit(self) -> int:
+        if not hasattr(os, "wait4"):
+            # windows, CPU time of the tool is not known
+            return self.popen.wait()
+        _, wait_status, usage = os.wait4(self.popen.pid, 0)
+        self.cpu_seconds = usage.ru_utime + usage.ru_stime
+        # subprocess must not wait for the reaped process again
+        self.popen.returncode = get_returncode(wait_status)
+        return self.popen.returncode
+
+    async def read(self) -> bytes:
+        """ :return: next chunk of stdout, b"" at its end"""
+        if sys.platform == "win32":
+            return await self.loop.run_in_executor(self.threads, os.read, self.popen.stdout.fileno(), read_size)
+        if self.stdout_reader is None:
+            self.stdout_reader = asyncio.StreamReader()
+            self.stdout_transport, _ = await self.loop.connect_read_pipe(
+                lambda: asyncio.StreamReaderProtocol(self.stdout_reader), self.popen.stdout)
+        return await self.stdout_reader.read(read_size)
+
+    async def wait(self) -> int:
+        self.returncode = await asyncio.shield(self.exit_future)
+        return self.returncode
+
+    def kill(self):
+        if self.exit_future.done():
+            return
+        try:
+            if sys.platform == "win32":
+                self.popen.kill()
+            else:
+                # not Popen.kill(): it may reap the process under the wait4 of the runner thread
+                os.kill(self.popen.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def close(self):
+        if self.stdout_transport is not None:
+            self.stdout_transport.close()
+        elif self.popen.stdout is not None:
+            self.popen.stdout.close()
+
+
+class RunSlot:
+    """ slot of one tool: one of max_processes of the runner and one of the run, when the runner has process_slots"""
+
+    def __init__(self, runner: "ToolRunner", tool: str):
+        self.runner = runner
+        self.tool = tool
+        self.taken = False
+        self.process_slot: Optional[int] = None
+
+    async def take(self):
+        await self.runner.slots.acquire()
+        self.taken = True
+        self.process_slot = await self.runner.acquire_process_slot(self.tool)
+
+    def free(self):
+        if self.process_slot is not None:
+            self.runner.process_slots.release(self.process_slot)
+            self.process_slot = None
+        if self.taken:
+            self.runner.slots.release()
+            self.taken = False
+
+
+class ToolRunner:
+    """
+    Runs external tools (git, cloc, metrix++) as subprocesses driven by an asyncio event loop of its own thread.
+    Any thread (pipeline stages, the cloc producer, handlers) starts a tool with a blocking call, while the tools
+    of all threads run concurrently; at most max_processes of them at once, the others wait for a free slot.
+    With process_slots the limit holds for the tools of the worker processes too.
+    stdout is read in chunks as it is printed, a tool running longer than its timeout is killed.
+    CPU time of every tool is added to the thread which waited for it (see instrumentation.add_tool_cpu_time).
+    close() kills the running tools, the waiting ones are not started
+    """
+
+    def __init__(self, max_processes: int, process_slots: ProcessSlots = None):
+        """ :param process_slots: slots shared with other processes, None to limit the tools of this process only"""
+        self.max_processes = max_processes
+        self.process_slots = process_slots
+        self.loop = asyncio.new_event_loop()
+        # reaping the tools and reading their output on windows
+        self.threads = ThreadPoolExecutor(max_workers=2 * max(1, max_processes), thread_name_prefix="tool-wait")
+        # the fields below are used in the loop thread only
+        self.slots: asyncio.Semaphore = None
+        self.processes = set()
+        self.active_runs = 0
+
+        self.lock = threading.Lock()
+        self.closed = False
+        self.thread = threading.Thread(target=self.loop.run_forever, name="tool-runner", daemon=True)
+        self.thread.start()
+
+    async def run_process(self, args: List[str], tool: str, cwd: Optional[str], timeout: float,
+                          on_chunk: Optional[Callable[[bytes], bool]]) -> Tuple[int, float]:
+        """
+        :param timeout: seconds, 0 for no limit. Time spent waiting for the consumer of the output is not counted
+        :param on_chunk: gets pieces of stdout, the tool is killed when it returns False. It may return a future
+        of the result instead, while the consumer is behind: the pipe is not read until it is done, so the tool
+        blocks on writing to it and keeps its slot. None leaves stdout of the tool attached to the console
+        :return: status code and CPU seconds of the tool
+        """
+        self.active_runs += 1
+        slot = RunSlot(self, tool)
+        try:
+            if self.slots is None:
+                self.slots = asyncio.Semaphore(self.max_processes)
+            await slot.take()
+            if self.closed:
+                raise ToolCancelled(tool)
+            process = ToolProcess(self.loop, self.threads, args, cwd, on_chunk is not None)
+            self.processes.add(process)
+            try:
+                returncode = await self.communicate(process, on_chunk, timeout)
+            except asyncio.TimeoutError:
+                raise ToolTimedOut(tool, timeout)
+            finally:
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+                process.close()
+                self.processes.discard(process)
+            if self.closed:
+                raise ToolCancelled(tool)
+            return returncode, process.cpu_seconds
+        finally:
+            slot.free()
+            self.active_runs -= 1
+
+    async def acquire_process_slot(self, tool: str) -> Optional[int]:
+        """ :return: slot of the run taken for the tool, None without process_slots"""
+        if self.process_slots is None:
+            return None
+        while True:
+            slot = self.process_slots.try_acquire()
+            if slot is not None:
+                return slot
+            if self.closed:
+                raise ToolCancelled(tool)
+            await asyncio.sleep(slot_poll_interval)
+
+    async def communicate(self, process: ToolProcess, on_chunk: Optional[Callable[[bytes], bool]],
+                          timeout: float) -> int:
+        """ :raises asyncio.TimeoutError: when the tool runs longer than timeout"""
+        deadline = self.loop.time() + timeout if timeout else None
+        if on_chunk is not None:
+            while True:
+                chunk = await asyncio.wait_for(process.read(), self.get_time_left(deadline))
+                if len(chunk) == 0:
+                    break
+                accepted = on_chunk(chunk)
+                if asyncio.isfuture(accepted):
+                    # the tool waits for the consumer, which is not the tool running longer
+                    waiting_since = self.loop.time()
+                    accepted = await accepted
+                    if deadline is not None:
+                        deadline += self.loop.time() - waiting_since
+                if accepted is False:
+                    process.kill()
+                    break
+        return await asyncio.wait_for(process.wait(), self.get_time_left(deadline))
+
+    def get_time_left(self, deadline: Optional[float]) -> Optional[float]:
+        return None if deadline is None else max(0.0, deadline - self.loop.time())
+
+    def submit(self, args: List[str], tool: str, cwd: Optional[str], timeout: float,
+               on_chunk: Optional[Callable[[bytes], bool]]):
+        """ :return: concurrent.futures.Future with the status code and CPU seconds of the tool"""
+        logging.info("{0}: {1}".format(tool, " ".join(args)))
+        with self.lock:
+            if self.closed:
+                raise ToolCancelled(tool)
+            return asyncio.run_coroutine_threadsafe(self.run_process(args, tool, cwd, timeout, on_chunk), self.loop)
+
+    def call(self, args: List[str], tool: str, cwd: str = None, timeout: float = 0) -> int:
+        """ runs the tool with its output going to the console, like subprocess.call
+        :return: status code of the tool"""
+        returncode, cpu_seconds = self.submit(args, tool, cwd, timeout, None).result()
+        add_tool_cpu_time(cpu_seconds)
+        return returncode
+
+    def run_for_output(self, args: List[str], tool: str, cwd: str = None, timeout: float = 0) -> str:
+        """
+        :return: stdout of the tool
+        :raises ToolCrashed: if the tool finished with non-zero status code or timed out
+        """
+        chunks = []
+        returncode, cpu_seconds = self.submit(args, tool, cwd, timeout, chunks.append).result()
+        add_tool_cpu_time(cpu_seconds)
+        if returncode != 0:
+            raise ToolCrashed(tool, returncode)
+        return normalize_newlines(b"".join(chunks).decode("utf-8", errors="replace"))
+
+    def iterate_output_lines(self, args: List[str], tool: str, cwd: str = None, timeout: float = 0) -> Iterator[str]:
+        """
+        Yields lines of stdout (with "\\n") while the tool is still running.
+        At most output_queue_size chunks are read ahead of the consumer, then the tool waits for it holding its slot,
+        the wait does not count for its timeout. The tool is killed when the consumer stops iterating early
+        :raises ToolCrashed: after the last line, if the tool finished with non-zero status code or timed out
+        """
+        chunks = queue.Queue(output_queue_size)
+        # items which did not fit into the queue: (chunk, future the run waits on) and the end of output marker
+        overflow = deque()
+        overflow_lock = threading.Lock()
+        consumer_left = threading.Event()
+
+        def put(item, space: Optional[asyncio.Future]) -> bool:
+            """ :return: False if the item waits in overflow until the consumer takes a chunk"""
+            with overflow_lock:
+                try:
+                    chunks.put_nowait(item)
+                    return True
+                except queue.Full:
+                    overflow.append((item, space))
+                    return False
+
+        def on_chunk(chunk: bytes):
+            if consumer_left.is_set():
+                return False
+            space = self.loop.create_future()
+            return True if put(chunk, space) else space
+
+        def take():
+            item = chunks.get()
+            with overflow_lock:
+                # the run may have filled the queue again meanwhile, then the waiting item stays for the next take
+                if len(overflow) > 0 and not chunks.full():
+                    waiting_item, space = overflow.popleft()
+                    chunks.put_nowait(waiting_item)
+                    if space is not None:
+                        self.loop.call_soon_threadsafe(set_future_result, space, True)
+            return item
+
+        future = self.submit(args, tool, cwd, timeout, on_chunk)
+        future.add_done_callback(lambda _: put(end_of_output, None))
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        try:
+            unfinished_line = ""
+            while True:
+                chunk = take()
+                if chunk is end_of_output:
+                    break
+                lines = (unfinished_line + decoder.decode(chunk)).split("\n")
+                unfinished_line = lines.pop()
+                for line in lines:
+                    yield normalize_newlines(line + "\n")
+            unfinished_line += decoder.decode(b"", final=True)
+            if unfinished_line != "":
+                yield unfinished_line
+        finally:
+            with overflow_lock:
+                consumer_left.set()
+                for _, space in overflow:
+                    if space is not None:
+                        # the run goes on to kill the tool
+                        self.loop.call_soon_threadsafe(set_future_result, space, False)
+                overflow.clear()
+            if not future.done():
+                # the consumer left early, the tool is killed without waiting for its next chunk
+                future.cancel()
+        returncode, cpu_seconds = future.result()
+        add_tool_cpu_time(cpu_seconds)
+        if returncode != 0:
+            raise ToolCrashed(tool, returncode)
+
+    async def kill_processes(self):
+        for process in list(self.processes):
+            if process.returncode is None:
+                process.kill()
+        # the runs see the killed tools and the waiting ones give up their slots
+        while self.active_runs > 0:
+            await asyncio.sleep(0.05)
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+        asyncio.run_coroutine_threadsafe(self.kill_processes(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.threads.shutdown()
+
+
+tool_runner: ToolRunner = None
+tool_runner_pid: int = None
+tool_runner_lock = threading.Lock()
+process_slots: ProcessSlots = None
+process_slots_lock = threading.Lock()
+
+
+def get_process_slots() -> ProcessSlots:
+    """ :return: slots of the run, to be handed to the worker processes with set_process_slots()"""
+    global process_slots
+    with process_slots_lock:
+        # forked workers inherit the slots of the run
+        if process_slots is None:
+            process_slots = ProcessSlots(Config.get_max_tool_processes())
+        return process_slots
+
+
+def set_process_slots(slots: ProcessSlots):
+    """ called in a worker process before its tasks (see WorkerPool setup), its tools take the slots of the run"""
+    global process_slots
+    with process_slots_lock:
+        process_slots = slots
+
+
+def get_tool_runner() -> ToolRunner:
+    """ :return: runner of the process, worker processes get their own one, sharing the slots of the run"""
+    global tool_runner, tool_runner_pid
+    with tool_runner_lock:
+        # a forked worker inherits the runner without its loop thread
+        if tool_runner is None or tool_runner_pid != os.getpid():
+            tool_runner = ToolRunner(Config.get_max_tool_processes(), get_process_slots())
+            tool_runner_pid = os.getpid()
+        return tool_runner
+
+
+def close_tool_runner():
+    """ kills tools which are still running, the threads waiting for them get ToolCancelled"""
+    global tool_runner, process_slots
+    with tool_runner_lock:
+        if tool_runner is not None and tool_runner_pid == os.getpid():
+            tool_runner.close()
+        tool_runner = None
+    with process_slots_lock:
+        if process_slots is not None:
+            process_slots.remove()
+            process_slots = None
@@ -0,0 +1,101 @@
+"""
+Conformance check of the built-in line counter against cloc.
+
+Usage: python tools/compare_line_counts.py [--record] [directory with sample sources]
+
+Runs the cloc executable from config.ini and line_counter on the same files
+and prints every file where blank/comment/code counts differ. The directory defaults to the sample corpus
+tests/data/line_counts, whose cloc counts are recorded in expected.json and checked by tests/test_line_counter.py
+without cloc. --record rewrites the cloc counts of expected.json, known differences of the builtin counter are kept.
+"""
+import json
+import os
+import subprocess
+import sys
+from collections import OrderedDict
+
+repository_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repository_dir)
+
+from config import Config
+from line_counter import count_lines_of_file, get_language
+
+samples_dir = os.path.join(repository_dir, "tests", "data", "line_counts")
+
+
+def get_cloc_counts(directory: str) -> dict:
+    completed_process = subprocess.run([Config.get_cloc_path(), '--json', '--by-file', '--skip-uniqueness',
+                                        directory], stdout=subprocess.PIPE, encoding='utf-8')
+    if completed_process.returncode != 0:
+        print("ERROR: cloc crashed. Status code {0}".format(completed_process.returncode))
+        exit(1)
+    return json.loads(completed_process.stdout) if completed_process.stdout.strip() != "" else {}
+
+
+def record_expected_counts(cloc_results: dict):
+    expected_path = os.path.join(samples_dir, "expected.json")
+    known_differences = {}
+    if os.path.exists(expected_path):
+        with open(expected_path, "rt", encoding="utf-8") as expected_file:
+            known_differences = {file_name: expected for file_name, expected
+                                 in json.load(expected_file)["files"].items() if "builtin" in expected}
+
+    files = OrderedDict()
+    for path, result in sorted(cloc_results.items()):
+        if path in ("header", "SUM") or get_language(path) is None:
+            continue
+        file_name = os.path.relpath(path, samples_dir).replace("\\", "/")
+        expected = OrderedDict([("language", result["language"]), ("blank", result["blank"]),
+                                ("comment", result["comment"]), ("code", result["code"])])
+        if file_name in known_differences:
+            expected["builtin"] = known_differences[file_name]["builtin"]
+            expected["difference"] = known_differences[file_name]["difference"]
+        files[file_name] = expected
+
+    with open(expected_path, "wt", encoding="utf-8") as expected_file:
+        json.dump(OrderedDict([("cloc_version", cloc_results["header"]["cloc_version"]), ("files", files)]),
+                  expected_file, indent=2)
+        expected_file.write("\n")
+    print("{0} files recorded in {1}".format(len(files), expected_path))
+
+
+def main():
+    arguments = sys.argv[1:]
+    record = "--record" in arguments
+    arguments = [argument for argument in arguments if argument != "--record"]
+    directory = arguments[0] if len(arguments) > 0 else samples_dir
+    cloc_results = get_cloc_counts(directory)
+    if record:
+        record_expected_counts(cloc_results)
+        return
+
+    cloc_counts = {os.path.normpath(path): result for path, result in cloc_results.items()
+                   if path not in ("header", "SUM")}
+    compared = 0
+    mismatches = 0
+    for root, _, filenames in os.walk(directory):
+        for filename in filenames:
+            path = os.path.normpath(os.path.join(root, filename))
+            language = get_language(path)
+            if language is None:
+                continue
+            compared += 1
+            expected = cloc_counts.get(path)
+            actual = count_lines_of_file((path, language))
+            if expected is None:
+                mismatches += 1
+                print("{0}: not reported by cloc".format(path))
+                continue
+            if expected["language"] != language or (expected["blank"], expected["comment"], expected["code"]) != \
+                    (actual.blank, actual.comment, actual.code):
+                mismatches += 1
+                print("{0}: cloc {1} {2}/{3}/{4}, builtin {5} {6}/{7}/{8}"
+                      .format(path, expected["language"], expected["blank"], expected["comment"], expected["code"],
+                              language, actual.blank, actual.comment, actual.code))
+
+    print("{0} files compared, {1} mismatches".format(compared, mismatches))
+    exit(1 if mismatches > 0 else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Differential check of the builtin region extractor against Metrix++.
+
+Usage: python tools/compare_native_regions.py [directory with sample sources] [--batch-size N]
+                                             [--record] [--metrixpp-version VERSION]
+
+Prepares the sources for Metrix++ the same way the pipeline does (preprocessed copies in a temporary
+directory), runs `metrix++ collect` and `view` from config.ini on them and the builtin extractor
+on the original files, then prints every file where the region trees differ:
+  * structure - types, names and nesting of the regions
+  * ccn - cyclomatic complexity of the functions
+  * lines - total, code and comment lines of the regions. Compared only for files which preprocessing
+    left unchanged, as Metrix++ sees them without the removed #else branches
+The directory defaults to the sample corpus tests/data/native_regions, whose Metrix++ regions are recorded
+in expected.json and checked by tests/test_native_extractor.py without Metrix++. --record rewrites the Metrix++
+regions of expected.json in the directory, known differences of the builtin extractor are kept.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+repository_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repository_dir)
+
+from config import Config
+from info.region_info import RegionInfo
+from language_handlers.metrixpp_handler import get_regions_for_batch
+from language_handlers.native_extractor import extract_regions_from_file
+from line_counter import get_language
+from preprocessing import preprocess_code
+from worker_pool import TaskFailed
+
+samples_dir = os.path.join(repository_dir, "tests", "data", "native_regions")
+
+
+def get_region_path(region_info: RegionInfo) -> str:
+    names = []
+    while region_info is not None:
+        names.append("{0} {1}".format(region_info.region_type.name, region_info.short_name))
+        region_info = region_info.outer_region
+    return " / ".join(reversed(names))
+
+
+def describe_regions(regions: List[RegionInfo]) -> Tuple[list, list, list]:
+    """ :return: structure, ccn and line metrics of the regions, outer regions first"""
+    regions = list(reversed(regions))
+    structure = [get_region_path(region_info) for region_info in regions]
+    ccn = [(path, getattr(region_info, "cyclomatic_complexity", None))
+           for path, region_info in zip(structure, regions)]
+    lines = [(path, region_info.total_lines, region_info.own_code_lines, region_info.own_comment_lines)
+             for path, region_info in zip(structure, regions)]
+    return structure, ccn, lines
+
+
+def get_expected_regions(regions: List[RegionInfo], with_lines: bool) -> list:
+    """ :return: regions in the form of expected.json, outer regions first"""
+    expected_regions = []
+    for path, ccn, lines in zip(*describe_regions(regions)):
+        expected = OrderedDict([("region", path), ("ccn", ccn[1])])
+        if with_lines:
+            expected["lines"] = list(lines[1:])
+        expected_regions.append(expected)
+    return expected_regions
+
+
+def get_first_difference(expected: list, actual: list) -> str:
+    for expected_item, actual_item in zip(expected, actual):
+        if expected_item != actual_item:
+            return "metrix++ {0}, builtin {1}".format(expected_item, actual_item)
+    if len(expected) > len(actual):
+        return "metrix++ {0}, builtin nothing".format(expected[len(actual)])
+    return "metrix++ nothing, builtin {0}".format(actual[len(expected)])
+
+
+def prepare_sources(directory: str, work_dir: str, paths: List[str]) -> List[bool]:
+    """
+    Writes preprocessed copies of the files to <work_dir>/sources
+    :return: for each of the paths, whether preprocessing changed the file
+    """
+    changed = []
+    for path in paths:
+        copy_path = os.path.join(work_dir, "sources", path)
+        os.makedirs(os.path.dirname(copy_path), exist_ok=True)
+        with open(os.path.join(directory, path), "rt", encoding="utf-8", errors="replace") as source_file:
+            new_code, _, _ = preprocess_code(source_file, get_language(path))
+        if new_code is None:
+            shutil.copyfile(os.path.join(directory, path), copy_path)
+        else:
+            with open(copy_path, "wt", encoding="utf-8") as copy_file:
+                copy_file.write(new_code)
+        changed.append(new_code is not None)
+    return changed
+
+
+def get_metrixpp_regions(work_dir: str, paths: List[str], batch_size: int) -> List[Optional[List[RegionInfo]]]:
+    db_path = os.path.join(work_dir, "metrixpp.db")
+    completed_process = subprocess.run([Config.get_python27_path(), Config.get_metrixpp_path(),
+                                        'collect', '--std.code.lines.total', '--std.code.lines.code',
+                                        '--std.code.lines.preprocessor',
+                                        '--std.code.lines.comments', '--std.code.complexity.cyclomatic',
+                                        '--db-file={0}'.format(db_path), '--log-level=ERROR', '--', "sources"],
+                                       stdout=subprocess.PIPE, encoding='utf-8', cwd=work_dir)
+    if completed_process.returncode != 0:
+        print("ERROR: metrix++ collect crashed. Status code {0}".format(completed_process.returncode))
+        exit(1)
+
+    regions_list = []
+    for start in range(0, len(paths), batch_size):
+        batch = [os.path.join("sources", path) for path in paths[start: start + batch_size]]
+        batch_regions, _, _ = get_regions_for_batch((work_dir, db_path, Config.get_metrixpp_reader(), batch))
+        # files over the [limits] budget count as not extracted
+        regions_list.extend(None if isinstance(regions, TaskFailed) else regions for regions in batch_regions)
+    return regions_list
+
+
+def record_expected_regions(directory: str, metrixpp_version: str, paths: List[str],
+                            metrixpp_regions_list: List[Optional[List[RegionInfo]]], changed_by_preprocessing: List[bool]):
+    expected_path = os.path.join(directory, "expected.json")
+    known_differences = {}
+    if os.path.exists(expected_path):
+        with open(expected_path, "rt", encoding="utf-8") as expected_file:
+            known_differences = {file_name: expected for file_name, expected
+                                 in json.load(expected_file)["files"].items() if "builtin" in expected}
+
+    files = OrderedDict()
+    for path, metrixpp_regions, changed in zip(paths, metrixpp_regions_list, changed_by_preprocessing):
+        if metrixpp_regions is None:
+            print("{0}: not extracted by metrix++, not recorded".format(path))
+            continue
+        file_name = path.replace("\\", "/")
+        expected = OrderedDict([("language", get_language(path)),
+                                ("regions", get_expected_regions(metrixpp_regions, not changed))])
+        if file_name in known_differences:
+            expected["builtin"] = known_differences[file_name]["builtin"]
+            expected["difference"] = known_differences[file_name]["difference"]
+        files[file_name] = expected
+
+    with open(expected_path, "wt", encoding="utf-8") as expected_file:
+        json.dump(OrderedDict([("metrixpp_version", metrixpp_version), ("files", files)]), expected_file, indent=2)
+        expected_file.write("\n")
+    print("{0} files recorded in {1}".format(len(files), expected_path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare regions of the builtin extractor with Metrix++")
+    parser.add_argument("directory", nargs="?", default=samples_dir)
+    parser.add_argument("--batch-size", type=int, default=Config.get_metrixpp_view_batch_size())
+    parser.add_argument("--record", action="store_true", help="write the Metrix++ regions to expected.json")
+    parser.add_argument("--metrixpp-version", default=os.path.basename(os.path.dirname(
+        os.path.abspath(Config.get_metrixpp_path()))), help="version of Metrix++ stored in expected.json")
+    args = parser.parse_args()
+
+    paths = []
+    for root, _, filenames in os.walk(args.directory):
+        for filename in filenames:
+            path = os.path.relpath(os.path.join(root, filename), args.directory)
+            if get_language(path) is not None:
+                paths.append(path)
+    paths.sort()
+
+    work_dir = tempfile.mkdtemp(prefix="compare_regions_")
+    try:
+        changed_by_preprocessing = prepare_sources(args.directory, work_dir, paths)
+        metrixpp_regions_list = get_metrixpp_regions(work_dir, paths, args.batch_size)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    if args.record:
+        record_expected_regions(args.directory, args.metrixpp_version, paths, metrixpp_regions_list,
+                                changed_by_preprocessing)
+        return
+
+    mismatches = {"structure": 0, "ccn": 0, "lines": 0}
+    failed = 0
+    for path, metrixpp_regions, changed in zip(paths, metrixpp_regions_list, changed_by_preprocessing):
+        try:
+            builtin_regions = extract_regions_from_file(os.path.join(args.directory, path), get_language(path))
+        except Exception as e:
+            builtin_regions = None
+            print("{0}: builtin extractor failed: {1}".format(path, e))
+        if metrixpp_regions is None or builtin_regions is None:
+            failed += 1
+            if metrixpp_regions is None:
+                print("{0}: not extracted by metrix++".format(path))
+            continue
+
+        expected = describe_regions(metrixpp_regions)
+        actual = describe_regions(builtin_regions)
+        for kind, expected_items, actual_items in zip(("structure", "ccn", "lines"), expected, actual):
+            if kind == "lines" and changed:
+                continue
+            if expected_items != actual_items:
+                mismatches[kind] += 1
+                print("{0}: {1} differs: {2}".format(path, kind, get_first_difference(expected_items, actual_items)))
+                break  # ccn and lines of different trees are not comparable
+
+    print("{0} files compared, {1} not extracted, mismatches: {2} structure, {3} ccn, {4} lines"
+          .format(len(paths), failed, mismatches["structure"], mismatches["ccn"], mismatches["lines"]))
+    exit(1 if failed > 0 or mismatches["structure"] > 0 or mismatches["ccn"] > 0 else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Iterable, Iterator
+
+try:
+    import resource
+except ImportError:
+    resource = None  # windows, memory of the workers is not limited
+
+# memory limit applied to this process, set in worker processes only
+process_memory_limit = 0
+
+no_item = object()
+
+
+class TaskFailed(Exception):
+    """
+    Task went over its time or memory budget, crashed its worker process or failed in it.
+    Returned by WorkerPool.imap in place of the result, tasks can raise it to give up on their own
+    """
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+    @classmethod
+    def from_error(cls, error: BaseException) -> "TaskFailed":
+        """ :param error: MemoryError or RecursionError"""
+        if isinstance(error, MemoryError):
+            return cls("out of memory")
+        return cls("maximum recursion depth exceeded")
+
+
+def limit_memory(memory_limit_bytes: int):
+    global process_memory_limit
+    if resource is None or memory_limit_bytes <= 0 or process_memory_limit == memory_limit_bytes:
+        return
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, memory_limit_bytes))
+    process_memory_limit = memory_limit_bytes
+
+
+def run_task(task: tuple):
+    """ runs func(item) in a worker process, the memory limit is inherited by the tools it starts"""
+    func, item, memory_limit_bytes, setup, setup_args = task
+    limit_memory(memory_limit_bytes)
+    if setup is not None:
+        setup(*setup_args)
+    try:
+        return func(item)
+    except TaskFailed as e:
+        return e
+    except (MemoryError, RecursionError) as e:
+        return TaskFailed.from_error(e)
+
+
+class PendingTask:
+    def __init__(self, item):
+        self.item = item
+        self.future = None
+        self.alone = False  # run with no other task, to find out which task crashes the workers
+
+
+class WorkerPool:
+    """
+    Pool of worker processes for CPU-bound per-file work.
+    With one worker everything runs in the calling process, unless the pool is isolated:
+    then tasks which go over their time budget can be stopped by killing the worker processes
+    """
+
+    def __init__(self, workers: int, memory_limit_bytes: int = 0, isolated: bool = False,
+                 setup: Callable = None, setup_args: tuple = ()):
+        """
+        :param memory_limit_bytes: address space of a worker process, 0 for no limit (always on windows)
+        :param setup: picklable function called with setup_args in the worker process before every task,
+        e.g. to hand state of the calling process to the workers
+        """
+        self.workers = workers
+        self.memory_limit_bytes = memory_limit_bytes
+        self.setup = setup
+        self.setup_args = setup_args
+        self.executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 or isolated else None
+
+    def submit(self, func: Callable, pending_task: PendingTask):
+        pending_task.future = self.executor.submit(run_task, (func, pending_task.item, self.memory_limit_bytes,
+                                                              self.setup, self.setup_args))
+
+    def restart(self):
+        # the executor cannot stop a running task, so its processes are killed and a new executor is started
+        for process in list(self.executor._processes.values()):
+            process.terminate()
+        self.executor.shutdown(wait=False)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def imap(self, func: Callable, items: Iterable, timeout: float = 0) -> Iterator:
+        """
+        Applies func to every item in worker processes
+        :param func: picklable (module level) function of one argument
+        :param items: arguments
+        :param timeout: seconds a worker process may spend on one item, 0 for no limit. Ignored without processes
+        :return: results in the order of items. Only a few tasks per worker are submitted ahead,
+        so results do not pile up when the consumer is slower than the workers.
+        Items which went over the time or memory limit, crashed the worker process or failed in it get TaskFailed
+        in place of the result
+        """
+        if self.executor is None:
+            for item in items:
+                yield run_task((func, item, 0, None, ()))
+            return
+
+        items = iter(items)
+        pending = deque()
+        while True:
+            if not any(pending_task.alone for pending_task in pending):
+                while len(pending) < 2 * self.workers:
+                    item = next(items, no_item)
+                    if item is no_item:
+                        break
+                    pending_task = PendingTask(item)
+                    self.submit(func, pending_task)
+                    pending.append(pending_task)
+            if len(pending) == 0:
+                return
+
+            pending_task = pending[0]
+            if pending_task.future is None:
+                self.submit(func, pending_task)
+            restarted = False
+            try:
+                result = pending_task.future.result(timeout=timeout or None)
+            except TimeoutError:
+                self.restart()
+                restarted = True
+                result = TaskFailed("timed out after {0:g} s".format(timeout))
+            except BrokenProcessPool:
+                self.restart()
+                if not pending_task.alone:
+                    # any of the running tasks could crash the workers, they are run one by one to find it
+                    for suspect in pending:
+                        suspect.alone = True
+                        suspect.future = None
+                    continue
+                result = TaskFailed("worker process crashed")
+                restarted = True
+            except Exception as e:
+                # the task raised or its result could not be sent back, e.g. RecursionError while pickling it
+                result = TaskFailed("task failed: {0}".format(e))
+
+            pending.popleft()
+            if restarted:
+                # tasks of the killed workers are started again, finished ones keep their results
+                for other_task in pending:
+                    if other_task.future is not None and other_task.future.done() and \
+                            not other_task.future.cancelled() and other_task.future.exception() is None:
+                        continue
+                    other_task.future = None
+                    if not other_task.alone:
+                        self.submit(func, other_task)
+            yield result
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None